@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import os
+import json
+import errno
+import hashlib
+import tempfile
+import time
+
+import six
+
+CACHE_DIR = '.ansible-container'
+
+
+def project_cache_path(base_path, *parts):
+    '''
+    Path of the project's cache directory, or of a path within it. The cache lives
+    beside the ansible directory rather than in it, so it is never sent as part of a
+    build context.
+
+    :param base_path: the project's base path
+    :return: string
+    '''
+    return os.path.join(base_path, CACHE_DIR, 'cache', *parts)
+
+
+def user_cache_path(*parts):
+    '''
+    Path of the cache directory shared by all projects of the current user, or of a
+    path within it.
+
+    :return: string
+    '''
+    return project_cache_path(os.path.expanduser('~'), *parts)
+
+
+class ContentHash(object):
+    '''
+    Accumulates a SHA-256 digest over strings, files and directory trees.
+    '''
+
+    def __init__(self):
+        self._hash = hashlib.sha256()
+
+    def update(self, data):
+        if isinstance(data, six.text_type):
+            data = data.encode('utf8')
+        self._hash.update(data)
+        self._hash.update(b'\0')
+        return self
+
+    def update_json(self, data):
+        return self.update(json.dumps(data, sort_keys=True, default=str))
+
+    def update_file(self, path):
+        self.update(path)
+        try:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(65536), b''):
+                    self._hash.update(chunk)
+        except (OSError, IOError):
+            self.update(u'<missing>')
+        self._hash.update(b'\0')
+        return self
+
+    def update_tree(self, path):
+        '''
+        Hash every file below path, by relative name and content, in a stable order.
+        '''
+        if os.path.isfile(path):
+            return self.update_file(path)
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                self.update(os.path.relpath(file_path, path))
+                self.update_file(file_path)
+        return self
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+class FileCache(object):
+    '''
+    A small JSON key/value store in a cache directory. Each key is kept in its own
+    file so concurrent invocations never clobber each other's entries. Any problem
+    reading or writing the cache is treated as a miss.
+    '''
+
+    def __init__(self, path, private=False, max_entries=None, max_age=None):
+        '''
+        :param path: the cache directory, e.g. from project_cache_path or user_cache_path
+        :param private: keep the directory readable by the current user alone, for
+                        entries that may hold secrets
+        :param max_entries: keep only this many of the most recently used entries
+        :param max_age: drop entries not used for this many seconds
+        '''
+        self.path = path
+        self.private = private
+        self.max_entries = max_entries
+        self.max_age = max_age
+
+    def _key_path(self, key):
+        return os.path.join(self.path, '%s.json' % key)
+
+    def get(self, key, default=None):
+        try:
+            with open(self._key_path(key), 'r') as f:
+                value = json.load(f)
+        except (OSError, IOError, ValueError):
+            return default
+        if self.max_entries or self.max_age:
+            # Entries are pruned least recently used first
+            try:
+                os.utime(self._key_path(key), None)
+            except OSError:
+                pass
+        return value
+
+    def set(self, key, value):
+        try:
+            os.makedirs(self.path, 0o700 if self.private else 0o777)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                logger.debug('Unable to create cache directory %s - %s', self.path, exc)
+                return
+        try:
+            if self.private:
+                os.chmod(self.path, 0o700)
+            # mkstemp creates the file readable by the current user alone
+            fd, temp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(value, f)
+            os.rename(temp_path, self._key_path(key))
+        except (OSError, IOError) as exc:
+            logger.debug('Unable to write cache entry %s - %s', self._key_path(key), exc)
+            return
+        self.prune()
+
+    def prune(self):
+        if not (self.max_entries or self.max_age):
+            return
+        try:
+            names = [name for name in os.listdir(self.path) if name.endswith('.json')]
+            entries = sorted(((os.path.getmtime(os.path.join(self.path, name)), name) for name in names),
+                             reverse=True)
+        except OSError:
+            return
+        now = time.time()
+        for index, (mtime, name) in enumerate(entries):
+            if (self.max_entries and index >= self.max_entries) or \
+                    (self.max_age and now - mtime > self.max_age):
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from __future__ import absolute_import
+from __future__ import absolute_import, print_function
 
 import logging
 
@@ -11,6 +11,7 @@ import argparse
 
 from . import engine
 from . import exceptions
+from . import timing
 from .utils import load_shipit_engine, AVAILABLE_SHIPIT_ENGINES
 
 from logging import config
@@ -107,6 +108,22 @@ def subcmd_build_parser(parser, subparser):
     subparser.add_argument('--services', action='store',
                            help=u'Rather than perform an orchestrated build, only build specific services.',
                            nargs='+', dest='service', default=None)
+    subparser.add_argument('--no-cache', action='store_true',
+                           help=u'Build every service touched by the playbook, even those whose '
+                                u'inputs have not changed since their last build.',
+                           dest='no_cache', default=False)
+    subparser.add_argument('--reinstall-requirements', action='store_true',
+                           help=u'Install ansible/requirements.txt and requirements.yml again, '
+                                u'even if they have not changed since they were last installed.',
+                           dest='reinstall_requirements', default=False)
+    subparser.add_argument('--rebuild-builder', action='store_true',
+                           help=u'With --local-builder, rebuild the builder image without using '
+                                u'cached layers, even if it is up to date.',
+                           dest='rebuild_builder', default=False)
+    subparser.add_argument('--jobs', '-j', action='store', type=int,
+                           help=u'Number of built containers to export as images in parallel. '
+                                u'Defaults to 1.',
+                           dest='jobs', default=1)
     subparser.add_argument('ansible_options', action='store',
                            help=u'Provide additional commandline arguments to '
                                 u'Ansible in executing your playbook. If you '
@@ -166,6 +183,9 @@ def subcmd_push_parser(parser, subparser):
                                  u'For example, to tag and push images with "latest": '
                                  u'--tag latest'),
                            dest='tag', default=None)
+    subparser.add_argument('--jobs', '-j', action='store', type=int,
+                           help=u'Number of images to push in parallel. Defaults to 1.',
+                           dest='jobs', default=1)
     subcmd_common_parsers(parser, subparser, 'push')
 
 def subcmd_version_parser(parser, subparser):
@@ -191,6 +211,9 @@ def commandline():
     parser.add_argument('--engine', action='store', dest='engine_name',
                         help=u'Select your container engine and orchestrator',
                         default='docker')
+    parser.add_argument('--orchestrator', action='store', choices=['compose', 'native'],
+                        help=u'Run services with Docker Compose, or by talking to the '
+                             u'Docker engine directly', default='compose')
     parser.add_argument('--project', '-p', action='store', dest='base_path',
                         help=u'Specify a path to your project. Defaults to '
                              u'current working directory.', default=os.getcwd())
@@ -200,6 +223,11 @@ def commandline():
     parser.add_argument('--no-selinux', action='store_false', dest='selinux',
                         help=u"Disables the 'Z' option from being set on volumes automatically "
                              u"mounted to the build container.", default=True)
+    parser.add_argument('--timings', action='store_true',
+                        help=u'Print how long each phase of the command took', default=False)
+    parser.add_argument('--trace-file', action='store', default=None,
+                        help=u'Write the timing of each phase of the command to this '
+                             u'file as a JSON trace')
 
 
     subparsers = parser.add_subparsers(title='subcommand', dest='subcommand')
@@ -220,7 +248,8 @@ def commandline():
     config.dictConfig(LOGGING)
 
     try:
-        getattr(engine, u'cmdrun_{}'.format(args.subcommand))(**vars(args))
+        with timing.span(args.subcommand):
+            getattr(engine, u'cmdrun_{}'.format(args.subcommand))(**vars(args))
     except exceptions.AnsibleContainerAlreadyInitializedException as e:
         logger.error('Ansible Container is already initialized')
         sys.exit(1)
@@ -246,3 +275,15 @@ def commandline():
             msg = str(e) if str(e) else type(e)
             logger.error('Execution failed with {}'.format(msg))
         sys.exit(1)
+    finally:
+        report_timings(args)
+
+
+def report_timings(args):
+    if args.timings:
+        print(u'Timings:\n%s' % timing.tracer.render(), file=sys.stderr)
+    if args.trace_file:
+        try:
+            timing.tracer.write_trace(args.trace_file)
+        except (IOError, OSError) as exc:
+            logger.error('Unable to write the timing trace to %s: %s', args.trace_file, exc)
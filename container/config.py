@@ -6,45 +6,113 @@ import logging
 logger = logging.getLogger(__name__)
 
 import os
+import copy
 import json
 import yaml
 import re
 import six
 
 from jinja2 import Environment, FileSystemLoader
+try:
+    # libyaml's parser is several times faster than the pure Python one on large files
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
 from collections import Mapping
 from .exceptions import AnsibleContainerConfigException
 from .filters import LookupLoader, FilterLoader
-from .temp import MakeTempDir as make_temp_dir
 
 # TODO: Actually do some schema validation
 
+# Environment variables ansible-container sets itself partway through a command. They
+# aren't container.yml inputs, and keying on them would defeat the config cache.
+TOOL_ENVIRONMENT_VARIABLES = frozenset(['DOCKER_API_VERSION', 'ANSIBLE_CONTAINER_PROJECT'])
+
 
 class AnsibleContainerConfig(Mapping):
     _config = {}
     base_path = None
     lookup_loader = LookupLoader()
     filter_loader = FilterLoader()
+    # Parsed container.yml files, shared by every instance created in this process
+    _cache = {}
 
     def __init__(self, base_path, var_file=None):
         self.base_path = base_path
         self.var_file = var_file
         self.config_path = os.path.join(self.base_path, 'ansible/container.yml')
-        self.all_filters = self.filter_loader.all()
         self.set_env('prod')
 
     def set_env(self, env):
         '''
         Loads config from container.yml, performs Jinja templating, and stores the resulting dict to self._config.
+        Loading is skipped when container.yml has already been parsed with the same var_file, environment
+        variables and file modification times, in which case a copy of the earlier result is used.
 
         :param env: string of either 'dev' or 'prod'. Indicates 'dev_overrides' handling.
         :return: None
         '''
         assert env in ['dev', 'prod']
-        context = self._get_variables()
-        config = self._render_template(context=context)
+        key = self._cache_key()
+        config = self._cache.get(key)
+        if config is None:
+            config = self._load_config()
+            self._cache[key] = config
+        else:
+            logger.debug(u"Using previously loaded %s" % self.config_path)
+        # The copy is ours to modify, so dev_overrides and callers can't alter the cached config
+        config = copy.deepcopy(config)
+
+        for service, service_config in (config.get('services') or {}).items():
+            if isinstance(service_config, dict):
+                dev_overrides = service_config.pop('dev_overrides', {})
+                if env == 'dev':
+                    service_config.update(dev_overrides)
+
+        logger.debug(u"Config:\n%s" % json.dumps(config,
+                                                 sort_keys=True,
+                                                 indent=4,
+                                                 separators=(',', ': ')))
+        self._config = config
+
+    @classmethod
+    def clear_cache(cls):
+        cls._cache.clear()
+
+    def _cache_key(self):
+        '''
+        Identify everything a load of container.yml depends on: the config and var files along with their
+        modification times and sizes, and the environment, which supplies AC_* variables and env lookups.
+        Variables in TOOL_ENVIRONMENT_VARIABLES are left out.
+
+        :return: tuple
+        '''
+        paths = [self.config_path]
+        if self.var_file:
+            paths.append(self._locate_var_file(self.var_file))
+        files = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                raise AnsibleContainerConfigException(u"Failed to open %s. Are you in the correct directory?" %
+                                                      path)
+            files.append((os.path.abspath(path), stat.st_mtime, stat.st_size))
+        environment = tuple(sorted((key, value) for key, value in os.environ.items()
+                                   if key not in TOOL_ENVIRONMENT_VARIABLES))
+        return tuple(files), self.var_file, environment
+
+    def _load_config(self):
+        '''
+        Render and parse container.yml, removing the defaults section.
+
+        :return: dict
+        '''
+        source = self._read_config()
+        context = self._get_variables(source=source)
+        config = self._render_template(context=context, source=source)
         try:
-            config = yaml.safe_load(config)
+            config = yaml.load(config, Loader=SafeLoader)
         except yaml.YAMLError as exc:
             raise AnsibleContainerConfigException(u"Parsing container.yml - %s" % str(exc))
 
@@ -57,16 +125,7 @@ class AnsibleContainerConfig(Mapping):
             if not service_config or isinstance(service_config, six.string_types):
                 raise AnsibleContainerConfigException(u"Error: no definition found in container.yml for service %s."
                                                       % service)
-            if isinstance(service_config, dict):
-                dev_overrides = service_config.pop('dev_overrides', {})
-                if env == 'dev':
-                    service_config.update(dev_overrides)
-
-        logger.debug(u"Config:\n%s" % json.dumps(config,
-                                                 sort_keys=True,
-                                                 indent=4,
-                                                 separators=(',', ': ')))
-        self._config = config
+        return config
 
     def _lookup(self, name, *args, **kwargs):
         lookup_instance = self.lookup_loader.get(name)
@@ -80,11 +139,12 @@ class AnsibleContainerConfig(Mapping):
             ran = ','.join(ran)
         return ran
 
-    def _render_template(self, context=None, path=None, template='container.yml'):
+    def _render_template(self, context=None, path=None, template='container.yml', source=None):
         '''
         Apply Jinja template rendering to a given template. If no template provided, template ansible/container.yml
 
         :param template_vars: dict providing Jinja context
+        :param source: template text to render in place of reading template from path
         :return: dict
         '''
         if not context:
@@ -93,22 +153,39 @@ class AnsibleContainerConfig(Mapping):
             path = os.path.join(self.base_path, 'ansible')
         j2_env = Environment(loader=FileSystemLoader(path))
         j2_env.globals['lookup'] = self._lookup
-        j2_env.filters.update(self.all_filters)
-        j2_tmpl = j2_env.get_template(template)
+        j2_env.filters = self.filter_loader.lazy(j2_env.filters)
+        if source is not None:
+            j2_tmpl = j2_env.from_string(source)
+        else:
+            j2_tmpl = j2_env.get_template(template)
         tmpl = j2_tmpl.render(**context)
         if isinstance(tmpl, six.binary_type):
             tmpl = tmpl.encode('utf8')
         return tmpl
 
-    def _get_variables(self):
+    def _read_config(self):
+        '''
+        Read the raw text of container.yml
+
+        :return: string
+        '''
+        try:
+            with open(self.config_path, 'r') as f:
+                return f.read()
+        except (OSError, IOError):
+            raise AnsibleContainerConfigException(u"Failed to open %s. Are you in the correct directory?" %
+                                                  self.config_path)
+
+    def _get_variables(self, source=None):
         '''
         Resolve variables by creating an empty dict and updating it first with the 'defaults' section in the config,
         then any variables from var_file, and finally any AC_* environment variables. Returns the resulting dict.
 
+        :param source: text of container.yml, if already read
         :return: dict
         '''
         new_vars = {}
-        new_vars.update(self._get_defaults())
+        new_vars.update(self._get_defaults(source=source))
         if self.var_file:
             logger.debug('Reading variables from var file...')
             file_vars = self._get_variables_from_file(self.var_file, context=new_vars)
@@ -120,42 +197,36 @@ class AnsibleContainerConfig(Mapping):
                                                               separators=(',', ': ')))
         return new_vars
 
-    def _get_defaults(self):
+    # A line starting a top level key, which ends the defaults section
+    TOP_LEVEL_KEY = re.compile(r'^[A-Za-z_][\w-]*\s*:')
+
+    def _get_defaults(self, source=None):
         '''
-        Parse the optional 'defaults' section of container.yml
+        Parse the optional 'defaults' section of container.yml. The section is cut out of the raw text and
+        templated on its own, as the rest of the file can't be rendered until the defaults are known.
 
+        :param source: text of container.yml, if already read
         :return: dict
         '''
+        if source is None:
+            source = self._read_config()
         defaults = {}
-        default_lines = ['defaults:']
-        found = False
-        sections = [u'version:', u'services:', u'registries:']
-        try:
-            with open(self.config_path, 'r') as f:
-                for line in f:
-                    if re.search(r'^defaults:', line):
-                        found = True
-                        continue
-                    if found:
-                        if re.sub(u'\n', '', line) not in sections:
-                            default_lines.append(re.sub(u'\n', '', line))
-                        else:
-                            break
-        except (OSError, IOError):
-            raise AnsibleContainerConfigException(u"Failed to open %s. Are you in the correct directory?" %
-                                                  self.config_path)
-
-        if len(default_lines) > 1:
-            # re-assemble the defaults section, template, and parse as yaml
-            with make_temp_dir() as temp_dir:
-                with open(os.path.join(temp_dir, 'defaults.txt'), 'w') as f:
-                    f.write(u'\n'.join(default_lines))
-                default_section = self._render_template(context={}, path=temp_dir, template='defaults.txt')
+        default_lines = []
+        for line in source.splitlines():
+            if default_lines:
+                if self.TOP_LEVEL_KEY.match(line):
+                    break
+                default_lines.append(line)
+            elif line.startswith('defaults:'):
+                default_lines.append(line)
+
+        if default_lines:
+            default_section = self._render_template(context={}, source=u'\n'.join(default_lines))
             try:
-                config = yaml.safe_load(default_section)
-                defaults.update(config.get('defaults'))
+                config = yaml.load(default_section, Loader=SafeLoader)
             except yaml.YAMLError as exc:
                 raise AnsibleContainerConfigException(u"Parsing container.yml - %s" % str(exc))
+            defaults.update((config or {}).get('defaults') or {})
         logger.debug(u"Default vars:")
         logger.debug(json.dumps(defaults, sort_keys=True, indent=4, separators=(',', ': ')))
         return defaults
@@ -176,35 +247,41 @@ class AnsibleContainerConfig(Mapping):
                 new_vars[matches.group(1).lower()] = value
         return new_vars
 
-    def _get_variables_from_file(self, file, context=None):
+    def _locate_var_file(self, file):
         '''
-        Looks for file relative to base_path. If not found, checks relative to base_path/ansible.
-        If file extension is .yml | .yaml, parses as YAML, otherwise parses as JSON.
+        Looks for file relative to the current directory, then base_path, then base_path/ansible.
 
         :param file: string: path relative to base_path or base_path/ansible.
-        :param context: dict of any available default variables
-        :return: dict
+        :return: absolute path to the file
         '''
         file_path = os.path.abspath(file)
-        path = os.path.dirname(file_path)
-        name = os.path.basename(file_path)
         if not os.path.isfile(file_path):
-            path = self.base_path
             file_path = os.path.normpath(os.path.join(self.base_path, file))
-            name = os.path.basename(file_path)
             if not os.path.isfile(file_path):
-                path = os.path.join(self.base_path, 'ansible')
-                file_path = os.path.normpath(os.path.join(path, file))
-                name = os.path.basename(file_path)
+                file_path = os.path.normpath(os.path.join(self.base_path, 'ansible', file))
                 if not os.path.isfile(file_path):
                     raise AnsibleContainerConfigException(u"Unable to locate %s. Provide a path relative to %s or %s." % (
                                                           file, self.base_path, os.path.join(self.base_path, 'ansible')))
+        return file_path
+
+    def _get_variables_from_file(self, file, context=None):
+        '''
+        Looks for file relative to base_path. If not found, checks relative to base_path/ansible.
+        If file extension is .yml | .yaml, parses as YAML, otherwise parses as JSON.
+
+        :param file: string: path relative to base_path or base_path/ansible.
+        :param context: dict of any available default variables
+        :return: dict
+        '''
+        file_path = self._locate_var_file(file)
+        path = os.path.dirname(file_path)
+        name = os.path.basename(file_path)
         logger.debug("Use variable file: %s" % file_path)
         data = self._render_template(context=context, path=path, template=name)
 
         if name.endswith('yml') or name.endswith('yaml'):
             try:
-                config = yaml.safe_load(data)
+                config = yaml.load(data, Loader=SafeLoader)
             except yaml.YAMLError as exc:
                 raise AnsibleContainerConfigException(u"YAML exception: %s" %  str(exc))
         else:
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import base64
+import json
+import os
+import subprocess
+import threading
+
+from collections import namedtuple
+
+from ..exceptions import AnsibleContainerDockerConfigFileException
+from .registry import RegistryClient
+
+Credentials = namedtuple('Credentials', ['username', 'password', 'email'])
+
+# What credential helpers return as Username when Secret is an identity token
+IDENTITY_TOKEN_USERNAME = '<token>'
+
+
+def registry_host(url):
+    '''
+    The host[:port] part of a registry URL, which is how config entries and
+    credential helpers tell registries apart.
+    '''
+    host = url.split('://', 1)[-1].split('/', 1)[0]
+    return 'index.docker.io' if host in ('docker.io', 'registry-1.docker.io') else host
+
+
+class CredentialStore(object):
+    '''
+    Registry credentials from the first Docker config file found in a cascade of
+    paths. The file is parsed once and parsed again only when it, or which file
+    comes first in the cascade, changes. Credentials kept by a credential helper
+    (credsStore or credHelpers) are fetched once per registry.
+    '''
+
+    def __init__(self, paths):
+        '''
+        :param paths: config file paths, in order of preference. A directory stands
+                      for the config.json inside it, as with DOCKER_CONFIG.
+        '''
+        self.paths = paths
+        self._lock = threading.RLock()
+        self._stamp = None
+        self._config = None
+        self._credentials = {}
+        self._clients = {}
+
+    def config_path(self):
+        for path in self.paths:
+            if path and os.path.isdir(path):
+                path = os.path.join(path, 'config.json')
+            if path and os.path.exists(path):
+                return path
+        return None
+
+    def config(self):
+        '''
+        :return: the parsed config file, or None if there is none
+        '''
+        with self._lock:
+            path = self.config_path()
+            stamp = None
+            if path:
+                stat = os.stat(path)
+                stamp = (path, stat.st_mtime, stat.st_size)
+            if stamp != self._stamp:
+                logger.debug('Reading Docker config %s', path)
+                self._config = None
+                if path:
+                    with open(path) as f:
+                        self._config = json.load(f)
+                self._stamp = stamp
+                self._credentials = {}
+                self._clients = {}
+            return self._config
+
+    def _find(self, entries, url):
+        if url in entries:
+            return entries[url]
+        host = registry_host(url)
+        for key, value in entries.items():
+            if registry_host(key) == host:
+                return value
+        return None
+
+    def get(self, url):
+        '''
+        :param url: registry URL
+        :return: Credentials, with None for anything not known
+        :raises AnsibleContainerDockerConfigFileException: if there is no config file
+        '''
+        with self._lock:
+            config = self.config()
+            if config is None:
+                raise AnsibleContainerDockerConfigFileException("Unable to read your docker config file. Try "
+                                                                "providing login credentials for the registry.")
+            if url not in self._credentials:
+                self._credentials[url] = self._resolve(config, url)
+            return self._credentials[url]
+
+    def _resolve(self, config, url):
+        # .dockercfg holds the auths section of config.json at the top level
+        auths = config['auths'] if 'auths' in config else config
+        entry = self._find(auths, url)
+        if not isinstance(entry, dict):
+            entry = {}
+        email = entry.get('email', '')
+        helper = self._find(config.get('credHelpers') or {}, url)
+        if helper:
+            return self._from_helper(helper, url, email)
+        if entry.get('auth'):
+            username, password = base64.b64decode(entry['auth']).decode('utf-8').split(':', 1)
+            return Credentials(username, password, email)
+        if config.get('credsStore'):
+            return self._from_helper(config['credsStore'], url, email)
+        return Credentials(None, None, email)
+
+    @staticmethod
+    def _from_helper(helper, url, email):
+        try:
+            proc = subprocess.Popen(['docker-credential-%s' % helper, 'get'], stdin=subprocess.PIPE,
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as exc:
+            logger.warning('Unable to run credential helper docker-credential-%s: %s', helper, exc)
+            return Credentials(None, None, email)
+        out, err = proc.communicate(url.encode('utf-8'))
+        if proc.returncode != 0:
+            # Helpers exit non-zero when they have nothing for the registry
+            logger.debug('docker-credential-%s has no credentials for %s: %s', helper, url, err.strip())
+            return Credentials(None, None, email)
+        result = json.loads(out.decode('utf-8'))
+        return Credentials(result.get('Username'), result.get('Secret'), email)
+
+    def auth_config(self, url):
+        '''
+        Credentials for url in the form the Docker engine takes them with a push or
+        pull, or None to let it fall back to its own.
+        '''
+        try:
+            credentials = self.get(url)
+        except AnsibleContainerDockerConfigFileException:
+            return None
+        if not credentials.password:
+            return None
+        if credentials.username == IDENTITY_TOKEN_USERNAME:
+            return dict(identitytoken=credentials.password, serveraddress=url)
+        return dict(username=credentials.username, password=credentials.password,
+                    email=credentials.email or None, serveraddress=url)
+
+    def registry_client(self, url):
+        '''
+        A RegistryClient for url that authenticates with the stored credentials.
+        Clients are shared, so tokens the registry hands out are reused, until the
+        config changes.
+        '''
+        with self._lock:
+            try:
+                credentials = self.get(url)
+            except AnsibleContainerDockerConfigFileException:
+                credentials = Credentials(None, None, None)
+            if url not in self._clients:
+                auth = None
+                if credentials.username and credentials.username != IDENTITY_TOKEN_USERNAME:
+                    auth = (credentials.username, credentials.password)
+                self._clients[url] = RegistryClient(url, auth=auth)
+            return self._clients[url]
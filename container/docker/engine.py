@@ -12,31 +12,37 @@ import getpass
 import json
 import base64
 import pprint
+import uuid
 
 import docker
 from docker.client import errors as docker_errors
 from docker.utils import kwargs_from_env
 from docker.constants import DEFAULT_TIMEOUT_SECONDS
 
-try:
-    from compose.cli.command import project_from_options
-    from compose.cli import main
-except Exception as exc:
-    raise Exception("Error importing Docker compose: {0}".format(exc.message))
-
-from yaml import dump as yaml_dump
+from yaml import dump as yaml_dump, YAMLError
 
 from ..exceptions import (AnsibleContainerNotInitializedException,
                           AnsibleContainerNoAuthenticationProvidedException,
                           AnsibleContainerDockerConfigFileException,
                           AnsibleContainerDockerLoginException,
                           AnsibleContainerListHostsException,
-                          AnsibleContainerNoMatchingHosts)
+                          AnsibleContainerNoMatchingHosts,
+                          AnsibleContainerDynamicHostPattern,
+                          AnsibleContainerPushException)
 
-from ..engine import BaseEngine, REMOVE_HTTP
+from ..engine import BaseEngine, REMOVE_HTTP, cleanup_build
 from ..utils import *
+from ..cache import ContentHash, FileCache, CACHE_DIR, project_cache_path, user_cache_path
+from ..timing import span
+from ..playbook import resolve_playbook_hosts
 from .. import __version__ as release_version
 from .utils import *
+from .images import ImageIndex
+from .orchestrator import Orchestrator, OrchestratorCommand, with_dependencies
+from .progress import PushProgress, iter_stream_events
+from .registry import RegistryClient
+from .credentials import CredentialStore
+from .logstream import RingBufferSink, ListHostsParser
 
 if not os.environ.get('DOCKER_HOST'):
     logger.warning('No DOCKER_HOST environment variable found. Assuming UNIX '
@@ -70,10 +76,77 @@ class Engine(BaseEngine):
     default_registry_url = 'https://index.docker.io/v1/'
     default_registry_name = 'dockerhub'
     _client = None
+    _log_client = None
     _orchestrated_hosts = None
+    _builder_image_digest = None
+    _existing_volumes = None
+    _image_index = None
+    _credential_store = None
+    _build_project = None
+    _builder_exit_code = None
     api_version = ''
     temp_dir = None
 
+    # Operations that run the builder. Each invocation runs them in a compose project
+    # of its own, so builds of any number of projects or branches can share a daemon.
+    # Builder images older than the current context only know the ansible project.
+    BUILD_OPERATIONS = ('build', 'listhosts', 'install')
+    # Operations on the application itself, which later invocations must find again
+    DEFAULT_COMPOSE_PROJECT = 'ansible'
+
+    @property
+    def build_project(self):
+        """
+        The compose project this invocation's build operations run in, e.g.
+        ansible3f2c9a1b7e04. Compose project names are lowercase alphanumeric.
+
+        The inventory and wait_on_host scripts of a builder image that wasn't built
+        from the current context, such as the released ansible/ansible-container-builder,
+        look for ansible_<host>_1, so with those the build runs in the ansible project.
+        """
+        if self._build_project is None:
+            if self.builder_image_is_current():
+                self._build_project = '%s%s' % (self.DEFAULT_COMPOSE_PROJECT, uuid.uuid4().hex[:12])
+            else:
+                logger.debug('Builder image predates per-invocation compose projects, using %s',
+                             self.DEFAULT_COMPOSE_PROJECT)
+                self._build_project = self.DEFAULT_COMPOSE_PROJECT
+        return self._build_project
+
+    def orchestration_project(self, operation):
+        if operation in self.BUILD_OPERATIONS:
+            return self.build_project
+        return self.DEFAULT_COMPOSE_PROJECT
+
+    def container_name(self, host, project=None):
+        """
+        Name compose gives the container of a service.
+
+        :param host: service name
+        :param project: compose project, defaults to this invocation's build project
+        :return: string
+        """
+        return '%s_%s_1' % (project or self.build_project, host)
+
+    def cleanup_orchestration(self):
+        # The ansible project is shared with run, so only a project of our own is removed
+        if self._build_project in (None, self.DEFAULT_COMPOSE_PROJECT):
+            return
+        client = self.get_client()
+        project = self._build_project
+        for container in client.containers(all=True, filters={'label': 'com.docker.compose.project=%s' % project}):
+            logger.debug('Removing container %s', container['Id'])
+            client.remove_container(container['Id'], force=True, v=True)
+        for network in client.networks(names=['%s_default' % project]) or []:
+            if network['Name'] == '%s_default' % project:
+                logger.debug('Removing network %s', network['Name'])
+                client.remove_network(network['Id'])
+        for volume_name in sorted(self.existing_volumes()):
+            if volume_name.startswith('%s_' % project):
+                logger.debug('Removing volume %s', volume_name)
+                client.remove_volume(volume_name)
+                self._existing_volumes.discard(volume_name)
+
     def all_hosts_in_orchestration(self):
         """
         List all hosts being orchestrated by the compose engine.
@@ -90,72 +163,212 @@ class Engine(BaseEngine):
         :return: frozenset of strings
         """
         if not self._orchestrated_hosts:
-            with teed_stdout() as stdout, make_temp_dir() as temp_dir:
-                self.orchestrate('listhosts', temp_dir,
-                                 hosts=[self.builder_container_img_name])
-                logger.info('Cleaning up Ansible Container builder...')
-                builder_container_id = self.get_builder_container_id()
-                self.remove_container_by_id(builder_container_id)
-                # We need to cleverly extract the host names from the output...
-                logger.debug('--list-hosts\n%s', stdout.getvalue())
-                lines = stdout.getvalue().split('\r\n')
-                clean_exit = False
-                for line in lines:
-                     if "exited with code 0" in line:
-                         clean_exit = True
-                         break
-                if not clean_exit:
-                    logger.error("ERROR: encountered the following while attempting to get hosts touched by main.yml:")
-                    for line in lines:
-                        logger.error(line)
-                    raise AnsibleContainerListHostsException("ERROR: unable to get the list of hosts touched by main.yml") 
-                lines_minus_builder_host = [line.rsplit('|', 1)[1] for line
-                                            in lines if '|' in line]
-                host_lines = set(line.strip() for line in lines_minus_builder_host
-                              if line.startswith('       '))
-                host_lines.discard('')
-                self._orchestrated_hosts = frozenset(host_lines)
+            try:
+                self._orchestrated_hosts = self.resolve_hosts_touched_by_playbook()
+                logger.debug('Resolved hosts touched by main.yml: %s', ', '.join(self._orchestrated_hosts))
+                return self._orchestrated_hosts
+            except (AnsibleContainerDynamicHostPattern, YAMLError, IOError, OSError) as exc:
+                logger.debug('Falling back to listhosts: %s', exc)
+            # The listhosts run costs a builder container, so remember its answer
+            # for as long as the playbook, roles and config stay the same.
+            cache = FileCache(project_cache_path(self.base_path, 'listhosts'))
+            cache_key = self.playbook_digest()
+            cached_hosts = cache.get(cache_key)
+            if cached_hosts is not None:
+                logger.debug('Using cached hosts touched by main.yml: %s', ', '.join(cached_hosts))
+                self._orchestrated_hosts = frozenset(cached_hosts)
+                return self._orchestrated_hosts
+            # Hosts are picked out of the output as it streams by; only the tail of it is
+            # kept, to explain a failure.
+            output, parser = RingBufferSink(), ListHostsParser()
+            with teed_stdout(output, parser), make_temp_dir() as temp_dir:
+                try:
+                    exit_code = self.orchestrate('listhosts', temp_dir,
+                                                 hosts=[self.builder_container_img_name])
+                finally:
+                    cleanup_build(self)
+            logger.debug('--list-hosts\n%s', '\n'.join(output.lines))
+            if exit_code != 0:
+                logger.error("ERROR: encountered the following while attempting to get hosts touched by main.yml:")
+                for line in output.lines:
+                    logger.error(line)
+                raise AnsibleContainerListHostsException("ERROR: unable to get the list of hosts touched by main.yml")
+            self._orchestrated_hosts = frozenset(parser.hosts)
+            cache.set(cache_key, sorted(parser.hosts))
         return self._orchestrated_hosts
 
-    def build_buildcontainer_image(self):
+    # Host patterns using any of these are left to ansible-playbook --list-hosts
+    LISTHOSTS_ONLY_OPTIONS = ('-l', '--limit', '-i', '--inventory', '--inventory-file')
+
+    def resolve_hosts_touched_by_playbook(self):
+        """
+        Work out the hosts touched by main.yml in-process, by evaluating each play's
+        hosts pattern against the inventory the builder container would use.
+
+        :return: frozenset of strings
+        :raises AnsibleContainerDynamicHostPattern: when only Ansible can tell
+        """
+        for option in self.params.get('ansible_options') or []:
+            if option.split('=', 1)[0] in self.LISTHOSTS_ONLY_OPTIONS or \
+                    re.match(r'^-[li].', option):
+                raise AnsibleContainerDynamicHostPattern(u'Ansible option %s changes the hosts' % option)
+        return resolve_playbook_hosts(os.path.join(self.base_path, 'ansible', 'main.yml'),
+                                      self.all_hosts_in_orchestration(), self.inventory_groups())
+
+    def inventory_groups(self):
+        """
+        The groups the builder container's inventory places hosts in. Mirrors
+        ansible-container-inventory.py, which puts every service in the docker group.
+
+        :return: dict of group name to list of host names
+        """
+        hosts = self.all_hosts_in_orchestration()
+        return {'all': hosts, 'docker': hosts, 'ungrouped': []}
+
+    FINGERPRINT_LABEL = 'com.ansible.container.fingerprint'
+
+    def get_base_image_id(self, host):
+        """
+        Query the engine for the identifier of the image a service is based on.
+
+        :param host: the name of the host in the orchestration file
+        :return: the image identifier, or None if the image is not present locally
+        """
+        image = (self.config['services'].get(host) or {}).get('image')
+        if not image:
+            return None
+        try:
+            return self.get_client().inspect_image(image)['Id']
+        except docker_errors.NotFound:
+            # It will be pulled when the build starts
+            return None
+
+    def get_image_fingerprint(self, host):
+        """
+        Get the fingerprint label of the latest built image for a host.
+
+        :param host: the name of the host in the orchestration file
+        :return: string, or None if there is no image or it has no fingerprint
+        """
+        try:
+            image_data = self.get_client().inspect_image('%s-%s:latest' % (self.project_name, host))
+        except docker_errors.NotFound:
+            return None
+        labels = (image_data.get('Config') or {}).get('Labels') or {}
+        return labels.get(self.FINGERPRINT_LABEL)
+
+    builder_context_files = ['builder.sh', 'ansible-container-inventory.py',
+                             'ansible.cfg', 'wait_on_host.py', 'ac_galaxy.py', 'ac_docker.py',
+                             'ac_build_report.py']
+
+    def _render_builder_dockerfile(self, temp_dir):
+        jinja_render_to_temp('ansible-dockerfile.j2', temp_dir, 'Dockerfile')
+        return os.path.join(temp_dir, 'Dockerfile')
+
+    def builder_image_digest(self):
+        """
+        Digest of the builder image's build context: the rendered Dockerfile and
+        the files it adds.
+
+        :return: string
+        """
+        if not self._builder_image_digest:
+            digest = ContentHash()
+            with make_temp_dir() as temp_dir:
+                digest.update_file(self._render_builder_dockerfile(temp_dir))
+            for context_file in self.builder_context_files:
+                digest.update(context_file)
+                digest.update_file(os.path.join(jinja_template_path(), context_file))
+            self._builder_image_digest = digest.hexdigest()
+        return self._builder_image_digest
+
+    def builder_image_digest_tag(self):
+        return '%s:%s' % (self.builder_container_img_tag, self.builder_image_digest()[:12])
+
+    def builder_image_is_current(self):
         """
-        Build in the container engine the builder container
+        Does the engine already have a builder image built from the current context?
+
+        :return: bool
+        """
+        try:
+            self.get_image_id_by_tag(self.builder_image_digest_tag())
+        except NameError:
+            return False
+        return True
 
+    def builder_connection(self):
+        """
+        The Ansible connection plugin the build playbook should use. The ac_docker
+        plugin, which keeps an exec session open per container, only exists in
+        builder images built from the current context.
+
+        :return: string
+        """
+        if self.builder_image_is_current():
+            return 'ac_docker'
+        logger.debug('Builder image predates the ac_docker connection plugin, using docker')
+        return 'docker'
+
+    def build_buildcontainer_image(self, nocache=False):
+        """
+        Build in the container engine the builder container. The image is tagged
+        with the digest of its build context as well as latest.
+
+        :param nocache: don't reuse cached layers from a previous build
         :return: generator of strings
         """
         assert_initialized(self.base_path)
         client = self.get_client()
+        digest_tag = self.builder_image_digest_tag()
         with make_temp_dir() as temp_dir:
             logger.info('Building Docker Engine context...')
             tarball_path = os.path.join(temp_dir, 'context.tar')
             tarball_file = open(tarball_path, 'wb')
             tarball = tarfile.TarFile(fileobj=tarball_file,
                                       mode='w')
-            container_dir = os.path.normpath(os.path.join(self.base_path,
-                                                          'ansible'))
-            try:
-                tarball.add(container_dir, arcname='ansible')
-            except OSError:
-                raise AnsibleContainerNotInitializedException()
-            jinja_render_to_temp('ansible-dockerfile.j2', temp_dir,
-                                 'Dockerfile')
-            tarball.add(os.path.join(temp_dir, 'Dockerfile'),
+            tarball.add(self._render_builder_dockerfile(temp_dir),
                         arcname='Dockerfile')
 
-            for context_file in ['builder.sh', 'ansible-container-inventory.py',
-                                 'ansible.cfg', 'wait_on_host.py', 'ac_galaxy.py']:
+            for context_file in self.builder_context_files:
                 tarball.add(os.path.join(jinja_template_path(), context_file),
                             arcname=context_file)
 
             tarball.close()
             tarball_file.close()
             tarball_file = open(tarball_path, 'rb')
-            logger.info('Starting Docker build of Ansible Container image (please be patient)...')
-            return client.build(fileobj=tarball_file,
-                                custom_context=True,
-                                tag=self.builder_container_img_tag,
-                                nocache=True,
-                                rm=True)
+            logger.info('Starting Docker build of Ansible Container image %s (please be patient)...',
+                        digest_tag)
+            stream = client.build(fileobj=tarball_file,
+                                  custom_context=True,
+                                  tag=digest_tag,
+                                  nocache=nocache,
+                                  rm=True)
+            return self._tag_builder_image(stream, digest_tag)
+
+    def _tag_builder_image(self, stream, digest_tag):
+        for line in stream:
+            yield line
+        client = self.get_client()
+        try:
+            image_data = client.inspect_image(digest_tag)
+        except docker_errors.NotFound:
+            # The build failed; leave the previous builder image in place
+            return
+        self.image_index().add(image_data)
+        client.tag(image_data['Id'], self.builder_container_img_tag, tag='latest', force=True)
+        self.image_index().tag(image_data['Id'], self.builder_container_img_tag, tag='latest')
+
+    def image_index(self):
+        """
+        Snapshot of the engine's images, taken the first time it's needed and
+        kept current as this engine creates, tags and removes images.
+
+        :return: ImageIndex
+        """
+        if self._image_index is None:
+            self._image_index = ImageIndex(self.get_client())
+        return self._image_index
 
     def get_image_id_by_tag(self, name):
         """
@@ -164,18 +377,13 @@ class Engine(BaseEngine):
         :param name: the image name
         :return: the image identifier
         """
-        client = self.get_client()
-        try:
-            return client.images(name=name, quiet=True)[0]
-        except IndexError:
+        image_id = self.image_index().get_id(name)
+        if image_id is None:
             raise NameError('No image with the name %s' % name)
+        return image_id
 
     def get_images_by_name(self, name):
-        client = self.get_client()
-        try:
-            return client.images(name=name, quiet=True)
-        except IndexError:
-            raise NameError('No image with the name %s' % name)
+        return self.image_index().images(name=name, quiet=True)
 
     def get_container_id_by_name(self, name):
         """
@@ -201,7 +409,7 @@ class Engine(BaseEngine):
         """
         client = self.get_client()
         container_id, = client.containers(
-            filters={'name': 'ansible_%s_1' % name},
+            filters={'name': self.container_name(name)},
             limit=1, all=True, quiet=True
         )
         self.remove_container_by_id(container_id)
@@ -218,11 +426,15 @@ class Engine(BaseEngine):
 
     def get_builder_image_id(self):
         """
-        Query the enginer to get the builder image identifier
+        Query the enginer to get the builder image identifier. Prefer the image
+        built from the current context, which latest may no longer point at.
 
         :return: the image identifier
         """
-        return self.get_image_id_by_tag(self.builder_container_img_tag)
+        try:
+            return self.get_image_id_by_tag(self.builder_image_digest_tag())
+        except NameError:
+            return self.get_image_id_by_tag('%s:latest' % self.builder_container_img_tag)
 
     def get_builder_container_id(self):
         """
@@ -230,7 +442,7 @@ class Engine(BaseEngine):
 
         :return: the container identifier
         """
-        return self.get_container_id_by_name(self.builder_container_img_name)
+        return self.get_container_id_by_name(self.container_name(self.builder_container_img_name))
 
     def build_was_successful(self):
         """
@@ -238,14 +450,39 @@ class Engine(BaseEngine):
 
         :return: bool
         """
-        client = self.get_client()
-        build_container_info, = client.containers(
-            filters={'name': 'ansible_ansible-container_1'},
-            limit=1, all=True
-        )
-        # Not the best way to test for success or failure, but it works.
-        exit_status = build_container_info['Status']
-        return '(0)' in exit_status
+        exit_code = self._builder_exit_code
+        if exit_code is None:
+            exit_code = self.get_client().wait(self.get_builder_container_id())
+        return exit_code == 0
+
+    def build_report_path(self):
+        """
+        Where the builder's ac_build_report callback writes its report, on the project
+        mount and named after the build's compose project.
+        """
+        return os.path.join(self.base_path, CACHE_DIR, 'reports', '%s.json' % self.build_project)
+
+    def build_report(self):
+        """
+        Results of the build playbook, as recorded by the ac_build_report callback.
+        The report is removed once read.
+
+        :return: dict with hosts, a dict of host to dict of ok, changed, failures,
+                 unreachable, skipped and failed_tasks, and tasks, a list of dicts of host,
+                 task, role, status and duration; or None if the builder wrote no report
+        """
+        path = self.build_report_path()
+        try:
+            with open(path) as f:
+                report = json.load(f)
+        except (IOError, OSError, ValueError) as exc:
+            logger.debug('No build report at %s: %s', path, exc)
+            return None
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return dict(hosts=report.get('hosts') or {}, tasks=report.get('tasks') or [])
 
     def get_config_for_shipit(self, pull_from=None, url=None, namespace=None, tag=None):
         '''
@@ -257,7 +494,6 @@ class Engine(BaseEngine):
         :return: config dict
         '''
         config = get_config(self.base_path, var_file=self.var_file)
-        client = self.get_client()
         image_path = None
         if self.params.get('local_images'):
             logger.info("Using local images")
@@ -274,7 +510,7 @@ class Engine(BaseEngine):
         orchestrated_hosts = self.hosts_touched_by_playbook()
         for host, service_config in config.get('services', {}).items():
             if host in orchestrated_hosts:
-                image_id, image_buildstamp = get_latest_image_for(self.project_name, host, client)
+                image_id, image_buildstamp = get_latest_image_for(self.project_name, host, self.image_index())
                 image = '{0}-{1}:{2}'.format(self.project_name, host, tag or image_buildstamp)
                 if image_path:
                     image = '{0}/{1}'.format(image_path, image)
@@ -339,17 +575,25 @@ class Engine(BaseEngine):
         :param operation: One of build, run, or listhosts
         :param temp_dir: A temporary directory usable as workspace
         :param hosts: (optional) A list of hosts to limit orchestration to
-        :return: The exit status of the builder container (None if it wasn't run)
+        :return: The exit status of the builder container (None if it wasn't run, or was detached)
         """
         is_detached = self.params.pop('detached', False)
         try:
-            builder_img_id = self.get_image_id_by_tag(
-                self.builder_container_img_tag)
+            builder_img_id = self.get_builder_image_id()
         except NameError:
             image_version = '.'.join(release_version.split('.')[:2])
             builder_img_id = 'ansible/%s:%s' % (
                 self.builder_container_img_tag, image_version)
 
+        if operation == 'build':
+            # The ac_build_report callback, like ac_docker, is only in current builder images
+            build_report = self.builder_image_is_current()
+            context = dict(context, builder_connection=self.builder_connection(),
+                           build_report=build_report)
+            report_dir = os.path.dirname(self.build_report_path())
+            if build_report and not os.path.isdir(report_dir):
+                os.makedirs(report_dir)
+
         options, command_options, command = self.bootstrap_env(
             temp_dir=temp_dir,
             builder_img_id=builder_img_id,
@@ -371,7 +615,17 @@ class Engine(BaseEngine):
             logger.info('Deploying application in detached mode')
             command_options[u'-d'] = True
 
-        command.up(command_options)
+        exit_codes = command.up(command_options)
+        if operation not in self.BUILD_OPERATIONS or is_detached:
+            return None
+        builder = self.builder_container_img_name
+        if isinstance(exit_codes, dict) and exit_codes.get(builder) is not None:
+            self._builder_exit_code = exit_codes[builder]
+        else:
+            # Compose returns once the builder has exited, so this doesn't block
+            self._builder_exit_code = self.get_client().wait(self.get_builder_container_id())
+        logger.debug('Builder exited with code %s', self._builder_exit_code)
+        return self._builder_exit_code
 
     def orchestrate_build_extra_args(self):
         """
@@ -457,42 +711,82 @@ class Engine(BaseEngine):
         compose_config = config_to_compose(self.config)
         return compose_config
 
-    def _fix_volumes(self, service_name, service_config, compose_version='1', top_level_volumes=dict()):
-        # If there are volumes defined for this host, we need to create the
-        # volume if one doesn't already exist.
+    def existing_volumes(self):
+        """
+        Names of the volumes known to the Docker daemon, listed once per invocation
+        and kept up to date as volumes are created.
+
+        :return: set of volume names
+        """
+        if self._existing_volumes is None:
+            client = self.get_client()
+            response = client.volumes() or {}
+            self._existing_volumes = set(volume['Name'] for volume in response.get('Volumes') or [])
+        return self._existing_volumes
+
+    def ensure_volumes(self, volume_names):
+        """
+        Create, with the local driver, whichever of the given volumes don't exist yet.
+
+        :param volume_names: iterable of volume names
+        :return: None
+        """
+        missing = set(volume_names) - self.existing_volumes()
+        if not missing:
+            return
         client = self.get_client()
+        for volume_name in sorted(missing):
+            logger.debug('Creating volume %s', volume_name)
+            client.create_volume(name=volume_name, driver='local')
+            self._existing_volumes.add(volume_name)
+
+    def _fix_volumes(self, service_name, service_config, compose_version='1', top_level_volumes=dict()):
+        """
+        Give each unnamed volume of a service a predictable name, so its data survives
+        the container being recreated. Compose creates named volumes declared at the
+        top level of a version 2 file; for version 1 the caller must create them, by
+        passing the returned names to ensure_volumes.
+
+        :return: list of volume names the service now uses
+        """
         project_name = os.path.basename(self.base_path).lower()
+        volume_names = []
+        volumes = []
         for volume in service_config.get('volumes', []):
             if ':' not in volume:
                 # This is an unnamed or anonymous volume. Create the volume with a predictable name.
                 volume_name = ('%s-%s-%s' % (project_name, service_name, volume.replace('/', '_'))).replace('-_', '_')
-                service_config['volumes'].remove(volume)
-                service_config['volumes'].append('%s:%s' % (volume_name, volume))
-                if compose_version == '1':
-                    try:
-                        client.inspect_volume(name=volume_name)
-                    except docker_errors.NotFound:
-                        # The volume does not exist
-                        client.create_volume(name=volume_name, driver='local')
+                volume = '%s:%s' % (volume_name, volume)
+                volume_names.append(volume_name)
                 if volume_name not in top_level_volumes.keys():
                     top_level_volumes[volume_name] = {}
+            volumes.append(volume)
+        if volume_names:
+            service_config['volumes'] = volumes
+        return volume_names if compose_version == '1' else []
 
     def get_config_for_build(self):
         compose_config = config_to_compose(self.config)
         version = compose_config.get('version', '1')
         volumes = compose_config.get('volumes', {})
-        orchestrated_hosts = self.hosts_touched_by_playbook()
+        volume_names = []
+        touched_hosts = orchestrated_hosts = self.hosts_touched_by_playbook()
         if self.params.get('service'):
             # only build a subset of the orchestrated hosts
             orchestrated_hosts = orchestrated_hosts.intersection(self.params['service'])
-            for host in set(compose_config['services'].keys()) - orchestrated_hosts:
-                del compose_config['services'][host]
-            if not compose_config['services']:
+            if not orchestrated_hosts:
                 raise AnsibleContainerNoMatchingHosts()
+            # Services the ones being built link to, depend on or take volumes from stay in
+            # the compose file so compose can start them. Those the playbook touches idle like
+            # the rest, but the inventory, built from the bootstrap_env hosts, leaves them out
+            # of the playbook run.
+            needed = with_dependencies(compose_config['services'], orchestrated_hosts)
+            for host in set(compose_config['services'].keys()) - needed:
+                del compose_config['services'][host]
         logger.debug('Orchestrated hosts: %s', ', '.join(orchestrated_hosts))
 
         for service, service_config in compose_config['services'].items():
-            if service in orchestrated_hosts:
+            if service in touched_hosts:
                 logger.debug('Setting %s to sleep', service)
                 service_config.update(
                     dict(
@@ -526,8 +820,10 @@ class Engine(BaseEngine):
                     logger.debug('No NameError raised when searching for tag %s',
                                  '%s-%s:latest' % (self.project_name, service))
                     service_config['image'] = tag
-            self._fix_volumes(service, service_config, compose_version=version, top_level_volumes=volumes)
+            volume_names.extend(self._fix_volumes(service, service_config, compose_version=version,
+                                                  top_level_volumes=volumes))
 
+        self.ensure_volumes(volume_names)
         if volumes:
             compose_config['volumes'] = volumes
 
@@ -539,6 +835,7 @@ class Engine(BaseEngine):
         compose_config = config_to_compose(self.config)
         version = compose_config.get('version', '1')
         volumes = compose_config.get('volumes', {})
+        volume_names = []
         orchestrated_hosts = self.hosts_touched_by_playbook()
         for service, service_config in compose_config['services'].items():
             if service in orchestrated_hosts:
@@ -547,8 +844,10 @@ class Engine(BaseEngine):
                         image='%s-%s:latest' % (self.project_name, service)
                     )
                 )
-            self._fix_volumes(service, service_config, compose_version=version, top_level_volumes=volumes)
+            volume_names.extend(self._fix_volumes(service, service_config, compose_version=version,
+                                                  top_level_volumes=volumes))
 
+        self.ensure_volumes(volume_names)
         if volumes:
             compose_config['volumes'] = volumes
 
@@ -562,6 +861,7 @@ class Engine(BaseEngine):
         compose_config = config_to_compose(self.config)
         version = compose_config.get('version', '1')
         volumes = compose_config.get('volumes', {})
+        volume_names = []
         for service, service_config in compose_config['services'].items():
             service_config.update(
                 dict(
@@ -571,8 +871,10 @@ class Engine(BaseEngine):
                     entrypoint=[]
                 )
             )
-            self._fix_volumes(service, service_config, compose_version=version, top_level_volumes=volumes)
+            volume_names.extend(self._fix_volumes(service, service_config, compose_version=version,
+                                                  top_level_volumes=volumes))
 
+        self.ensure_volumes(volume_names)
         if volumes:
             compose_config['volumes'] = volumes
 
@@ -585,11 +887,12 @@ class Engine(BaseEngine):
     def post_build(self, host, version, flatten=True, purge_last=True):
         client = self.get_client()
         container_id, = client.containers(
-            filters={'name': 'ansible_%s_1' % host},
+            filters={'name': self.container_name(host)},
             limit=1, all=True, quiet=True
         )
+        images = self.image_index()
         previous_image_id, previous_image_buildstamp = get_latest_image_for(
-            self.project_name, host, client
+            self.project_name, host, images
         )
         cmd = self.config['services'][host].get('command', '')
         if isinstance(cmd, list):
@@ -597,9 +900,13 @@ class Engine(BaseEngine):
         entrypoint = self.config['services'][host].get('entrypoint', '')
         if isinstance(entrypoint, list):
             entrypoint = json.dumps(entrypoint)
+        labels = 'com.docker.compose.oneoff="" com.docker.compose.project="%s"' % self.project_name
+        fingerprint = self._fingerprints.get(host)
+        if fingerprint:
+            labels += ' %s="%s"' % (self.FINGERPRINT_LABEL, fingerprint)
         image_config = dict(
             USER=self.config['services'][host].get('user', 'root'),
-            LABEL='com.docker.compose.oneoff="" com.docker.compose.project="%s"' % self.project_name,
+            LABEL=labels,
             ENTRYPOINT=entrypoint,
             CMD=cmd
         )
@@ -608,41 +915,46 @@ class Engine(BaseEngine):
         image_config['WORKDIR'] = workdir if not re.search('\$|\{', workdir) else '/' 
 
         if flatten:
-            logger.info('Flattening image...')
-            exported = client.export(container_id)
-            client.import_image_from_data(
-                exported.read(),
-                repository='%s-%s' % (self.project_name, host),
-                tag=version)
+            logger.info('Flattening image for %s...', host)
+            # Stream the export straight into the import request rather than
+            # buffering the whole filesystem.
+            with span('flatten'):
+                exported = client.export(container_id)
+                client.import_image_from_data(
+                    iter_chunks(exported),
+                    repository='%s-%s' % (self.project_name, host),
+                    tag=version,
+                    changes=[u'LABEL %s' % labels])
         else:
-            logger.info('Committing image...')
-            client.commit(container_id,
-                          repository='%s-%s' % (self.project_name, host),
-                          tag=version,
-                          message='Built using Ansible Container',
-                          changes=u'\n'.join(
-                              [u'%s %s' % (k, v)
-                               for k, v in image_config.items()]
-                          ))
-        image_id, = client.images(
-            '%s-%s:%s' % (self.project_name, host, version),
-            quiet=True
-        )
+            logger.info('Committing image for %s...', host)
+            with span('commit'):
+                client.commit(container_id,
+                              repository='%s-%s' % (self.project_name, host),
+                              tag=version,
+                              message='Built using Ansible Container',
+                              changes=u'\n'.join(
+                                  [u'%s %s' % (k, v)
+                                   for k, v in image_config.items()]
+                              ))
+        image_data = client.inspect_image('%s-%s:%s' % (self.project_name, host, version))
+        image_id = image_data['Id']
+        images.add(image_data)
         logger.info('Exported %s-%s with image ID %s', self.project_name, host,
                     image_id)
-        client.tag(image_id, '%s-%s' % (self.project_name, host), tag='latest',
-                   force=True)
+        with span('tag'):
+            client.tag(image_id, '%s-%s' % (self.project_name, host), tag='latest',
+                       force=True)
+            images.tag(image_id, '%s-%s' % (self.project_name, host), tag='latest')
         logger.info('Cleaning up %s build container...', host)
         client.remove_container(container_id)
 
-        image_data = client.inspect_image(image_id)
-        parent_sha = ''
-        if image_data:
-            parent_sha = image_data.get('Parent', '')
+        parent_sha = image_data.get('Parent', '') or ''
 
         if purge_last and previous_image_id and previous_image_id not in parent_sha:
-            logger.info('Removing previous image...')
-            client.remove_image(previous_image_id, force=True)
+            logger.info('Removing previous image for %s...', host)
+            with span('purge'):
+                client.remove_image(previous_image_id, force=True)
+                images.remove(previous_image_id)
 
     DEFAULT_CONFIG_PATH = '~/.docker/config.json'
 
@@ -699,23 +1011,31 @@ class Engine(BaseEngine):
         :param url: URL
         :return: (username, email) tuple
         """
-        username = None
-        docker_config = None
-        for docker_config_filepath in self.DOCKER_CONFIG_FILEPATH_CASCADE:
-            if docker_config_filepath and os.path.exists(docker_config_filepath):
-                docker_config = json.load(open(docker_config_filepath))
-                break
-        if not docker_config:
-            raise AnsibleContainerDockerConfigFileException("Unable to read your docker config file. Try providing "
-                                                            "login credentials for the registry.")
-        if 'auths' in docker_config:
-            docker_config = docker_config['auths']
-        auth_key = docker_config.get(url, {}).get('auth', '')
-        email = docker_config.get(url, {}).get('email', '')
-        if auth_key:
-            username, password = base64.decodestring(auth_key).split(':', 1)
+        username, _, email = self.registry_credentials(url)
         return username, email
 
+    def credential_store(self):
+        """
+        Registry credentials from the Docker config, parsed once and shared by
+        registry_login, push and shipit.
+
+        :return: CredentialStore
+        """
+        if self._credential_store is None:
+            self._credential_store = CredentialStore(self.DOCKER_CONFIG_FILEPATH_CASCADE)
+        return self._credential_store
+
+    def registry_credentials(self, url):
+        """
+        Gets the credentials stored in the configuration for a URL for the
+        registry for this engine, asking a credential helper if the configuration
+        names one.
+
+        :param url: URL
+        :return: (username, password, email) tuple
+        """
+        return tuple(self.credential_store().get(url))
+
     def update_config_file(self, username, password, email, url, config_path):
         '''
         Update the config file with the authorization.
@@ -768,43 +1088,103 @@ class Engine(BaseEngine):
             raise AnsibleContainerDockerConfigFileException("Failed to write docker registry config to %s - %s" %
                                                             (path, str(exc)))
 
-    def push_latest_image(self, host, url=None, namespace=None, tag=None):
+    def push_latest_image(self, host, url=None, namespace=None, tag=None, progress=None):
         '''
         :param host: The host in the container.yml to push
         :parm url: URL of the registry to which images will be pushed
         :param namespace: namespace to append to the URL
-        :return: None
+        :param tag: tag to push, defaults to the image's build stamp
+        :param progress: PushProgress to report layer progress to, rather than logging each status
+        :return: the pushed image, as repository:tag
         '''
         client = self.get_client()
         image_id, image_buildstamp = get_latest_image_for(self.project_name,
-                                                          host, client)
+                                                          host, self.image_index())
         tag = tag or image_buildstamp
 
         repository = "%s/%s-%s" % (namespace, self.project_name, host)
         if url != self.default_registry_url:
-            url = REMOVE_HTTP.sub('', url)
-            repository = "%s/%s" % (re.sub('/$', '', url), repository)
+            # The repository names the registry by host; the registry itself is reached at url
+            registry = REMOVE_HTTP.sub('', url)
+            repository = "%s/%s" % (re.sub('/$', '', registry), repository)
 
         logger.info('Tagging %s' % repository)
-        client.tag(image_id, repository, tag=tag)
+        with span('tag'):
+            client.tag(image_id, repository, tag=tag)
+            self.image_index().tag(image_id, repository, tag=tag)
+
+        with span('preflight'):
+            state = self.push_preflight(image_id, repository, tag, url)
+        if state:
+            if progress is not None:
+                progress.finish(host, state)
+            return '%s:%s' % (repository, tag)
 
         logger.info('Pushing %s:%s...' % (repository, tag))
-        stream = client.push(repository,
-                             tag=tag,
-                             stream=True)
-        last_status = None
-        for data in stream:
-            data = data.splitlines()
-            for line in data:
-                line = json.loads(line)
+        with span('upload'):
+            stream = client.push(repository,
+                                 tag=tag,
+                                 stream=True,
+                                 auth_config=self.credential_store().auth_config(url))
+            last_status = None
+            for line in iter_stream_events(stream):
                 if type(line) is dict and 'error' in line:
-                    logger.error(line['error'])
-                if type(line) is dict and 'status' in line:
+                    raise AnsibleContainerPushException(u'Pushing %s:%s failed: %s' % (repository, tag, line['error']))
+                if progress is not None:
+                    progress.update(host, line)
+                    logger.debug(line)
+                elif type(line) is dict and 'status' in line:
                     if line['status'] != last_status:
                         logger.info(line['status'])
                     last_status = line['status']
                 else:
                     logger.debug(line)
+        return '%s:%s' % (repository, tag)
+
+    def push_progress(self):
+        return PushProgress()
+
+    def registry_client(self, url):
+        """
+        Client for the registry at url, authenticated with the stored credentials.
+        """
+        return self.credential_store().registry_client(url)
+
+    def push_preflight(self, image_id, repository, tag, url):
+        """
+        Work out whether pushing repository:tag would send anything the registry
+        doesn't already have. The image's manifest digests for the repository, which
+        the engine records when it pushes or pulls, are compared with the manifest the
+        registry serves for the tag. If the tag is new but the registry holds the
+        image under another tag, the tag is added to that manifest in the registry.
+
+        :param image_id: image to push
+        :param repository: repository, including any registry host
+        :param tag: tag to push
+        :param url: URL of the registry
+        :return: 'unchanged' or 'tagged' if no push is needed, otherwise None
+        """
+        prefix = repository + '@'
+        local_digests = [repo_digest[len(prefix):]
+                         for repo_digest in self.get_client().inspect_image(image_id).get('RepoDigests') or []
+                         if repo_digest.startswith(prefix)]
+        if not local_digests:
+            return None
+        name = RegistryClient.repository_name(repository)
+        try:
+            registry = self.registry_client(url)
+            remote_digest = registry.manifest_digest(name, tag)
+            if remote_digest in local_digests:
+                logger.info('%s:%s is unchanged in the registry, skipping push', repository, tag)
+                return 'unchanged'
+            for digest in local_digests:
+                if registry.manifest_digest(name, digest):
+                    logger.info('%s is already in the registry, adding tag %s', repository, tag)
+                    registry.tag_manifest(name, digest, tag)
+                    return 'tagged'
+        except Exception as exc:
+            logger.debug('Registry check for %s:%s failed, pushing: %s', repository, tag, exc)
+        return None
 
     def get_client(self):
         if not self._client:
@@ -817,11 +1197,88 @@ class Engine(BaseEngine):
             os.environ['DOCKER_API_VERSION'] = self.api_version
         return self._client
 
+    def get_log_client(self):
+        """
+        A client for following container logs, which can go quiet for longer
+        than the usual request timeout.
+        """
+        if not self._log_client:
+            self.get_client()
+            client_kwargs = kwargs_from_env(assert_hostname=False)
+            self._log_client = docker.Client(version=self.api_version, timeout=None, **client_kwargs)
+        return self._log_client
+
     def print_version_info(self):
         client = self.get_client()
         pprint.pprint(client.info())
         pprint.pprint(client.version())
 
+    # The only environment variables the compose templates read
+    TEMPLATE_ENVIRONMENT_VARIABLES = ('DOCKER_HOST', 'DOCKER_TLS_VERIFY', 'DOCKER_CERT_PATH')
+
+    # Rendered compose files are kept across invocations in the user's cache directory, never
+    # the project, as they hold --with-variables values and config rendered from the
+    # environment. Only the current user can read them, and unused ones are pruned.
+    COMPOSE_CACHE_ENTRIES = 100
+    COMPOSE_CACHE_MAX_AGE = 7 * 24 * 60 * 60
+
+    def compose_cache(self):
+        return FileCache(user_cache_path('compose'), private=True,
+                         max_entries=self.COMPOSE_CACHE_ENTRIES, max_age=self.COMPOSE_CACHE_MAX_AGE)
+
+    # Operations whose builder container installs ansible/requirements.txt and requirements.yml
+    BUILDER_CACHE_OPERATIONS = ('build', 'listhosts', 'install')
+
+    def ensure_builder_cache_volumes(self):
+        """
+        Create, if missing, the named volumes the builder container keeps its pip
+        packages and Galaxy roles in between runs.
+
+        :return: dict of cache name (pip, galaxy) to volume name
+        """
+        cache_volumes = dict((cache, '%s-ansible-container-%s-cache' % (self.project_name, cache))
+                             for cache in ('pip', 'galaxy'))
+        self.ensure_volumes(cache_volumes.values())
+        return cache_volumes
+
+    def template_environment(self):
+        """
+        The part of the environment the compose templates read.
+
+        :return: dict
+        """
+        return dict((key, os.environ[key]) for key in self.TEMPLATE_ENVIRONMENT_VARIABLES
+                    if key in os.environ)
+
+    def compose_digest(self, operation, version, config, volumes, hosts, builder_img_id,
+                       builder_cache_volumes, context):
+        """
+        Identify a rendered compose file by everything that goes into it: the
+        operation's config, the template context, the environment variables the
+        templates read and the templates.
+
+        :return: hex digest
+        """
+        digest = ContentHash()
+        digest.update_json(dict(release=release_version,
+                                operation=operation,
+                                version=version,
+                                config=config,
+                                volumes=volumes,
+                                hosts=sorted(hosts),
+                                project_name=self.project_name,
+                                base_path=self.base_path,
+                                params=self.params,
+                                api_version=self.api_version,
+                                builder_img_id=builder_img_id,
+                                builder_cache_volumes=builder_cache_volumes,
+                                context=context,
+                                env=self.template_environment()))
+        template_path = jinja_template_path()
+        for template in ('compose_versioned.j2.yml', '%s-docker-compose.j2.yml' % operation):
+            digest.update_file(os.path.join(template_path, template))
+        return digest.hexdigest()
+
     def bootstrap_env(self, temp_dir, behavior, operation, compose_option,
                       builder_img_id=None, context=None):
         """
@@ -847,58 +1304,92 @@ class Engine(BaseEngine):
                                                                 operation))()
         config = getattr(self, 'get_config_for_%s' % operation)()
         logger.debug('%s' % (config,))
-        config_yaml = yaml_dump(config['services']) if config else ''
-        logger.debug('Config YAML is')
-        logger.debug(config_yaml)
         hosts = self.all_hosts_in_orchestration()
         version = config.get('version', '1')
-        volumes_yaml = yaml_dump(config['volumes']) if config and config.get('volumes') else ''
+        volumes = dict(config.get('volumes') or {}) if config else {}
+        builder_cache_volumes = {}
+        if operation in self.BUILDER_CACHE_OPERATIONS:
+            builder_cache_volumes = self.ensure_builder_cache_volumes()
+            for volume_name in builder_cache_volumes.values():
+                volumes[volume_name] = {'external': True}
         if operation == 'build' and self.params.get('service'):
             # build operation is limited to a specific list of services
             hosts = list(set(hosts).intersection(self.params['service']))
-        if version == '1':
-            logger.debug('HERE VERSION 1')
-            jinja_render_to_temp('%s-docker-compose.j2.yml' % (operation,),
-                                 temp_dir,
-                                 'docker-compose.yml',
-                                 hosts=hosts,
-                                 project_name=self.project_name,
-                                 base_path=self.base_path,
-                                 params=self.params,
-                                 api_version=self.api_version,
-                                 builder_img_id=builder_img_id,
-                                 config=config_yaml,
-                                 env=os.environ,
-                                 **context)
+
+        project = self.orchestration_project(operation)
+        # The builder's inventory script and wait_on_host.py read the project name from
+        # the environment, which compose passes through, so the compose file doesn't vary
+        os.environ['ANSIBLE_CONTAINER_PROJECT'] = project
+        compose_digest = self.compose_digest(operation, version, config, volumes, hosts,
+                                             builder_img_id, builder_cache_volumes, context)
+        compose_cache = self.compose_cache()
+        compose_file = os.path.join(temp_dir, 'docker-compose.yml')
+        rendered = compose_cache.get(compose_digest)
+        if rendered is not None:
+            logger.debug('Using cached compose file %s', compose_digest)
+            with open(compose_file, 'wb') as f:
+                f.write(rendered.encode('utf8'))
         else:
-            jinja_render_to_temp('compose_versioned.j2.yml',
-                                 temp_dir,
-                                 'docker-compose.yml',
-                                 template='%s-docker-compose.j2.yml' % (operation,),
-                                 hosts=hosts,
-                                 project_name=self.project_name,
-                                 base_path=self.base_path,
-                                 params=self.params,
-                                 api_version=self.api_version,
-                                 builder_img_id=builder_img_id,
-                                 config=config_yaml,
-                                 env=os.environ,
-                                 version=version,
-                                 volumes=volumes_yaml,
-                                 **context)
+            config_yaml = yaml_dump(config['services']) if config else ''
+            logger.debug('Config YAML is')
+            logger.debug(config_yaml)
+            volumes_yaml = yaml_dump(volumes) if volumes else ''
+            if version == '1':
+                logger.debug('HERE VERSION 1')
+                jinja_render_to_temp('%s-docker-compose.j2.yml' % (operation,),
+                                     temp_dir,
+                                     'docker-compose.yml',
+                                     hosts=hosts,
+                                     project_name=self.project_name,
+                                     base_path=self.base_path,
+                                     params=self.params,
+                                     api_version=self.api_version,
+                                     builder_img_id=builder_img_id,
+                                     builder_cache_volumes=builder_cache_volumes,
+                                     config=config_yaml,
+                                     env=self.template_environment(),
+                                     **context)
+            else:
+                jinja_render_to_temp('compose_versioned.j2.yml',
+                                     temp_dir,
+                                     'docker-compose.yml',
+                                     template='%s-docker-compose.j2.yml' % (operation,),
+                                     hosts=hosts,
+                                     project_name=self.project_name,
+                                     base_path=self.base_path,
+                                     params=self.params,
+                                     api_version=self.api_version,
+                                     builder_img_id=builder_img_id,
+                                     builder_cache_volumes=builder_cache_volumes,
+                                     config=config_yaml,
+                                     env=self.template_environment(),
+                                     version=version,
+                                     volumes=volumes_yaml,
+                                     **context)
+            with open(compose_file, 'rb') as f:
+                compose_cache.set(compose_digest, f.read().decode('utf8'))
         options = self.DEFAULT_COMPOSE_OPTIONS.copy()
 
         options.update({
             u'--verbose': self.params['debug'],
-            u'--file': [
-                os.path.join(temp_dir,
-                             'docker-compose.yml')],
-            u'--project-name': 'ansible',
+            u'--file': [compose_file],
+            u'--project-name': project,
         })
         command_options = getattr(self, 'DEFAULT_COMPOSE_{}_OPTIONS'.format(
             compose_option.upper())).copy()
         command_options.update(extra_options)
 
+        if self.params.get('orchestrator') == 'native':
+            orchestrator = Orchestrator(self.get_client(), compose_file, self.base_path + '/ansible',
+                                        project_name=project, log_client=self.get_log_client())
+            return options, command_options, OrchestratorCommand(orchestrator)
+
+        try:
+            from compose.cli.command import project_from_options
+            from compose.cli import main
+        except Exception as exc:
+            raise Exception("Error importing Docker compose: {0}".format(exc))
+
         project = project_from_options(self.base_path + '/ansible', options)
         command = main.TopLevelCommand(project)
 
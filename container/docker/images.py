@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import copy
+import threading
+
+
+def split_image_name(name):
+    '''
+    Split an image reference into repository and tag. A colon only separates the
+    tag when it comes after the last slash, so registry ports are left alone.
+
+    :param name: string, e.g. registry:5000/project-web:20170101000000
+    :return: (repository, tag) tuple, where tag is None if not given
+    '''
+    repository, _, tag = name.rpartition(':')
+    if not repository or '/' in tag:
+        return name, None
+    return repository, tag
+
+
+class ImageIndex(object):
+    '''
+    Snapshot of the images known to the Docker engine, taken with a single
+    client.images() call and indexed by id, repository and tag. The engine
+    records the images it creates, tags and removes, so the snapshot stays
+    current without querying the daemon again. images() answers the same
+    queries as client.images(name, quiet), so the index can stand in for a
+    client wherever only that method is used.
+    '''
+
+    def __init__(self, client):
+        self.client = client
+        self._lock = threading.RLock()
+        self.refresh()
+
+    def refresh(self):
+        with self._lock:
+            self._by_id = {}
+            self._by_repository = {}
+            for image in self.client.images() or []:
+                self._add(image)
+
+    def _add(self, image):
+        image = dict(image, RepoTags=list(image.get('RepoTags') or []))
+        self._by_id[image['Id']] = image
+        for repo_tag in image['RepoTags']:
+            repository, tag = split_image_name(repo_tag)
+            if tag is not None and repository != '<none>':
+                self._by_repository.setdefault(repository, {})[tag] = image['Id']
+
+    def _untag(self, repository, tag):
+        image_id = self._by_repository.get(repository, {}).pop(tag, None)
+        if image_id in self._by_id:
+            repo_tag = '%s:%s' % (repository, tag)
+            repo_tags = self._by_id[image_id]['RepoTags']
+            if repo_tag in repo_tags:
+                repo_tags.remove(repo_tag)
+
+    def add(self, image):
+        '''
+        Record an image created by the engine.
+
+        :param image: dict with at least Id and RepoTags, as returned by client.images() or client.inspect_image()
+        :return: None
+        '''
+        with self._lock:
+            self.remove(image['Id'])
+            for repo_tag in image.get('RepoTags') or []:
+                repository, tag = split_image_name(repo_tag)
+                if tag is not None:
+                    self._untag(repository, tag)
+            self._add(image)
+
+    def tag(self, image_id, repository, tag='latest'):
+        '''
+        Record that image_id was tagged, moving the tag off any other image.
+        '''
+        with self._lock:
+            self._untag(repository, tag)
+            image = self._by_id.get(image_id)
+            if image is None:
+                image = self._by_id[image_id] = dict(Id=image_id, RepoTags=[])
+            image['RepoTags'].append('%s:%s' % (repository, tag))
+            self._by_repository.setdefault(repository, {})[tag] = image_id
+
+    def remove(self, image_id):
+        '''
+        Record that image_id was removed, along with all of its tags.
+        '''
+        with self._lock:
+            image = self._by_id.pop(image_id, None)
+            for repo_tag in (image or {}).get('RepoTags', []):
+                repository, tag = split_image_name(repo_tag)
+                if self._by_repository.get(repository, {}).get(tag) == image_id:
+                    del self._by_repository[repository][tag]
+
+    def get_id(self, name):
+        '''
+        :param name: repository:tag, or an image id
+        :return: image id, or None if there is no such image
+        '''
+        with self._lock:
+            if name in self._by_id:
+                return name
+            repository, tag = split_image_name(name)
+            return self._by_repository.get(repository, {}).get(tag or 'latest')
+
+    def images(self, name=None, quiet=False):
+        '''
+        Images in the snapshot, optionally limited to a repository or repository:tag.
+
+        :param name: string
+        :param quiet: return only ids
+        :return: list of image dicts, or of ids if quiet
+        '''
+        with self._lock:
+            if name is None:
+                image_ids = list(self._by_id)
+            else:
+                repository, tag = split_image_name(name)
+                tags = self._by_repository.get(repository, {})
+                if tag is None:
+                    image_ids = sorted(set(tags.values()))
+                else:
+                    image_ids = [tags[tag]] if tag in tags else []
+            if quiet:
+                return image_ids
+            return [copy.deepcopy(self._by_id[image_id]) for image_id in image_ids]
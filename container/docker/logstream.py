@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import collections
+import re
+import threading
+
+import six
+
+__all__ = ['LineStream',
+           'RingBufferSink',
+           'ListHostsParser']
+
+
+def to_text(data):
+    if isinstance(data, six.binary_type):
+        return data.decode('utf-8', 'replace')
+    return data
+
+
+class LineStream(object):
+    '''
+    A file-like object that compose's LogPrinter and the native Orchestrator
+    write container output to. Writes are split into lines as they arrive and
+    each line is handed to every sink, so nothing holds on to the whole output
+    unless a sink chooses to.
+
+    A sink is anything with a line(text) method; it may also have close().
+    '''
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+        self._pending = u''
+        self._lock = threading.Lock()
+
+    def write(self, data):
+        with self._lock:
+            lines = (self._pending + to_text(data)).split(u'\n')
+            self._pending = lines.pop()
+            for line in lines:
+                self._emit(line)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+    def _emit(self, line):
+        # Output of containers with a TTY ends its lines with \r\n
+        line = line.rstrip(u'\r')
+        for sink in self.sinks:
+            sink.line(line)
+
+    def close(self):
+        with self._lock:
+            if self._pending:
+                self._emit(self._pending)
+                self._pending = u''
+            for sink in self.sinks:
+                if hasattr(sink, 'close'):
+                    sink.close()
+
+
+class RingBufferSink(object):
+    '''
+    Keep the last size lines, for showing what led up to a failure.
+    '''
+
+    def __init__(self, size=1000):
+        self.lines = collections.deque(maxlen=size)
+
+    def line(self, text):
+        self.lines.append(text)
+
+
+class ListHostsParser(object):
+    '''
+    Pull the hosts out of the output of ansible-playbook --list-hosts as the
+    lines arrive.
+
+    Container output comes prefixed with "<name> | ". --list-hosts prints each
+    host on its own line, indented by six spaces, under its play's "hosts (N):"
+    line.
+    '''
+
+    # Compose colors the container name unless it runs monochrome
+    ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;]*m')
+
+    def __init__(self):
+        self.hosts = set()
+
+    def line(self, text):
+        text = self.ANSI_ESCAPE.sub(u'', text)
+        if u'|' not in text:
+            return
+        output = text.rsplit(u'|', 1)[1]
+        if output.startswith(u'       ') and output.strip():
+            self.hosts.add(output.strip())
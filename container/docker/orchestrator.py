@@ -0,0 +1,647 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import os
+import re
+import sys
+import threading
+
+from multiprocessing.pool import ThreadPool
+
+import six
+import yaml
+from six.moves import queue
+
+from docker.client import errors as docker_errors
+
+from ..cache import ContentHash
+from ..exceptions import AnsibleContainerOrchestrationException
+from .images import split_image_name
+
+LABEL_PROJECT = 'com.docker.compose.project'
+LABEL_SERVICE = 'com.docker.compose.service'
+LABEL_NUMBER = 'com.docker.compose.container-number'
+LABEL_ONE_OFF = 'com.docker.compose.oneoff'
+LABEL_NETWORK = 'com.docker.compose.network'
+LABEL_VOLUME = 'com.docker.compose.volume'
+LABEL_CONFIG_HASH = 'com.ansible.container.config-hash'
+
+DEFAULT_TIMEOUT = 10
+
+# $VAR, ${VAR} and the $$ escape, as interpolated by docker-compose
+INTERPOLATION = re.compile(r'\$(?:(?P<escaped>\$)|(?P<named>[_a-zA-Z][_a-zA-Z0-9]*)|{(?P<braced>[_a-zA-Z][_a-zA-Z0-9]*)})')
+
+
+def interpolate(value, environment):
+    '''
+    Substitute environment variables into every string of a parsed compose file.
+    As in compose, unset variables become empty strings.
+    '''
+    if isinstance(value, dict):
+        return dict((key, interpolate(item, environment)) for key, item in value.items())
+    if isinstance(value, list):
+        return [interpolate(item, environment) for item in value]
+    if isinstance(value, six.string_types):
+        def substitute(match):
+            if match.group('escaped'):
+                return '$'
+            name = match.group('named') or match.group('braced')
+            if name not in environment:
+                logger.warning('The %s variable is not set. Defaulting to a blank string.', name)
+            return environment.get(name, '')
+        return INTERPOLATION.sub(substitute, value)
+    return value
+
+
+def load_compose_file(path, environment=None):
+    '''
+    Read a compose file the engine rendered.
+
+    :param path: path to docker-compose.yml
+    :param environment: dict used for variable interpolation, defaults to os.environ
+    :return: (version, services, volumes) tuple
+    '''
+    with open(path, 'r') as f:
+        data = interpolate(yaml.safe_load(f) or {}, dict(os.environ if environment is None else environment))
+    version = str(data.get('version', '1'))
+    if version == '1':
+        return version, data, {}
+    return version, data.get('services') or {}, data.get('volumes') or {}
+
+
+def as_dict(value, separator='='):
+    '''
+    Normalize compose's list-or-dict options (environment, labels, extra_hosts).
+    List entries without a separator map to None.
+    '''
+    if isinstance(value, dict):
+        return dict(value)
+    result = {}
+    for item in value or []:
+        key, sep, item_value = six.text_type(item).partition(separator)
+        result[key] = item_value if sep else None
+    return result
+
+
+def as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
+def expand_port_range(spec):
+    if '-' in spec:
+        start, end = spec.split('-', 1)
+        return [str(port) for port in range(int(start), int(end) + 1)]
+    return [spec]
+
+
+def parse_port(spec):
+    '''
+    Parse a compose port: [[ip:]host:]container[/protocol], where host and container
+    may be ranges of the same length.
+
+    :return: list of ((container port, protocol), host binding or None) tuples
+    '''
+    spec = six.text_type(spec)
+    protocol = 'tcp'
+    if '/' in spec:
+        spec, protocol = spec.rsplit('/', 1)
+    parts = spec.split(':')
+    container = expand_port_range(parts[-1])
+    if len(parts) == 1:
+        return [((int(port), protocol), None) for port in container]
+    ip = parts[0] if len(parts) == 3 else None
+    host = expand_port_range(parts[-2]) if parts[-2] else [None] * len(container)
+    if len(host) != len(container):
+        raise AnsibleContainerOrchestrationException(u'Port ranges do not match in %s' % spec)
+    bindings = []
+    for container_port, host_port in zip(container, host):
+        host_port = int(host_port) if host_port else None
+        binding = (ip, host_port) if ip else host_port
+        bindings.append(((int(container_port), protocol), binding))
+    return bindings
+
+
+def restart_policy(value):
+    if not value or value == 'no':
+        return None
+    name, _, retries = six.text_type(value).partition(':')
+    return dict(Name=name, MaximumRetryCount=int(retries or 0))
+
+
+def service_dependencies(service):
+    '''
+    Names of the services a service needs started before it, from depends_on,
+    links and volumes_from.
+    '''
+    dependencies = set(as_list(service.get('depends_on')))
+    for link in as_list(service.get('links')):
+        dependencies.add(link.split(':', 1)[0])
+    for source in as_list(service.get('volumes_from')):
+        if not source.startswith('container:'):
+            dependencies.add(source.split(':', 1)[0])
+    return dependencies
+
+
+def with_dependencies(services, names):
+    '''
+    The named services along with every service they depend on, directly or not.
+
+    :param services: dict of service name to definition
+    :param names: service names
+    :return: set of service names
+    '''
+    needed = set(names)
+    pending = list(needed)
+    while pending:
+        for dependency in service_dependencies(services[pending.pop()]):
+            if dependency in services and dependency not in needed:
+                needed.add(dependency)
+                pending.append(dependency)
+    return needed
+
+
+def start_order(services, names=None, include_dependencies=True):
+    '''
+    Group services into waves that can each be started concurrently: every
+    service comes after all of the services it depends on.
+
+    :param services: dict of service name to definition
+    :param names: services to start, defaults to all
+    :param include_dependencies: also start what the named services depend on
+    :return: list of lists of service names
+    '''
+    selected = set(services if not names else names)
+    unknown = selected - set(services)
+    if unknown:
+        raise AnsibleContainerOrchestrationException(u'No such service: %s' % u', '.join(sorted(unknown)))
+    dependencies = {}
+    pending = list(selected)
+    while pending:
+        name = pending.pop()
+        deps = set(dep for dep in service_dependencies(services[name]) if dep in services)
+        if not include_dependencies:
+            deps &= selected
+        dependencies[name] = deps
+        for dep in deps:
+            if dep not in dependencies and dep not in pending:
+                pending.append(dep)
+    waves = []
+    done = set()
+    while len(done) < len(dependencies):
+        wave = sorted(name for name, deps in dependencies.items() if name not in done and deps <= done)
+        if not wave:
+            raise AnsibleContainerOrchestrationException(
+                u'Circular dependency between services: %s' % u', '.join(sorted(set(dependencies) - done)))
+        waves.append(wave)
+        done.update(wave)
+    return waves
+
+
+def run_parallel(func, items):
+    '''
+    Call func for every item at once, wait for all of them and re-raise the first
+    failure.
+    '''
+    items = list(items)
+    if len(items) < 2:
+        return [func(item) for item in items]
+
+    def call(item):
+        try:
+            return func(item), None
+        except Exception as exc:
+            logger.debug('Failed on %s', item, exc_info=True)
+            return None, exc
+
+    pool = ThreadPool(processes=len(items))
+    try:
+        results = pool.map(call, items)
+    finally:
+        pool.close()
+        pool.join()
+    for _, exc in results:
+        if exc is not None:
+            raise exc
+    return [result for result, _ in results]
+
+
+def to_native(text):
+    if six.PY2 and isinstance(text, six.text_type):
+        return text.encode('utf-8')
+    if not six.PY2 and isinstance(text, bytes):
+        return text.decode('utf-8', 'replace')
+    return text
+
+
+class Orchestrator(object):
+    '''
+    Runs the services of a compose file the engine rendered by talking to the
+    Docker engine directly, in place of docker-compose. Containers, networks and
+    volumes are named and labeled the way compose names and labels them, so
+    the builder finds the containers it expects and either orchestrator can
+    stop what the other started.
+    '''
+
+    # Where container logs go when not attached; TeedStdout points this at its LineStream
+    log_output = None
+
+    def __init__(self, client, compose_file, project_dir, project_name='ansible', log_client=None):
+        '''
+        :param client: docker.Client
+        :param compose_file: path to the rendered docker-compose.yml
+        :param project_dir: directory relative bind mounts are resolved against
+        :param project_name: prefix for container, network and volume names
+        :param log_client: docker.Client without a read timeout, for following logs
+        '''
+        self.client = client
+        self.log_client = log_client or client
+        self.project_dir = project_dir
+        self.project_name = project_name
+        self.version, self.services, self.volumes = load_compose_file(compose_file)
+        self._output_lock = threading.Lock()
+
+    # Names
+
+    def container_name(self, service):
+        return '%s_%s_1' % (self.project_name, service)
+
+    @property
+    def network_name(self):
+        return '%s_default' % self.project_name
+
+    def volume_name(self, name):
+        definition = self.volumes.get(name) or {}
+        external = definition.get('external')
+        if external:
+            return external.get('name', name) if isinstance(external, dict) else name
+        return '%s_%s' % (self.project_name, name)
+
+    # Output
+
+    def write(self, text):
+        output = self.log_output or sys.stdout
+        with self._output_lock:
+            output.write(to_native(text))
+            output.flush()
+
+    # Containers
+
+    def find_container(self, service):
+        containers = self.client.containers(all=True, filters={'name': self.container_name(service)})
+        for container in containers:
+            # The name filter matches substrings
+            if '/%s' % self.container_name(service) in container.get('Names', []):
+                return container
+        return None
+
+    def project_containers(self):
+        return self.client.containers(all=True, filters={'label': '%s=%s' % (LABEL_PROJECT, self.project_name)})
+
+    def _bind(self, source, target, mode):
+        if source.startswith(('/', '.', '~')):
+            source = os.path.normpath(os.path.join(self.project_dir, os.path.expanduser(source)))
+        elif self.version != '1':
+            if source not in self.volumes:
+                raise AnsibleContainerOrchestrationException(
+                    u'Named volume "%s" is used but not declared in the volumes section' % source)
+            source = self.volume_name(source)
+        return '%s:%s:%s' % (source, target, mode) if mode else '%s:%s' % (source, target)
+
+    def container_options(self, service):
+        '''
+        Translate a service definition into create_container arguments.
+
+        :param service: service name
+        :return: dict
+        '''
+        definition = self.services[service]
+        binds, container_volumes = [], []
+        for volume in as_list(definition.get('volumes')):
+            parts = volume.split(':')
+            if len(parts) == 1:
+                container_volumes.append(parts[0])
+                continue
+            container_volumes.append(parts[1])
+            binds.append(self._bind(parts[0], parts[1], parts[2] if len(parts) > 2 else None))
+
+        ports, port_bindings = [], {}
+        for spec in as_list(definition.get('expose')):
+            for port, _ in parse_port(spec):
+                ports.append(port)
+        for spec in as_list(definition.get('ports')):
+            for port, binding in parse_port(spec):
+                ports.append(port)
+                port_bindings.setdefault('%s/%s' % port, []).append(binding)
+
+        environment = {}
+        for key, value in as_dict(definition.get('environment')).items():
+            if value is None:
+                if key not in os.environ:
+                    continue
+                value = os.environ[key]
+            environment[key] = six.text_type(value)
+
+        volumes_from = []
+        for source in as_list(definition.get('volumes_from')):
+            parts = source.split(':')
+            if parts[0] == 'container':
+                volumes_from.append(':'.join(parts[1:]))
+            else:
+                parts[0] = self.container_name(parts[0])
+                volumes_from.append(':'.join(parts))
+
+        links = []
+        for link in as_list(definition.get('links')):
+            target, _, alias = link.partition(':')
+            links.append((self.container_name(target), alias or target))
+
+        labels = dict((key, six.text_type(value or '')) for key, value in as_dict(definition.get('labels')).items())
+        labels.update({LABEL_PROJECT: self.project_name,
+                       LABEL_SERVICE: service,
+                       LABEL_NUMBER: '1',
+                       LABEL_ONE_OFF: 'False'})
+
+        host_config = dict(binds=binds or None,
+                           port_bindings=port_bindings or None,
+                           privileged=bool(definition.get('privileged')),
+                           read_only=definition.get('read_only'),
+                           cap_add=definition.get('cap_add'),
+                           cap_drop=definition.get('cap_drop'),
+                           extra_hosts=as_dict(definition.get('extra_hosts'), ':') or None,
+                           volumes_from=volumes_from or None,
+                           restart_policy=restart_policy(definition.get('restart')),
+                           tmpfs=as_list(definition.get('tmpfs')) or None)
+        if self.version == '1':
+            host_config['links'] = links or None
+        else:
+            host_config['network_mode'] = self.network_name
+
+        options = dict(image=definition['image'],
+                       command=definition.get('command'),
+                       entrypoint=definition.get('entrypoint'),
+                       environment=environment,
+                       user=definition.get('user'),
+                       working_dir=definition.get('working_dir'),
+                       ports=ports or None,
+                       volumes=container_volumes or None,
+                       labels=labels,
+                       stdin_open=bool(definition.get('stdin_open')),
+                       tty=bool(definition.get('tty')),
+                       host_config=host_config,
+                       links=links)
+        return options
+
+    def image_id(self, image):
+        '''
+        Id of an image, pulling it first if the engine doesn't have it.
+        '''
+        try:
+            return self.client.inspect_image(image)['Id']
+        except docker_errors.NotFound:
+            pass
+        repository, tag = split_image_name(image)
+        self.write(u'Pulling %s...\n' % image)
+        for line in self.client.pull(repository, tag=tag or 'latest', stream=True, decode=True):
+            if isinstance(line, dict) and line.get('error'):
+                raise AnsibleContainerOrchestrationException(u'Failed to pull %s: %s' % (image, line['error']))
+        return self.client.inspect_image(image)['Id']
+
+    def ensure_network(self):
+        if self.version == '1':
+            return
+        if not self.client.networks(names=[self.network_name]):
+            logger.debug('Creating network %s', self.network_name)
+            self.client.create_network(self.network_name, driver='bridge',
+                                       labels={LABEL_PROJECT: self.project_name, LABEL_NETWORK: 'default'})
+
+    def ensure_volumes(self):
+        if self.version == '1':
+            return
+        existing = set(volume['Name'] for volume in (self.client.volumes() or {}).get('Volumes') or [])
+        for name, definition in self.volumes.items():
+            definition = definition or {}
+            volume_name = self.volume_name(name)
+            if volume_name in existing:
+                continue
+            if definition.get('external'):
+                raise AnsibleContainerOrchestrationException(u'External volume "%s" does not exist' % volume_name)
+            logger.debug('Creating volume %s', volume_name)
+            self.client.create_volume(name=volume_name, driver=definition.get('driver', 'local'),
+                                      driver_opts=definition.get('driver_opts'),
+                                      labels={LABEL_PROJECT: self.project_name, LABEL_VOLUME: name})
+
+    def converge_service(self, service, force_recreate=False):
+        '''
+        Make sure the service's container exists with its current definition and
+        image, and is running. A container is only recreated when its definition
+        or image changed, or when forced.
+
+        :return: container id
+        '''
+        options = self.container_options(service)
+        links = options.pop('links')
+        image_id = self.image_id(options['image'])
+        config_hash = ContentHash().update_json([options, image_id]).hexdigest()
+        options['labels'][LABEL_CONFIG_HASH] = config_hash
+
+        existing = self.find_container(service)
+        if existing:
+            if not force_recreate and existing.get('Labels', {}).get(LABEL_CONFIG_HASH) == config_hash:
+                if not existing.get('State') == 'running' and not existing['Status'].startswith('Up'):
+                    self.write(u'Starting %s\n' % self.container_name(service))
+                    self.client.start(existing['Id'])
+                else:
+                    self.write(u'%s is up-to-date\n' % self.container_name(service))
+                return existing['Id']
+            self.write(u'Recreating %s\n' % self.container_name(service))
+            self.client.stop(existing['Id'], timeout=DEFAULT_TIMEOUT)
+            self.client.remove_container(existing['Id'])
+        else:
+            self.write(u'Creating %s\n' % self.container_name(service))
+
+        options['host_config'] = self.client.create_host_config(**options['host_config'])
+        if self.version != '1':
+            options['networking_config'] = self.client.create_networking_config({
+                self.network_name: self.client.create_endpoint_config(aliases=[service], links=links or None)
+            })
+        container = self.client.create_container(name=self.container_name(service), detach=True, **options)
+        self.client.start(container['Id'])
+        return container['Id']
+
+    def up(self, services=None, detached=False, force_recreate=False, abort_on_container_exit=False,
+           remove_orphans=False, no_deps=False, timeout=None):
+        '''
+        Start services along with the services they depend on, each wave of
+        independent services concurrently, then unless detached follow their logs
+        until they exit.
+
+        :param services: names of the services to start, defaults to all
+        :return: dict of service name to exit code, empty when detached
+        '''
+        waves = start_order(self.services, services, include_dependencies=not no_deps)
+        self.handle_orphans(remove_orphans)
+        self.ensure_network()
+        self.ensure_volumes()
+        container_ids = {}
+        for wave in waves:
+            logger.debug('Starting %s', ', '.join(wave))
+            ids = run_parallel(lambda service: self.converge_service(service, force_recreate=force_recreate), wave)
+            container_ids.update(zip(wave, ids))
+        if detached:
+            return {}
+        attached = services or list(self.services)
+        return self.follow(dict((service, container_ids[service]) for service in attached),
+                           cascade_stop=abort_on_container_exit, timeout=timeout)
+
+    def handle_orphans(self, remove_orphans):
+        for container in self.project_containers():
+            service = (container.get('Labels') or {}).get(LABEL_SERVICE)
+            if service in self.services:
+                continue
+            name = container['Names'][0].lstrip('/') if container.get('Names') else container['Id']
+            if remove_orphans:
+                self.write(u'Removing orphan container %s\n' % name)
+                self.client.remove_container(container['Id'], force=True)
+            else:
+                logger.warning('Found orphan container %s for this project. Use --remove-orphans to remove it.',
+                               name)
+
+    def follow(self, containers, cascade_stop=False, timeout=None):
+        '''
+        Print the output of each container, prefixed with its name as compose
+        does, until all of them exit or, with cascade_stop, until one does, after
+        which the rest are stopped.
+
+        :param containers: dict of service name to container id
+        :return: dict of service name to exit code
+        '''
+        prefixes = dict((service, ('%s_1' % service).ljust(max(len(name) for name in containers) + 2) + ' |')
+                        for service in containers)
+        exits = queue.Queue()
+
+        def follow_container(service):
+            pending = b''
+            try:
+                for chunk in self.log_client.logs(containers[service], stream=True, follow=True):
+                    lines = (pending + chunk).split(b'\n')
+                    pending = lines.pop()
+                    for line in lines:
+                        self.write(u'%s %s\n' % (prefixes[service], line.decode('utf-8', 'replace')))
+                if pending:
+                    self.write(u'%s %s\n' % (prefixes[service], pending.decode('utf-8', 'replace')))
+                exit_code = self.client.wait(containers[service])
+            except Exception as exc:
+                logger.debug('Following %s failed', service, exc_info=True)
+                exit_code = None
+                self.write(u'Lost contact with %s: %s\n' % (self.container_name(service), exc))
+            else:
+                self.write(u'%s exited with code %s\n' % (self.container_name(service), exit_code))
+            exits.put((service, exit_code))
+
+        for service in containers:
+            thread = threading.Thread(target=follow_container, args=(service,))
+            thread.daemon = True
+            thread.start()
+
+        exit_codes = {}
+        try:
+            while len(exit_codes) < len(containers):
+                try:
+                    service, exit_code = exits.get(timeout=1)
+                except queue.Empty:
+                    continue
+                exit_codes[service] = exit_code
+                if cascade_stop:
+                    self.write(u'Aborting on container exit...\n')
+                    break
+        except KeyboardInterrupt:
+            self.write(u'Gracefully stopping... (press Ctrl+C again to force)\n')
+            cascade_stop = True
+        if cascade_stop:
+            self.stop(timeout=timeout)
+        return exit_codes
+
+    def _service_containers(self, services):
+        '''
+        Existing containers of the given services, in reverse start order, so
+        dependents are handled before what they depend on.
+        '''
+        names = services or list(self.services)
+        waves = start_order(self.services, names, include_dependencies=False)
+        result = []
+        for wave in reversed(waves):
+            wave_containers = []
+            for service in wave:
+                container = self.find_container(service)
+                if container:
+                    wave_containers.append((service, container))
+            result.append(wave_containers)
+        return result
+
+    def stop(self, services=None, timeout=None):
+        for wave in self._service_containers(services):
+            def stop_container(item):
+                service, container = item
+                self.write(u'Stopping %s\n' % self.container_name(service))
+                self.client.stop(container['Id'], timeout=timeout or DEFAULT_TIMEOUT)
+            run_parallel(stop_container, wave)
+
+    def kill(self, services=None):
+        for wave in self._service_containers(services):
+            def kill_container(item):
+                service, container = item
+                self.write(u'Killing %s\n' % self.container_name(service))
+                try:
+                    self.client.kill(container['Id'])
+                except docker_errors.APIError as exc:
+                    # Killing a container that isn't running fails; that's fine
+                    logger.debug('Kill %s: %s', service, exc)
+            run_parallel(kill_container, wave)
+
+    def restart(self, services=None, timeout=None):
+        for wave in reversed(self._service_containers(services)):
+            def restart_container(item):
+                service, container = item
+                self.write(u'Restarting %s\n' % self.container_name(service))
+                self.client.restart(container['Id'], timeout=timeout or DEFAULT_TIMEOUT)
+            run_parallel(restart_container, wave)
+
+
+class OrchestratorCommand(object):
+    '''
+    Accepts the docopt style options the engine prepares for compose's
+    TopLevelCommand, and carries them out with an Orchestrator.
+    '''
+
+    def __init__(self, orchestrator):
+        self.orchestrator = orchestrator
+
+    @staticmethod
+    def _timeout(options):
+        return int(options[u'--timeout']) if options.get(u'--timeout') else None
+
+    def up(self, options):
+        return self.orchestrator.up(services=options.get(u'SERVICE') or None,
+                                    detached=options.get(u'-d', False),
+                                    force_recreate=options.get(u'--force-recreate', False),
+                                    abort_on_container_exit=options.get(u'--abort-on-container-exit', False),
+                                    remove_orphans=options.get(u'--remove-orphans', False),
+                                    no_deps=options.get(u'--no-deps', False),
+                                    timeout=self._timeout(options))
+
+    def stop(self, options):
+        self.orchestrator.stop(services=options.get(u'SERVICE') or None, timeout=self._timeout(options))
+
+    def kill(self, options):
+        self.orchestrator.kill(services=options.get(u'SERVICE') or None)
+
+    def restart(self, options):
+        self.orchestrator.restart(services=options.get(u'SERVICE') or None, timeout=self._timeout(options))
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import json
+import re
+import sys
+import threading
+import time
+
+import six
+
+DIGEST = re.compile(r'digest: (sha256:[0-9a-f]{64})')
+
+# Layer statuses after which a layer needs no more bandwidth
+LAYER_DONE = ('Pushed', 'Layer already exists', 'Mounted from', 'Already exists')
+
+
+def iter_stream_events(stream):
+    '''
+    Decode the JSON messages the Docker engine streams back from a push or pull.
+    A chunk may hold several newline separated messages, or part of one.
+
+    :param stream: iterable of bytes or text chunks
+    :return: generator of dicts
+    '''
+    pending = ''
+    for chunk in stream:
+        if isinstance(chunk, bytes):
+            chunk = chunk.decode('utf-8', 'replace')
+        if isinstance(chunk, dict):
+            yield chunk
+            continue
+        lines = (pending + chunk).split('\n')
+        pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+    if pending.strip():
+        yield json.loads(pending)
+
+
+def format_size(size):
+    for unit in ('B', 'kB', 'MB'):
+        if size < 1000:
+            return '%.1f %s' % (size, unit) if unit != 'B' else '%d B' % size
+        size /= 1000.0
+    return '%.1f GB' % size
+
+
+class PushProgress(object):
+    '''
+    Combines the layer by layer progress of pushes running side by side into a
+    single status line: the layers each image has left, and the bytes sent out of
+    the bytes to send. On a terminal the line is redrawn in place; otherwise it's
+    logged at most once every `interval` seconds.
+    '''
+
+    def __init__(self, output=None, interval=5.0):
+        self.output = output or sys.stderr
+        self.interactive = hasattr(self.output, 'isatty') and self.output.isatty()
+        self.interval = interval
+        self.hosts = []
+        self.layers = {}
+        self.states = {}
+        self._last_render = 0
+        self._width = 0
+        self._lock = threading.Lock()
+
+    def start(self, host):
+        with self._lock:
+            if host not in self.hosts:
+                self.hosts.append(host)
+            self.layers[host] = {}
+            self.states[host] = 'pushing'
+            self._render()
+
+    def update(self, host, event):
+        '''
+        Account for one message from the push stream of host's image.
+
+        :param host: service name
+        :param event: dict decoded from the stream
+        '''
+        layer_id, status = event.get('id'), event.get('status') or ''
+        if not layer_id or DIGEST.search(status):
+            return
+        with self._lock:
+            layer = self.layers.setdefault(host, {}).setdefault(layer_id, dict(current=0, total=0, done=False))
+            detail = event.get('progressDetail') or {}
+            if detail.get('total'):
+                layer['total'] = detail['total']
+                layer['current'] = detail.get('current', 0)
+            if status.startswith(LAYER_DONE):
+                layer['done'] = True
+                layer['current'] = layer['total']
+            self._render()
+
+    def finish(self, host, state):
+        '''
+        Record how host's push ended. The first outcome recorded is kept.
+
+        :param host: service name
+        :param state: short outcome, e.g. pushed or failed
+        '''
+        with self._lock:
+            if self.states.get(host, 'pushing') != 'pushing':
+                return
+            self.states[host] = state
+            self._render(force=True)
+
+    def summary(self):
+        parts = []
+        for host in self.hosts:
+            layers = self.layers.get(host, {}).values()
+            if self.states[host] != 'pushing':
+                parts.append('%s %s' % (host, self.states[host]))
+                continue
+            done = len([layer for layer in layers if layer['done']])
+            current = sum(layer['current'] for layer in layers)
+            total = sum(layer['total'] for layer in layers)
+            part = '%s %d/%d layers' % (host, done, len(layers))
+            if total:
+                part += ' %s/%s' % (format_size(current), format_size(total))
+            parts.append(part)
+        return ' | '.join(parts)
+
+    def _render(self, force=False):
+        now = time.time()
+        if self.interactive:
+            if not force and now - self._last_render < 0.1:
+                return
+            line = self.summary()
+            self.output.write(six.text_type('\r%s') % line.ljust(self._width))
+            self.output.flush()
+            self._width = len(line)
+        elif force or now - self._last_render >= self.interval:
+            logger.info('Push progress: %s', self.summary())
+        else:
+            return
+        self._last_render = now
+
+    def close(self):
+        with self._lock:
+            if self.interactive and self._width:
+                self.output.write(six.text_type('\n'))
+                self.output.flush()
+            self._width = 0
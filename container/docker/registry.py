@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import re
+
+import requests
+
+DOCKER_HUB_INDEX_URL = 'https://index.docker.io/v1/'
+DOCKER_HUB_REGISTRY_URL = 'https://registry-1.docker.io'
+
+MANIFEST_TYPES = ['application/vnd.docker.distribution.manifest.list.v2+json',
+                  'application/vnd.docker.distribution.manifest.v2+json',
+                  'application/vnd.docker.distribution.manifest.v1+prettyjws']
+
+CHALLENGE_PARAM = re.compile(r'(\w+)="([^"]*)"')
+
+
+class RegistryClient(object):
+    '''
+    Minimal client for the manifest endpoints of the Docker Registry HTTP API V2,
+    enough to ask whether a registry already holds an image and to add a tag to a
+    manifest it has. Handles both basic and token authentication.
+    '''
+
+    def __init__(self, url, auth=None, session=None, timeout=30):
+        '''
+        :param url: registry URL as given to push, e.g. https://registry.example.com:5000
+        :param auth: (username, password) tuple, or None for anonymous access
+        :param session: requests.Session to use
+        :param timeout: seconds to wait for the registry
+        '''
+        self.base_url = self.api_url(url)
+        self.auth = auth
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self._tokens = {}
+
+    @staticmethod
+    def api_url(url):
+        if not url or url.rstrip('/') == DOCKER_HUB_INDEX_URL.rstrip('/'):
+            return DOCKER_HUB_REGISTRY_URL
+        if not re.match(r'^https?://', url):
+            url = 'https://' + url
+        return url.rstrip('/')
+
+    @staticmethod
+    def repository_name(repository):
+        '''
+        Name of a repository within its registry: repository without the registry host.
+        '''
+        parts = repository.split('/', 1)
+        if len(parts) == 2 and ('.' in parts[0] or ':' in parts[0] or parts[0] == 'localhost'):
+            return parts[1]
+        return repository
+
+    def _token(self, challenge, scope):
+        params = dict(CHALLENGE_PARAM.findall(challenge))
+        realm = params.pop('realm', None)
+        if not realm:
+            return None
+        params.setdefault('scope', scope)
+        response = self.session.get(realm, params=params, auth=self.auth, timeout=self.timeout)
+        response.raise_for_status()
+        body = response.json()
+        return body.get('token') or body.get('access_token')
+
+    def request(self, method, repository, path, headers=None, data=None):
+        '''
+        Make a request against /v2/<repository>/<path>, authenticating when the
+        registry challenges for it.
+
+        :return: requests.Response
+        '''
+        url = '%s/v2/%s/%s' % (self.base_url, repository, path)
+        scope = 'repository:%s:pull,push' % repository
+        headers = dict(headers or {})
+        if scope in self._tokens:
+            headers['Authorization'] = 'Bearer %s' % self._tokens[scope]
+        response = self.session.request(method, url, headers=headers, data=data, timeout=self.timeout)
+        if response.status_code != 401:
+            return response
+        challenge = response.headers.get('WWW-Authenticate', '')
+        if challenge.lower().startswith('bearer'):
+            token = self._token(challenge, scope)
+            if token:
+                self._tokens[scope] = token
+                headers['Authorization'] = 'Bearer %s' % token
+                return self.session.request(method, url, headers=headers, data=data, timeout=self.timeout)
+        elif self.auth:
+            return self.session.request(method, url, headers=headers, data=data, auth=self.auth,
+                                        timeout=self.timeout)
+        return response
+
+    def manifest_digest(self, repository, reference):
+        '''
+        :param repository: repository name within the registry
+        :param reference: tag or digest
+        :return: the digest of the manifest the registry holds for reference, or None
+        '''
+        response = self.request('HEAD', repository, 'manifests/%s' % reference,
+                                headers={'Accept': ', '.join(MANIFEST_TYPES)})
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.headers.get('Docker-Content-Digest')
+
+    def tag_manifest(self, repository, digest, tag):
+        '''
+        Point tag at a manifest the registry already holds, without sending any layers.
+
+        :param repository: repository name within the registry
+        :param digest: digest of the manifest
+        :param tag: tag to add
+        :return: None
+        '''
+        response = self.request('GET', repository, 'manifests/%s' % digest,
+                                headers={'Accept': ', '.join(MANIFEST_TYPES)})
+        response.raise_for_status()
+        content_type = response.headers.get('Content-Type', MANIFEST_TYPES[1])
+        response = self.request('PUT', repository, 'manifests/%s' % tag,
+                                headers={'Content-Type': content_type}, data=response.content)
+        response.raise_for_status()
@@ -6,22 +6,14 @@ import json
 
 logger = logging.getLogger(__name__)
 
-import sys
 import copy
 
-import six
-if six.PY2:
-    from io import BytesIO as StringIO
-else:
-    from io import StringIO
-
 from functools import wraps
 from distutils import spawn
 
 from ..exceptions import AnsibleContainerConfigException
-
-from compose.cli import main
-from compose.cli.log_printer import LogPrinter, build_log_presenters
+from .orchestrator import Orchestrator
+from .logstream import LineStream, RingBufferSink
 
 __all__ = ['teed_stdout',
            'which_docker',
@@ -30,20 +22,13 @@ __all__ = ['teed_stdout',
 # Don't try this at home, kids.
 
 # *sigh* Okay, fine. Well...
-# We need to tee the stdout to a StringIO buffer as well as to stdout.
+# We need compose's log printer to write to our own line stream instead of stdout.
 # If you've got a better idea, I'm all ears.
 
-class Tee(StringIO):
-    def write(self, x):
-        StringIO.write(self, x)
-        sys.stdout.write(x)
-
-    def flush(self):
-        StringIO.flush(self)
-        sys.stdout.flush()
-
-
 def monkeypatch__log_printer_from_project(buffer):
+    from compose.cli import main
+    from compose.cli.log_printer import LogPrinter, build_log_presenters
+
     @wraps(main.log_printer_from_project)
     def __wrapped__(
             project,
@@ -64,19 +49,37 @@ def monkeypatch__log_printer_from_project(buffer):
     return __wrapped__
 
 
-original__log_printer_from_project = main.log_printer_from_project
-
-
 class TeedStdout(object):
-    stdout = None
+    """
+    Send the output of the containers orchestrated inside the block through a
+    LineStream, line by line, to the given sinks. Without sinks, the last lines
+    are kept in a RingBufferSink.
+    """
+    stream = None
+    original__log_printer_from_project = None
+
+    def __init__(self, *sinks):
+        self.sinks = sinks or (RingBufferSink(),)
 
     def __enter__(self):
-        self.stdout = StringIO()
-        main.log_printer_from_project = monkeypatch__log_printer_from_project(self.stdout)
-        return self.stdout
+        self.stream = LineStream(self.sinks)
+        # Compose is only patched when it's installed; the native orchestrator
+        # writes container output wherever Orchestrator.log_output points
+        Orchestrator.log_output = self.stream
+        try:
+            from compose.cli import main
+        except ImportError:
+            return self.stream
+        self.original__log_printer_from_project = main.log_printer_from_project
+        main.log_printer_from_project = monkeypatch__log_printer_from_project(self.stream)
+        return self.stream
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        main.log_printer_from_project = original__log_printer_from_project
+        Orchestrator.log_output = None
+        if self.original__log_printer_from_project is not None:
+            from compose.cli import main
+            main.log_printer_from_project = self.original__log_printer_from_project
+        self.stream.close()
 
 teed_stdout = TeedStdout
 
@@ -13,17 +13,31 @@ import sys
 import gzip
 import tarfile
 
+from multiprocessing.pool import ThreadPool
+
 import requests
+import yaml
 from six.moves.urllib.parse import urljoin
 
 from .exceptions import AnsibleContainerAlreadyInitializedException, \
                         AnsibleContainerRegistryAttributeException, \
-                        AnsibleContainerHostNotTouchedByPlaybook
+                        AnsibleContainerHostNotTouchedByPlaybook, \
+                        AnsibleContainerPostBuildException, \
+                        AnsibleContainerPushException, \
+                        AnsibleContainerDynamicHostPattern
 from .utils import *
+from .cache import ContentHash
+from .timing import span, current_span, tracer
+from .playbook import iter_plays, roles_in_play, role_search_paths, resolve_role_paths, \
+                      resolve_host_pattern
 from . import __version__
 
 REMOVE_HTTP = re.compile('^https?://')
 
+# Playbook-level directories whose content can feed into any service's build
+PLAYBOOK_DATA_DIRS = ['files', 'templates', 'vars', 'group_vars', 'host_vars', 'tasks',
+                      'handlers', 'library', 'module_utils', 'filter_plugins']
+
 class BaseEngine(object):
     engine_name = None
     orchestrator_name = None
@@ -36,6 +50,7 @@ class BaseEngine(object):
         self.var_file = params.get('var_file')
         self.config = get_config(base_path, var_file=self.var_file)
         self.params = params
+        self._fingerprints = {}
         self.support_init = True
         self.supports_build = True
         self.supports_push = True
@@ -60,14 +75,146 @@ class BaseEngine(object):
         """
         raise NotImplementedError()
 
-    def build_buildcontainer_image(self):
+    def playbook_digest(self):
+        """
+        Digest of everything that decides which hosts the build playbook touches:
+        main.yml and the playbooks it includes, the roles they reference, the
+        rendered container.yml, the var file, and any extra Ansible options.
+
+        :return: string
+        """
+        digest = ContentHash()
+        digest.update(__version__)
+        digest.update_json(dict(self.config))
+        digest.update_json([self.params.get('ansible_options') or [],
+                            self.params.get('with_variables') or []])
+
+        ansible_dir = os.path.join(self.base_path, 'ansible')
+        playbook_path = os.path.join(ansible_dir, 'main.yml')
+        playbook_paths = set([os.path.normpath(playbook_path)])
+        role_names = []
+        try:
+            for path, play in iter_plays(playbook_path):
+                playbook_paths.add(path)
+                role_names.extend(roles_in_play(play))
+        except (IOError, OSError, yaml.YAMLError) as exc:
+            logger.debug('Unable to walk %s - %s', playbook_path, exc)
+        for path in sorted(playbook_paths):
+            digest.update_file(path)
+        digest.update_file(os.path.join(ansible_dir, 'requirements.yml'))
+        search_paths = role_search_paths(self.base_path, self.params.get('roles_path'))
+        for role_path in resolve_role_paths(role_names, search_paths):
+            digest.update_tree(role_path)
+
+        self._update_digest_with_var_file(digest)
+        return digest.hexdigest()
+
+    def _update_digest_with_var_file(self, digest):
+        if self.var_file:
+            for path in (os.path.abspath(self.var_file),
+                         os.path.join(self.base_path, self.var_file),
+                         os.path.join(self.base_path, 'ansible', self.var_file)):
+                if os.path.isfile(path):
+                    digest.update_file(path)
+                    break
+
+    def inventory_groups(self):
+        """
+        The groups the builder container's inventory places hosts in.
+
+        :return: dict of group name to list of host names
+        """
+        raise NotImplementedError()
+
+    def get_base_image_id(self, host):
+        """
+        Query the engine for the identifier of the image a service is based on.
+
+        :param host: the name of the host in the orchestration file
+        :return: the image identifier, or None if the image is not present locally
+        """
+        raise NotImplementedError()
+
+    def get_image_fingerprint(self, host):
+        """
+        Get the fingerprint recorded on the latest built image for a host.
+
+        :param host: the name of the host in the orchestration file
+        :return: string, or None if there is no image or it has no fingerprint
+        """
+        raise NotImplementedError()
+
+    def service_fingerprint(self, host):
+        """
+        Digest of everything feeding the build of one service: its container.yml
+        section, its base image, the plays targeting it and the roles they apply,
+        playbook-level data directories, requirements and the var file. Computed
+        once per invocation, so it reflects the inputs as they were when the build
+        started. The base image goes in as its reference and, when it is present
+        locally, its ID.
+
+        :param host: the name of the host in the orchestration file
+        :return: string
+        """
+        if host not in self._fingerprints:
+            digest = ContentHash()
+            digest.update(__version__)
+            digest.update_json((self.config.get('services') or {}).get(host))
+            image = ((self.config.get('services') or {}).get(host) or {}).get('image')
+            digest.update_json([image, self.get_base_image_id(host)])
+            digest.update_json([self.params.get('ansible_options') or [],
+                                self.params.get('with_variables') or []])
+
+            ansible_dir = os.path.join(self.base_path, 'ansible')
+            for name in ('requirements.txt', 'requirements.yml'):
+                digest.update_file(os.path.join(ansible_dir, name))
+            for name in PLAYBOOK_DATA_DIRS:
+                if os.path.isdir(os.path.join(ansible_dir, name)):
+                    digest.update(name)
+                    digest.update_tree(os.path.join(ansible_dir, name))
+            self._update_digest_with_var_file(digest)
+
+            playbook_path = os.path.join(ansible_dir, 'main.yml')
+            hosts = self.all_hosts_in_orchestration()
+            groups = self.inventory_groups()
+            role_names = []
+            try:
+                for path, play in iter_plays(playbook_path):
+                    try:
+                        targeted = host in resolve_host_pattern(play.get('hosts'), hosts, groups)
+                    except AnsibleContainerDynamicHostPattern:
+                        # Can't tell, so assume it does
+                        targeted = True
+                    if targeted:
+                        digest.update(path)
+                        digest.update_json(play)
+                        role_names.extend(roles_in_play(play))
+            except (IOError, OSError, yaml.YAMLError) as exc:
+                logger.debug('Unable to walk %s - %s', playbook_path, exc)
+                digest.update_file(playbook_path)
+            search_paths = role_search_paths(self.base_path, self.params.get('roles_path'))
+            for role_path in resolve_role_paths(role_names, search_paths):
+                digest.update_tree(role_path)
+            self._fingerprints[host] = digest.hexdigest()
+        return self._fingerprints[host]
+
+    def build_buildcontainer_image(self, nocache=False):
         """
         Build in the container engine the builder container
 
+        :param nocache: don't reuse cached layers from a previous build
         :return: generator of strings
         """
         raise NotImplementedError()
 
+    def builder_image_is_current(self):
+        """
+        Does the engine already have a builder image built from the current context?
+
+        :return: bool
+        """
+        raise NotImplementedError()
+
     def get_image_id_by_tag(self, name):
         """
         Query the engine to get an image identifier by tag
@@ -120,6 +267,25 @@ class BaseEngine(object):
         """
         raise NotImplementedError()
 
+    def orchestration_project(self, operation):
+        """
+        Namespace the orchestrator's containers, networks and volumes are created
+        in for an operation.
+
+        :param operation: Operation to perform, like, build, run, listhosts, etc
+        :return: string
+        """
+        raise NotImplementedError()
+
+    def cleanup_orchestration(self):
+        """
+        Remove the containers, networks and volumes left in this invocation's
+        build namespace.
+
+        :return: None
+        """
+        raise NotImplementedError()
+
     def build_was_successful(self):
         """
         After the build completed, did the build run successfully?
@@ -128,6 +294,16 @@ class BaseEngine(object):
         """
         raise NotImplementedError()
 
+    def build_report(self):
+        """
+        Results of the build playbook.
+
+        :return: dict with hosts, a dict of host to dict with at least failures,
+                 unreachable and failed_tasks, and tasks, a list of dicts of host, task,
+                 role and duration; or None if not available
+        """
+        return None
+
     def orchestrate(self, operation, temp_dir, hosts=[]):
         """
         Execute the compose engine.
@@ -240,17 +416,26 @@ class BaseEngine(object):
         """
         raise NotImplementedError()
 
-    def push_latest_image(self, host, url=None, namespace=None, tag=None):
+    def push_latest_image(self, host, url=None, namespace=None, tag=None, progress=None):
         """
         Push the latest built image for a host to a registry
 
         :param host: The host in the container.yml to push
         :param url: The url of the registry.
         :param namespace: The username or organization that owns the image repo
-        :return: None
+        :param tag: The tag to push, defaults to the image's build stamp
+        :param progress: An object with an update(host, event) method to report progress to
+        :return: The pushed image reference
         """
         raise NotImplementedError()
 
+    def push_progress(self):
+        """
+        Progress display for push_hosts, or None to leave progress reporting to
+        push_latest_image.
+        """
+        return None
+
     def get_config(self):
         raise NotImplementedError()
 
@@ -356,51 +541,179 @@ def cmdrun_init(base_path, project=None, **kwargs):
 
 def cmdrun_build(base_path, engine_name, flatten=True, purge_last=True, local_builder=False,
                  rebuild=False, service=None, ansible_options='', save_build_container=False,
-                 roles_path=None, **kwargs):
+                 roles_path=None, jobs=1, no_cache=False, rebuild_builder=False, **kwargs):
     engine_args = kwargs.copy()
     engine_args.update(locals())
-    engine_obj = load_engine(**engine_args)
-    try:
-        builder_img_id = engine_obj.get_image_id_by_tag(engine_obj.builder_container_img_tag)
-    except NameError:
-        if local_builder:
-            create_build_container(engine_obj, base_path)
+    with span('load config'):
+        engine_obj = load_engine(**engine_args)
+    if local_builder:
+        with span('builder image'):
+            if rebuild_builder or not engine_obj.builder_image_is_current():
+                create_build_container(engine_obj, base_path, nocache=rebuild_builder)
+            else:
+                logger.info('Ansible Container image is up to date.')
     with make_temp_dir() as temp_dir:
         logger.info('Starting %s engine to build your images...'
                     % engine_obj.orchestrator_name)
-        touched_hosts = set(engine_obj.hosts_touched_by_playbook())
+        with span('listhosts'):
+            touched_hosts = set(engine_obj.hosts_touched_by_playbook())
         if service:
             touched_hosts &= set(service)
             if not touched_hosts:
                 raise AnsibleContainerHostNotTouchedByPlaybook()
-        engine_obj.orchestrate('build', temp_dir, context=dict(rebuild=rebuild))
-        if not engine_obj.build_was_successful():
-            logger.error('Ansible playbook run failed.')
+        with span('fingerprint'):
+            fingerprints = dict((host, engine_obj.service_fingerprint(host)) for host in touched_hosts)
+        if not (rebuild or no_cache):
+            unchanged = set(host for host in touched_hosts
+                            if engine_obj.get_image_fingerprint(host) == fingerprints[host])
+            if unchanged:
+                logger.info('Skipping unchanged services: %s', ', '.join(sorted(unchanged)))
+                touched_hosts -= unchanged
+                if not touched_hosts:
+                    logger.info('All services are up to date. Nothing to build.')
+                    return
+                # Limit the orchestrated build to the services that changed
+                engine_obj.params['service'] = sorted(touched_hosts)
+        try:
+            with span('playbook'):
+                engine_obj.orchestrate('build', temp_dir, context=dict(rebuild=rebuild))
+            report = engine_obj.build_report() or {}
+            results = report.get('hosts') or {}
+            for host in sorted(results):
+                if results[host].get('failures') or results[host].get('unreachable'):
+                    logger.error('%s: %d failed, %d unreachable: %s', host, results[host].get('failures', 0),
+                                 results[host].get('unreachable', 0), ', '.join(results[host].get('failed_tasks') or []))
+            if report.get('tasks'):
+                # Kept with the phase timings, for --trace-file
+                tracer.add_data('buildTasks', report['tasks'])
+                log_slowest_tasks(report['tasks'])
+            if not engine_obj.build_was_successful():
+                logger.error('Ansible playbook run failed.')
+                raise RuntimeError(u'Ansible build failed')
+            # Cool - now export those containers as images
+            version = datetime.datetime.utcnow().strftime('%Y%m%d%H%M%S')
+            logger.info('Exporting built containers as images...')
+            with span('export'):
+                failures = post_build_hosts(engine_obj, touched_hosts, version, flatten=flatten,
+                                            purge_last=purge_last, jobs=jobs)
+        finally:
+            # Interrupted or not, don't leave the build's containers and networks behind
             if not save_build_container:
-                logger.info('Cleaning up Ansible Container builder...')
-                builder_container_id = engine_obj.get_builder_container_id()
-                engine_obj.remove_container_by_id(builder_container_id)
-            raise RuntimeError(u'Ansible build failed')
-        # Cool - now export those containers as images
-        version = datetime.datetime.utcnow().strftime('%Y%m%d%H%M%S')
-        logger.info('Exporting built containers as images...')
-        for host in touched_hosts:
-            engine_obj.post_build(host, version, flatten=flatten, purge_last=purge_last)
-        if not save_build_container:
-            logger.info('Cleaning up Ansible Container builder...')
-            builder_container_id = engine_obj.get_builder_container_id()
-            engine_obj.remove_container_by_id(builder_container_id)
+                with span('cleanup'):
+                    cleanup_build(engine_obj)
+        if failures:
+            raise AnsibleContainerPostBuildException(
+                u'Failed to export images for: %s' % u', '.join(sorted(failures)))
+
+
+def cleanup_build(engine_obj):
+    '''
+    Remove the builder container, and whatever else the engine orchestrated for
+    the build. The builder container may never have been created, if the
+    orchestration failed to start.
+
+    :param engine_obj: container.engine.BaseEngine
+    '''
+    logger.info('Cleaning up Ansible Container builder...')
+    try:
+        builder_container_id = engine_obj.get_builder_container_id()
+    except NameError:
+        logger.debug('No builder container to remove')
+    else:
+        engine_obj.remove_container_by_id(builder_container_id)
+    engine_obj.cleanup_orchestration()
+
+
+def summarize_task_timings(tasks, limit=5):
+    '''
+    Find where each service's build spent its time.
+
+    :param tasks: list of dicts of host, task, role and duration, as in the build report
+    :param limit: how many tasks and roles to keep per host
+    :return: dict of host to (slowest tasks, slowest roles), each a list of
+             (name, seconds), slowest first
+    '''
+    task_times, role_times = {}, {}
+    for task in tasks:
+        host, duration = task['host'], task.get('duration') or 0
+        name = u'%s : %s' % (task['role'], task['task']) if task.get('role') else task['task']
+        host_tasks = task_times.setdefault(host, {})
+        host_tasks[name] = host_tasks.get(name, 0) + duration
+        if task.get('role'):
+            host_roles = role_times.setdefault(host, {})
+            host_roles[task['role']] = host_roles.get(task['role'], 0) + duration
+
+    def slowest(times):
+        return sorted(times.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    return dict((host, (slowest(task_times[host]), slowest(role_times.get(host, {}))))
+                for host in task_times)
+
+
+def log_slowest_tasks(tasks, limit=5):
+    summary = summarize_task_timings(tasks, limit=limit)
+    for host in sorted(summary):
+        slowest_tasks, slowest_roles = summary[host]
+        logger.info('Slowest tasks for %s: %s', host,
+                    ', '.join('%s (%.1fs)' % item for item in slowest_tasks))
+        if slowest_roles:
+            logger.info('Slowest roles for %s: %s', host,
+                        ', '.join('%s (%.1fs)' % item for item in slowest_roles))
+
+
+def post_build_hosts(engine_obj, hosts, version, flatten=True, purge_last=True, jobs=1):
+    '''
+    Run engine_obj.post_build for each host, using up to `jobs` worker threads. A failure
+    exporting one host does not stop the others.
+
+    :param engine_obj: container.engine.BaseEngine
+    :param hosts: iterable of host names touched by the build
+    :param version: the version tag for the resultant images
+    :param flatten: passed through to post_build
+    :param purge_last: passed through to post_build
+    :param jobs: maximum number of hosts to export concurrently
+    :return: dict of host:exception for each host that failed
+    '''
+    hosts = sorted(hosts)
+    if not hosts:
+        return {}
+    parent = current_span()
+
+    def export_host(host):
+        try:
+            with span(host, parent=parent, host=host):
+                engine_obj.post_build(host, version, flatten=flatten, purge_last=purge_last)
+        except Exception as exc:
+            logger.error('Exporting %s failed: %s', host, exc)
+            logger.debug('Traceback for %s export:', host, exc_info=True)
+            return host, exc
+        return host, None
+
+    workers = max(1, min(int(jobs or 1), len(hosts)))
+    if workers == 1:
+        results = [export_host(host) for host in hosts]
+    else:
+        logger.debug('Exporting %d hosts with %d workers', len(hosts), workers)
+        pool = ThreadPool(processes=workers)
+        try:
+            results = pool.map(export_host, hosts)
+        finally:
+            pool.close()
+            pool.join()
+    return dict((host, exc) for host, exc in results if exc is not None)
 
 
 def cmdrun_run(base_path, engine_name, service=[], production=False, **kwargs):
     assert_initialized(base_path)
     engine_args = kwargs.copy()
     engine_args.update(locals())
-    engine_obj = load_engine(**engine_args)
+    with span('load config'):
+        engine_obj = load_engine(**engine_args)
     with make_temp_dir() as temp_dir:
         hosts = service or (engine_obj.all_hosts_in_orchestration())
-        engine_obj.orchestrate('run', temp_dir,
-                               hosts=hosts)
+        with span('orchestrate'):
+            engine_obj.orchestrate('run', temp_dir,
+                                   hosts=hosts)
 
 
 def cmdrun_stop(base_path, engine_name, service=[], **kwargs):
@@ -423,11 +736,13 @@ def cmdrun_restart(base_path, engine_name, service=[], **kwargs):
         engine_obj.restart('restart', temp_dir, hosts=hosts)
 
 
-def cmdrun_push(base_path, engine_name, username=None, password=None, email=None, push_to=None, tag=None, **kwargs):
+def cmdrun_push(base_path, engine_name, username=None, password=None, email=None, push_to=None, tag=None,
+                jobs=1, **kwargs):
     assert_initialized(base_path)
     engine_args = kwargs.copy()
     engine_args.update(locals())
-    engine_obj = load_engine(**engine_args)
+    with span('load config'):
+        engine_obj = load_engine(**engine_args)
 
     # resolve url and namespace
     config = engine_obj.config
@@ -444,23 +759,92 @@ def cmdrun_push(base_path, engine_name, username=None, password=None, email=None
             url, namespace = resolve_push_to(push_to, engine_obj.default_registry_url)
 
     # Check that we can authenticate to the registry and get the username
-    username = engine_obj.registry_login(username=username, password=password,
-                                         email=email, url=url)
+    with span('login'):
+        username = engine_obj.registry_login(username=username, password=password,
+                                             email=email, url=url)
     if not namespace:
         namespace = username
 
     logger.info('Pushing to "%s/%s' % (re.sub(r'/$', '', url), namespace))
 
-    for host in engine_obj.hosts_touched_by_playbook():
-        engine_obj.push_latest_image(host, url=url, namespace=namespace, tag=tag)
+    with span('listhosts'):
+        hosts = engine_obj.hosts_touched_by_playbook()
+    with span('push'):
+        pushed, failures = push_hosts(engine_obj, hosts, url=url, namespace=namespace, tag=tag,
+                                      jobs=jobs)
+    for host in sorted(pushed):
+        logger.info('%s: pushed %s', host, pushed[host])
+    for host in sorted(failures):
+        logger.error('%s: %s', host, failures[host])
+    if failures:
+        raise AnsibleContainerPushException(
+            u'Failed to push images for: %s' % u', '.join(sorted(failures)))
     logger.info('Done!')
 
 
+def push_hosts(engine_obj, hosts, url=None, namespace=None, tag=None, jobs=1, progress=None):
+    '''
+    Run engine_obj.push_latest_image for each host, using up to `jobs` worker threads,
+    with the layer progress of every push combined into one status display. A failure
+    pushing one host does not stop the others.
+
+    :param engine_obj: container.engine.BaseEngine
+    :param hosts: iterable of host names to push
+    :param url: passed through to push_latest_image
+    :param namespace: passed through to push_latest_image
+    :param tag: passed through to push_latest_image
+    :param jobs: maximum number of hosts to push concurrently
+    :param progress: progress display, defaults to the engine's
+    :return: (dict of host:pushed image, dict of host:exception for each host that failed)
+    '''
+    hosts = sorted(hosts)
+    if not hosts:
+        return {}, {}
+    if progress is None:
+        progress = engine_obj.push_progress()
+    parent = current_span()
+
+    def push_host(host):
+        if progress is not None:
+            progress.start(host)
+        try:
+            with span(host, parent=parent, host=host):
+                image = engine_obj.push_latest_image(host, url=url, namespace=namespace, tag=tag,
+                                                     progress=progress)
+        except Exception as exc:
+            logger.debug('Traceback for %s push:', host, exc_info=True)
+            if progress is not None:
+                progress.finish(host, 'failed')
+            return host, None, exc
+        if progress is not None:
+            progress.finish(host, 'pushed')
+        return host, image, None
+
+    workers = max(1, min(int(jobs or 1), len(hosts)))
+    try:
+        if workers == 1:
+            results = [push_host(host) for host in hosts]
+        else:
+            logger.debug('Pushing %d hosts with %d workers', len(hosts), workers)
+            pool = ThreadPool(processes=workers)
+            try:
+                results = pool.map(push_host, hosts)
+            finally:
+                pool.close()
+                pool.join()
+    finally:
+        if progress is not None:
+            progress.close()
+    return (dict((host, image) for host, image, exc in results if exc is None),
+            dict((host, exc) for host, image, exc in results if exc is not None))
+
+
 def cmdrun_shipit(base_path, engine_name, pull_from=None, tag=None, **kwargs):
     assert_initialized(base_path)
     engine_args = kwargs.copy()
     engine_args.update(locals())
-    engine_obj = load_engine(**engine_args)
+    with span('load config'):
+        engine_obj = load_engine(**engine_args)
     shipit_engine_name = kwargs.pop('shipit_engine')
     project_name = os.path.basename(base_path).lower()
     local_images = kwargs.get('local_images')
@@ -482,7 +866,8 @@ def cmdrun_shipit(base_path, engine_name, pull_from=None, tag=None, **kwargs):
         if url and not namespace:
             # try to get the username for the url from the container engine
             try:
-                namespace = engine_obj.registry_login(url=url)
+                with span('login'):
+                    namespace = engine_obj.registry_login(url=url)
             except Exception as exc:
                 if "Error while fetching server API version" in str(exc):
                     msg = "Cannot connect to the Docker daemon. Is the daemon running?"
@@ -491,7 +876,8 @@ def cmdrun_shipit(base_path, engine_name, pull_from=None, tag=None, **kwargs):
                           "registry or provide a namespace for the registry in container.yml" % (url, str(exc))
                 raise AnsibleContainerRegistryAttributeException(msg)
 
-    config = engine_obj.get_config_for_shipit(pull_from=pull_from, url=url, namespace=namespace, tag=tag)
+    with span('shipit config'):
+        config = engine_obj.get_config_for_shipit(pull_from=pull_from, url=url, namespace=namespace, tag=tag)
 
     shipit_engine_obj = load_shipit_engine(AVAILABLE_SHIPIT_ENGINES[shipit_engine_name]['cls'],
                                            config=config,
@@ -499,12 +885,14 @@ def cmdrun_shipit(base_path, engine_name, pull_from=None, tag=None, **kwargs):
                                            project_name=project_name)
 
     # create the role and sample playbook
-    shipit_engine_obj.run()
+    with span('create role'):
+        shipit_engine_obj.run()
     logger.info('Role %s created.' % project_name)
 
     if kwargs.get('save_config'):
         # generate and save the configuration templates
-        config_path = shipit_engine_obj.save_config()
+        with span('save config'):
+            config_path = shipit_engine_obj.save_config()
         logger.info('Saved configuration to %s' % config_path)
 
 def cmdrun_install(base_path, engine_name, roles=[], **kwargs):
@@ -514,7 +902,10 @@ def cmdrun_install(base_path, engine_name, roles=[], **kwargs):
     engine_obj = load_engine(**engine_args)
 
     with make_temp_dir() as temp_dir:
-        engine_obj.orchestrate('install', temp_dir)
+        try:
+            engine_obj.orchestrate('install', temp_dir)
+        finally:
+            engine_obj.cleanup_orchestration()
 
 
 def cmdrun_version(base_path, engine_name, debug=False, **kwargs):
@@ -528,10 +919,10 @@ def cmdrun_version(base_path, engine_name, debug=False, **kwargs):
         engine_obj = load_engine(**engine_args)
         engine_obj.print_version_info()
 
-def create_build_container(container_engine_obj, base_path):
+def create_build_container(container_engine_obj, base_path, nocache=False):
     assert_initialized(base_path)
     logger.info('(Re)building the Ansible Container image.')
-    build_output = container_engine_obj.build_buildcontainer_image()
+    build_output = container_engine_obj.build_buildcontainer_image(nocache=nocache)
     for line in build_output:
         logger.debug(line)
     builder_img_id = container_engine_obj.get_builder_image_id()
@@ -62,4 +62,16 @@ class AnsibleContainerMissingPersistentVolumeClaim(Exception):
 class AnsibleContainerListHostsException(Exception):
     pass
 
+class AnsibleContainerPostBuildException(Exception):
+    pass
+
+class AnsibleContainerPushException(Exception):
+    pass
+
+class AnsibleContainerDynamicHostPattern(Exception):
+    pass
+
 
+
+class AnsibleContainerOrchestrationException(Exception):
+    pass
@@ -8,7 +8,9 @@ logger = logging.getLogger(__name__)
 import glob
 import os
 import imp
+import sys
 
+from container.cache import ContentHash, FileCache, user_cache_path
 from container.exceptions import AnsibleContainerFilterException
 
 
@@ -21,6 +23,36 @@ def get_package_path(package):
     return package_path
 
 
+def find_package_path(package):
+    '''
+    Locate a package's directory without importing it, falling back to importing it when it can't be found
+    on sys.path directly.
+
+    :param package: dotted package name
+    :return: string
+    '''
+    path = None
+    try:
+        for part in package.split('.'):
+            _, path, _ = imp.find_module(part, [path] if path else None)
+    except ImportError:
+        return get_package_path(package)
+    return path
+
+
+def load_filter_module(path):
+    '''
+    Import an Ansible filter plugin module from its path.
+
+    :param path: path to the module
+    :return: dict of the filters it provides
+    '''
+    name, _ = os.path.splitext(path)
+    with open(path, 'r') as module_file:
+        module_src = imp.load_source(name, path, module_file)
+    return getattr(module_src, 'FilterModule')().filters()
+
+
 def get_filters(package_path, local=False):
     matches = (glob.glob(os.path.join(package_path, "*.py")))
     for path in matches:
@@ -83,34 +115,132 @@ class LookupLoader(object):
         return obj
 
 
+class LazyFilters(dict):
+    '''
+    Jinja filters mapping which holds local filters, and imports an Ansible filter module the first time one of its
+    filters is looked up. Jinja looks filters up with get() while compiling and with [] in compiled templates.
+    '''
+
+    def __init__(self, filters, loader):
+        super(LazyFilters, self).__init__(filters)
+        self._loader = loader
+        # Ansible filters take precedence over Jinja's own, so drop any they replace
+        for name in loader.index():
+            if name not in loader.local_filters():
+                dict.pop(self, name, None)
+        self.update(loader.local_filters())
+
+    def __missing__(self, name):
+        filters = self._loader.get(name)
+        if filters is None:
+            raise KeyError(name)
+        for filter_name, func in filters.items():
+            if not dict.__contains__(self, filter_name):
+                self[filter_name] = func
+        return dict.__getitem__(self, name)
+
+    def __contains__(self, name):
+        return dict.__contains__(self, name) or name in self._loader.index()
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+
 class FilterLoader(object):
 
-    all_filters = {}
+    # Filter name to module path for Ansible's filter plugins, and the filters of each module imported so far
+    filter_index = None
+    module_filters = {}
+    _local_filters = None
 
-    def all(self):
+    def local_filters(self):
         '''
-        Load all Jinja filters found in Ansible and locally with local filters taking precedence.
+        Filters defined in this package.
 
         :return: dict
         '''
-        if not self.all_filters:
+        if self._local_filters is None:
+            local = {}
             try:
-                package_path = get_package_path(ANSIBLE_FILTERS_NAME)
-                for obj in get_filters(package_path):
-                    self.all_filters.update(obj.filters())
+                for obj in get_filters(os.path.dirname(__file__), local=True):
+                    local.update(obj.filters())
             except Exception as exc:
-                logger.debug('Failed to load ansible.plugin.filters - {0}'.format(str(exc)))
-                pass
+                logger.debug('Failed to load plugin.filter - {0}'.format(str(exc)))
+            FilterLoader._local_filters = local
+        return self._local_filters
 
+    def index(self):
+        '''
+        Map each Ansible filter name to the module defining it. Building the index means importing every filter
+        module, so it is kept in the user's cache directory, keyed by the modules' paths, sizes and modification
+        times along with the Python version, and only rebuilt when one of those changes.
+
+        :return: dict
+        '''
+        if self.filter_index is not None:
+            return self.filter_index
+        index = {}
+        try:
+            package_path = find_package_path(ANSIBLE_FILTERS_NAME)
+        except Exception as exc:
+            logger.debug('Failed to locate ansible.plugin.filters - {0}'.format(str(exc)))
+        else:
+            paths = sorted(path for path in glob.glob(os.path.join(package_path, '*.py'))
+                           if '__init__' not in os.path.basename(path))
+            digest = ContentHash().update(sys.version)
+            for path in paths:
+                stat = os.stat(path)
+                digest.update_json([path, stat.st_size, stat.st_mtime])
+            cache = FileCache(user_cache_path('filter-index'))
+            key = digest.hexdigest()
+            index = cache.get(key)
+            if not isinstance(index, dict):
+                index = {}
+                for path in paths:
+                    try:
+                        filters = load_filter_module(path)
+                    except Exception as exc:
+                        logger.debug('Failed to load filter plugin {0} - {1}'.format(path, str(exc)))
+                        continue
+                    self.module_filters[path] = filters
+                    for name in filters:
+                        index[name] = path
+                cache.set(key, index)
+        FilterLoader.filter_index = index
+        return index
+
+    def get(self, name):
+        '''
+        Import the Ansible filter module that defines a filter, if it hasn't been already.
+
+        :param name: filter name
+        :return: dict of every filter in the module, or None if no module defines the filter
+        '''
+        path = self.index().get(name)
+        if path is None:
+            return None
+        if path not in self.module_filters:
             try:
-                package_path = os.path.dirname(__file__)
-                for obj in get_filters(package_path, local=True):
-                    self.all_filters.update(obj.filters())
+                self.module_filters[path] = load_filter_module(path)
             except Exception as exc:
-                logger.debug('Failed to load plugin.filter - {0}'.format(str(exc)))
-                pass
+                logger.debug('Failed to load filter plugin {0} - {1}'.format(path, str(exc)))
+                self.module_filters[path] = {}
+        if name not in self.module_filters[path]:
+            return None
+        return self.module_filters[path]
 
-        return self.all_filters
+    def lazy(self, filters):
+        '''
+        Filters for a Jinja environment: the environment's own plus all local and Ansible filters, where Ansible
+        filter modules are only imported once a template uses one of their filters.
+
+        :param filters: the environment's filters
+        :return: LazyFilters
+        '''
+        return LazyFilters(filters, self)
 
 
 class FilterBase(object):
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import os
+import re
+import fnmatch
+
+import six
+import yaml
+
+from .exceptions import AnsibleContainerDynamicHostPattern
+
+PLAYBOOK_INCLUDE_KEYS = ('include', 'import_playbook')
+ROLE_INCLUDE_KEYS = ('include_role', 'import_role')
+TASK_SECTIONS = ('pre_tasks', 'tasks', 'post_tasks', 'handlers')
+
+
+def is_templated(value):
+    return isinstance(value, six.string_types) and ('{{' in value or '{%' in value)
+
+
+def read_playbook(path):
+    '''
+    Parse a playbook file.
+
+    :param path: path to the playbook
+    :return: list of plays
+    '''
+    with open(path, 'r') as f:
+        plays = yaml.safe_load(f)
+    return plays if isinstance(plays, list) else []
+
+
+def included_playbook(play):
+    '''
+    If the play is a playbook include, return the included file name as written.
+
+    :param play: dict
+    :return: string or None
+    '''
+    for key in PLAYBOOK_INCLUDE_KEYS:
+        if key in play:
+            value = play[key]
+            if isinstance(value, six.string_types):
+                # Old style includes may carry variables after the file name
+                return value.split()[0] if value.split() else value
+            return value
+    return None
+
+
+def iter_plays(playbook_path, _seen=None):
+    '''
+    Walk a playbook and the playbooks it includes, depth first and in order. Every
+    play is yielded along with the file defining it, including the include entries
+    themselves, so callers can tell when an include could not be followed.
+
+    :param playbook_path: path to the top level playbook, typically ansible/main.yml
+    :return: generator of (path, play) tuples
+    '''
+    if _seen is None:
+        _seen = set()
+    playbook_path = os.path.normpath(playbook_path)
+    if playbook_path in _seen:
+        return
+    _seen.add(playbook_path)
+    for play in read_playbook(playbook_path):
+        if not isinstance(play, dict):
+            continue
+        yield playbook_path, play
+        include = included_playbook(play)
+        if isinstance(include, six.string_types) and not is_templated(include):
+            include_path = os.path.join(os.path.dirname(playbook_path), include)
+            if os.path.isfile(include_path):
+                for included in iter_plays(include_path, _seen):
+                    yield included
+
+
+def _role_name(role):
+    if isinstance(role, dict):
+        role = role.get('role') or role.get('name')
+    if isinstance(role, six.string_types) and not is_templated(role):
+        return role
+    return None
+
+
+def roles_in_play(play):
+    '''
+    Names of the roles a play applies, either in its roles section or through
+    include_role/import_role tasks. Templated role names are skipped.
+
+    :param play: dict
+    :return: list of strings
+    '''
+    names = []
+    for role in play.get('roles') or []:
+        name = _role_name(role)
+        if name:
+            names.append(name)
+    for section in TASK_SECTIONS:
+        for task in play.get(section) or []:
+            if not isinstance(task, dict):
+                continue
+            for key in ROLE_INCLUDE_KEYS:
+                if isinstance(task.get(key), dict):
+                    name = _role_name(task[key])
+                    if name:
+                        names.append(name)
+    return names
+
+
+def role_search_paths(base_path, roles_path=None):
+    '''
+    Directories roles are looked up in, in the order the builder container uses.
+    '''
+    ansible_dir = os.path.join(base_path, 'ansible')
+    paths = []
+    if roles_path:
+        paths.append(roles_path)
+    paths.extend([os.path.join(ansible_dir, 'roles'), ansible_dir])
+    return paths
+
+
+def resolve_role_paths(role_names, search_paths):
+    '''
+    Locate roles on disk, following the dependencies in each role's meta/main.yml.
+    Roles that are not found locally (e.g. installed from Galaxy inside the builder)
+    are skipped.
+
+    :param role_names: iterable of role names or relative paths
+    :param search_paths: directories to look in, as returned by role_search_paths
+    :return: list of role directories, without duplicates
+    '''
+    found = []
+    pending = list(role_names)
+    seen = set()
+    while pending:
+        name = pending.pop(0)
+        if name in seen:
+            continue
+        seen.add(name)
+        for search_path in search_paths:
+            role_path = os.path.normpath(os.path.join(search_path, name))
+            if os.path.isdir(role_path):
+                if role_path not in found:
+                    found.append(role_path)
+                meta_path = os.path.join(role_path, 'meta', 'main.yml')
+                if os.path.isfile(meta_path):
+                    try:
+                        with open(meta_path, 'r') as f:
+                            meta = yaml.safe_load(f) or {}
+                    except (IOError, OSError, yaml.YAMLError) as exc:
+                        logger.debug('Unable to read %s - %s', meta_path, exc)
+                        meta = {}
+                    for dep in (meta.get('dependencies') if isinstance(meta, dict) else None) or []:
+                        dep_name = _role_name(dep)
+                        if dep_name:
+                            pending.append(dep_name)
+                break
+    return found
+
+
+def split_host_pattern(pattern):
+    '''
+    Split a play's hosts value into its terms the way Ansible does: lists are
+    flattened, and strings are split on commas, or on colons when there are none.
+
+    :param pattern: string or list
+    :return: list of strings
+    '''
+    if isinstance(pattern, (list, tuple)):
+        terms = []
+        for item in pattern:
+            terms.extend(split_host_pattern(item))
+        return terms
+    if not isinstance(pattern, six.string_types):
+        raise AnsibleContainerDynamicHostPattern(u'Unsupported hosts value %r' % (pattern,))
+    if is_templated(pattern):
+        raise AnsibleContainerDynamicHostPattern(u'Cannot statically resolve host pattern %r' % pattern)
+    separator = ',' if ',' in pattern else ':'
+    return [term.strip() for term in pattern.split(separator) if term.strip()]
+
+
+def match_host_term(term, hosts, groups):
+    '''
+    Hosts matched by a single pattern term, without its & or ! prefix.
+
+    :param term: string
+    :param hosts: list of inventory host names
+    :param groups: dict of group name to list of host names
+    :return: list of host names
+    '''
+    if is_templated(term) or '[' in term:
+        raise AnsibleContainerDynamicHostPattern(u'Cannot statically resolve host pattern %r' % term)
+    if term in ('all', '*'):
+        return list(hosts)
+    if term in groups:
+        return list(groups[term])
+    if term in hosts:
+        return [term]
+    if term.startswith('~'):
+        try:
+            regex = re.compile(term[1:])
+        except re.error:
+            raise AnsibleContainerDynamicHostPattern(u'Invalid host pattern regex %r' % term)
+        matches = regex.search
+    else:
+        matches = lambda name: fnmatch.fnmatch(name, term)
+    matched = []
+    for group in sorted(groups):
+        if matches(group):
+            matched.extend(groups[group])
+    matched.extend(host for host in hosts if matches(host))
+    return matched
+
+
+def resolve_host_pattern(pattern, hosts, groups):
+    '''
+    Evaluate a play's hosts value against an inventory. As in Ansible, union terms
+    are applied first, then &intersections, then !exclusions, and a pattern made
+    only of the latter two starts from all hosts.
+
+    :param pattern: the play's hosts value
+    :param hosts: list of inventory host names
+    :param groups: dict of group name to list of host names
+    :return: set of host names
+    '''
+    terms = split_host_pattern(pattern)
+    regular = [term for term in terms if term[0] not in '&!']
+    intersections = [term[1:] for term in terms if term[0] == '&']
+    exclusions = [term[1:] for term in terms if term[0] == '!']
+    if not regular:
+        regular = ['all']
+    matched = set()
+    for term in regular:
+        matched.update(match_host_term(term, hosts, groups))
+    for term in intersections:
+        matched.intersection_update(match_host_term(term, hosts, groups))
+    for term in exclusions:
+        matched.difference_update(match_host_term(term, hosts, groups))
+    return matched
+
+
+def resolve_playbook_hosts(playbook_path, hosts, groups):
+    '''
+    Statically work out which hosts a playbook touches, without running Ansible.
+    Raises AnsibleContainerDynamicHostPattern for anything that can only be known
+    at run time, such as templated patterns or includes.
+
+    :param playbook_path: path to the top level playbook
+    :param hosts: list of inventory host names
+    :param groups: dict of group name to list of host names
+    :return: frozenset of host names
+    '''
+    touched = set()
+    for path, play in iter_plays(playbook_path):
+        include = included_playbook(play)
+        if include is not None:
+            if not isinstance(include, six.string_types) or is_templated(include) or \
+                    not os.path.isfile(os.path.join(os.path.dirname(path), include)):
+                raise AnsibleContainerDynamicHostPattern(u'Cannot follow playbook include %r in %s'
+                                                         % (include, path))
+            continue
+        if 'hosts' not in play:
+            raise AnsibleContainerDynamicHostPattern(u'Play without hosts in %s' % path)
+        touched.update(resolve_host_pattern(play['hosts'], hosts, groups))
+    return frozenset(touched)
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+#
+# Callback plugin used by the Ansible Container builder.
+#
+# Records the outcome of the build playbook for each host (service), and how long each
+# task took on each host, in a JSON file on the project mount,
+# /ansible-container/.ansible-container/reports/<compose project>.json, which
+# ansible-container reads once the builder container exits. It only writes the report;
+# the default callback still prints the playbook output.
+
+from __future__ import absolute_import
+
+import json
+import os
+import time
+
+from ansible.plugins.callback import CallbackBase
+
+REPORT_DIR = '/ansible-container/.ansible-container/reports'
+
+
+def report_path():
+    return os.path.join(REPORT_DIR, '%s.json' % (os.environ.get('ANSIBLE_CONTAINER_PROJECT') or 'ansible'))
+
+
+class CallbackModule(CallbackBase):
+    ''' Write per-host results of the build playbook for ansible-container '''
+
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'ac_build_report'
+    CALLBACK_NEEDS_WHITELIST = True
+
+    def __init__(self, *args, **kwargs):
+        super(CallbackModule, self).__init__(*args, **kwargs)
+        self.failed_tasks = {}
+        self.tasks = []
+        self.task_started = None
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        # Hosts run a task side by side, so each host's time on it runs from here
+        # to its result
+        self.task_started = time.time()
+
+    def v2_playbook_on_handler_task_start(self, task):
+        self.task_started = time.time()
+
+    def _record_duration(self, result, status):
+        if self.task_started is None:
+            return
+        task = result._task
+        self.tasks.append(dict(host=result._host.get_name(),
+                               task=task.get_name(),
+                               role=task._role.get_name() if task._role else None,
+                               status=status,
+                               duration=round(time.time() - self.task_started, 3)))
+
+    def v2_runner_on_ok(self, result):
+        self._record_duration(result, 'ok')
+
+    def v2_runner_on_skipped(self, result):
+        self._record_duration(result, 'skipped')
+
+    def _record_failure(self, result):
+        host = result._host.get_name()
+        self.failed_tasks.setdefault(host, []).append(result._task.get_name())
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._record_duration(result, 'failed')
+        if not ignore_errors:
+            self._record_failure(result)
+
+    def v2_runner_on_unreachable(self, result):
+        self._record_duration(result, 'unreachable')
+        self._record_failure(result)
+
+    def v2_playbook_on_stats(self, stats):
+        hosts = {}
+        for host in sorted(stats.processed.keys()):
+            summary = stats.summarize(host)
+            hosts[host] = dict(ok=summary.get('ok', 0),
+                               changed=summary.get('changed', 0),
+                               failures=summary.get('failures', 0),
+                               unreachable=summary.get('unreachable', 0),
+                               skipped=summary.get('skipped', 0),
+                               failed_tasks=self.failed_tasks.get(host, []))
+        path = report_path()
+        try:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path + '.tmp', 'w') as f:
+                json.dump(dict(hosts=hosts, tasks=self.tasks), f)
+            os.rename(path + '.tmp', path)
+        except (IOError, OSError) as exc:
+            self._display.warning(u'Unable to write the build report to %s: %s' % (path, exc))
@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+#
+# Connection plugin used by the Ansible Container builder.
+#
+# It extends the docker connection plugin: rather than starting a new `docker exec` for every
+# command of every task, one `docker exec -i <container> /bin/sh` is kept open per container and
+# user, and commands are run through it. Ansible runs each task in a new worker process, so the
+# shell is owned by a small broker process that outlives the workers (in the spirit of SSH's
+# ControlPersist) and serves them over a unix socket. The broker exits after sitting idle for
+# ANSIBLE_CONTAINER_EXEC_PERSIST seconds, or when the shell goes away.
+#
+# Anything the persistent shell can't handle falls back to the docker plugin.
+
+from __future__ import absolute_import, print_function
+
+import base64
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import re
+import select
+import socket
+import struct
+import subprocess
+import sys
+import time
+import uuid
+
+try:
+    from shlex import quote as shell_quote
+except ImportError:
+    from pipes import quote as shell_quote
+
+SOCKET_DIR = os.environ.get('ANSIBLE_CONTAINER_EXEC_SOCKET_DIR', '/tmp/ansible-container-exec')
+IDLE_TIMEOUT = int(os.environ.get('ANSIBLE_CONTAINER_EXEC_PERSIST', 60))
+STARTUP_TIMEOUT = 10
+
+
+def to_bytes(value):
+    if isinstance(value, bytes):
+        return value
+    return value.encode('utf-8')
+
+
+def to_text(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return value
+
+
+class SessionError(Exception):
+    pass
+
+
+class ExecSession(object):
+    '''
+    A shell kept open inside a container. Each command's output is followed by a marker unique to
+    that command, which carries its exit status and tells us where the output ends.
+    '''
+
+    def __init__(self, exec_cmd):
+        self.proc = subprocess.Popen(exec_cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     stderr=subprocess.PIPE)
+        rc, _, _ = self.run('command -v base64')
+        self.can_pipe_data = rc == 0
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def run(self, cmd, in_data=None, executable='/bin/sh'):
+        marker = '__ac_%s' % uuid.uuid4().hex
+        if in_data:
+            # base64 only uses characters that are safe within single quotes
+            line = "printf '%%s' '%s' | base64 -d | %s -c %s" % (
+                to_text(base64.b64encode(to_bytes(in_data))), executable, shell_quote(cmd))
+        else:
+            line = '%s -c %s < /dev/null' % (executable, shell_quote(cmd))
+        script = "%s\n__ac_rc=$?; printf '%s %%d\\n' \"$__ac_rc\"; printf '%s\\n' >&2\n" % (
+            line, marker, marker)
+        try:
+            self.proc.stdin.write(to_bytes(script))
+            self.proc.stdin.flush()
+        except (IOError, OSError) as exc:
+            raise SessionError('Unable to write to exec session: %s' % exc)
+        return self._read_result(to_bytes(marker))
+
+    def _read_result(self, marker):
+        buffers = {self.proc.stdout.fileno(): b'', self.proc.stderr.fileno(): b''}
+        out_fd, err_fd = self.proc.stdout.fileno(), self.proc.stderr.fileno()
+        out_end = re.compile(re.escape(marker) + b' (\\d+)\n$')
+        err_end = marker + b'\n'
+        pending = set(buffers)
+        while pending:
+            ready, _, _ = select.select(list(pending), [], [])
+            for fd in ready:
+                data = os.read(fd, 65536)
+                if not data:
+                    raise SessionError('Exec session closed unexpectedly')
+                buffers[fd] += data
+            if out_fd in pending and out_end.search(buffers[out_fd]):
+                pending.discard(out_fd)
+            if err_fd in pending and buffers[err_fd].endswith(err_end):
+                pending.discard(err_fd)
+        stdout = buffers[out_fd]
+        match = out_end.search(stdout)
+        return int(match.group(1)), stdout[:match.start()], buffers[err_fd][:-len(err_end)]
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except (IOError, OSError):
+            pass
+        if self.alive():
+            self.proc.terminate()
+        self.proc.wait()
+
+
+def send_message(sock, message):
+    data = to_bytes(json.dumps(message))
+    sock.sendall(struct.pack('!Q', len(data)) + data)
+
+
+def recv_message(sock):
+    def recv_exactly(size):
+        data = b''
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise SessionError('Connection to exec broker closed')
+            data += chunk
+        return data
+    size, = struct.unpack('!Q', recv_exactly(8))
+    return json.loads(to_text(recv_exactly(size)))
+
+
+def serve(socket_path, exec_cmd):
+    '''
+    Broker main loop: own the exec session for one container and user, and run requests from
+    Ansible worker processes through it one at a time.
+    '''
+    try:
+        session = ExecSession(exec_cmd)
+    except (OSError, SessionError):
+        open(socket_path + '.failed', 'w').close()
+        return
+    try:
+        os.unlink(socket_path + '.new')
+    except OSError:
+        pass
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path + '.new')
+    os.rename(socket_path + '.new', socket_path)
+    server.listen(16)
+    server.settimeout(IDLE_TIMEOUT)
+    try:
+        while session.alive():
+            try:
+                conn, _ = server.accept()
+            except socket.timeout:
+                break
+            conn.settimeout(None)
+            try:
+                request = recv_message(conn)
+                in_data = base64.b64decode(request['in_data']) if request.get('in_data') else None
+                if in_data and not session.can_pipe_data:
+                    send_message(conn, dict(fallback=True))
+                    continue
+                try:
+                    rc, stdout, stderr = session.run(request['cmd'], in_data=in_data,
+                                                     executable=request.get('executable') or '/bin/sh')
+                except SessionError as exc:
+                    send_message(conn, dict(error=str(exc)))
+                    break
+                send_message(conn, dict(rc=rc,
+                                        stdout=to_text(base64.b64encode(stdout)),
+                                        stderr=to_text(base64.b64encode(stderr))))
+            except (SessionError, socket.error, ValueError):
+                pass
+            finally:
+                conn.close()
+    finally:
+        server.close()
+        try:
+            os.unlink(socket_path)
+        except OSError:
+            pass
+        session.close()
+
+
+def daemonize_and_serve(socket_path, exec_cmd):
+    if os.fork():
+        return
+    os.setsid()
+    if os.fork():
+        os._exit(0)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    try:
+        serve(socket_path, exec_cmd)
+    finally:
+        os._exit(0)
+
+
+# The plugin starts brokers by running this file as a script, which needs nothing from Ansible
+if __name__ == '__main__':
+    daemonize_and_serve(sys.argv[1], json.loads(sys.argv[2]))
+    sys.exit(0)
+
+
+try:
+    from ansible.errors import AnsibleConnectionFailure
+    from ansible.plugins.connection import ConnectionBase
+    from ansible.plugins.connection.docker import Connection as DockerConnection
+except ImportError:
+    # The exec session and broker above don't need Ansible, so they can be imported, and
+    # tested, on their own; the connection plugin below does
+    DockerConnection = object
+else:
+    try:
+        from __main__ import display
+    except ImportError:
+        from ansible.utils.display import Display
+        display = Display()
+
+
+class Connection(DockerConnection):
+    ''' Docker connection that runs commands through a persistent exec session '''
+
+    transport = 'ac_docker'
+    has_pipelining = True
+    always_pipeline_modules = True
+
+    def _exec_cmd(self, cmd):
+        if hasattr(self, '_build_exec_cmd'):
+            return [to_text(part) for part in self._build_exec_cmd(cmd)]
+        local_cmd = [self.docker_cmd, 'exec', '-i']
+        if self._play_context.remote_user:
+            local_cmd += ['-u', self._play_context.remote_user]
+        return [to_text(part) for part in local_cmd + [self._play_context.remote_addr] + cmd]
+
+    def _socket_path(self):
+        exec_cmd = self._exec_cmd(['/bin/sh'])
+        key = hashlib.sha1(to_bytes(json.dumps(exec_cmd))).hexdigest()
+        return os.path.join(SOCKET_DIR, '%s.sock' % key), exec_cmd
+
+    def _connect_broker(self):
+        '''
+        Connect to the broker for this container and user, starting it if needed.
+
+        :return: connected socket, or None if no persistent session can be used
+        '''
+        socket_path, exec_cmd = self._socket_path()
+        if os.path.exists(socket_path + '.failed'):
+            return None
+        try:
+            os.makedirs(SOCKET_DIR)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                return None
+        with open(socket_path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            sock = self._try_connect(socket_path)
+            if sock:
+                return sock
+            display.vvv(u'STARTING PERSISTENT EXEC SESSION %s' % u' '.join(exec_cmd),
+                        host=self._play_context.remote_addr)
+            subprocess.check_call([sys.executable, os.path.abspath(__file__).replace('.pyc', '.py'),
+                                   socket_path, json.dumps(exec_cmd)])
+            deadline = time.time() + STARTUP_TIMEOUT
+            while time.time() < deadline and not os.path.exists(socket_path + '.failed'):
+                sock = self._try_connect(socket_path)
+                if sock:
+                    return sock
+                time.sleep(0.05)
+        return None
+
+    @staticmethod
+    def _try_connect(socket_path):
+        if not os.path.exists(socket_path):
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(socket_path)
+        except socket.error:
+            sock.close()
+            return None
+        return sock
+
+    def exec_command(self, cmd, in_data=None, sudoable=False):
+        if sudoable and self._play_context.become and getattr(self._play_context, 'prompt', None):
+            # Password prompts need the interactive handling of the docker plugin
+            return super(Connection, self).exec_command(cmd, in_data=in_data, sudoable=sudoable)
+        ConnectionBase.exec_command(self, cmd, in_data=in_data, sudoable=sudoable)
+
+        try:
+            sock = self._connect_broker()
+        except (OSError, IOError, subprocess.CalledProcessError) as exc:
+            display.vvv(u'Persistent exec session unavailable: %s' % exc, host=self._play_context.remote_addr)
+            sock = None
+        if sock is None:
+            return super(Connection, self).exec_command(cmd, in_data=in_data, sudoable=sudoable)
+
+        display.vvv(u'EXEC (persistent) %s' % to_text(cmd), host=self._play_context.remote_addr)
+        try:
+            try:
+                send_message(sock, dict(cmd=to_text(cmd),
+                                        executable=self._play_context.executable,
+                                        in_data=to_text(base64.b64encode(to_bytes(in_data))) if in_data else None))
+                result = recv_message(sock)
+            except (socket.error, SessionError, ValueError) as exc:
+                raise AnsibleConnectionFailure(u'Persistent exec session failed: %s' % exc)
+        finally:
+            sock.close()
+
+        if result.get('fallback'):
+            return super(Connection, self).exec_command(cmd, in_data=in_data, sudoable=sudoable)
+        if 'error' in result:
+            raise AnsibleConnectionFailure(u'Persistent exec session failed: %s' % result['error'])
+        return result['rc'], base64.b64decode(to_bytes(result['stdout'])), base64.b64decode(to_bytes(result['stderr']))
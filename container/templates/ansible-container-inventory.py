@@ -17,13 +17,23 @@ def config_keys():
     return os.environ.get('ANSIBLE_ORCHESTRATED_HOSTS', '').split(',')
 
 
+def container_name(host):
+    '''
+    Name of the container compose runs for a host, within the compose project the
+    build runs in, from env var ANSIBLE_CONTAINER_PROJECT.
+
+    :return: str
+    '''
+    return '%s_%s_1' % (os.environ.get('ANSIBLE_CONTAINER_PROJECT') or 'ansible', host)
+
+
 def cmd_list():
     hosts = config_keys()
     return dict(
         docker=hosts,
         _meta=dict(
             hostvars={
-                host: {'ansible_host': 'ansible_%s_1' % host}
+                host: {'ansible_host': container_name(host)}
                 for host in hosts
             }
         )
@@ -35,7 +45,7 @@ def cmd_host(host):
     if host not in hosts:
         return {}
     return dict(
-        ansible_host='ansible_%s_1' % host
+        ansible_host=container_name(host)
     )
 
 if __name__ == '__main__':
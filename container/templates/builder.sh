@@ -1,20 +1,79 @@
 #!/bin/bash
 
+# Named volumes mounted here by the build, listhosts and install compose files
+# persist pip packages and Galaxy roles between runs. Installs are skipped when
+# the requirements file, and the builder image with its Python and Ansible, match
+# those of the last install into the volume. Builds sharing a volume take turns
+# installing into it.
+CACHE_DIR=/ansible-container-cache
+PIP_CACHE="${CACHE_DIR}/pip"
+GALAXY_CACHE="${CACHE_DIR}/galaxy"
+
+builder_identity() {
+    echo "${ANSIBLE_CONTAINER_BUILDER_IMAGE}"
+    python -V 2>&1
+    python -c "import ansible; print(ansible.__version__)" 2>/dev/null
+}
+
+requirements_hash() {
+    { cat "$1"; echo "${BUILDER_IDENTITY}"; } | sha256sum | cut -d ' ' -f 1
+}
+
+is_cached() {
+    # is_cached <requirements file> <stamp file>
+    [ "${ANSIBLE_CONTAINER_NO_CACHE}" != "1" ] && [ -f "$2" ] && \
+        [ "$(cat "$2")" == "$(requirements_hash "$1")" ]
+}
+
+if [ -d "${PIP_CACHE}" ] || [ -d "${GALAXY_CACHE}" ]; then
+    BUILDER_IDENTITY=$(builder_identity)
+fi
+
 if [ -s "./requirements.txt" ]; then
-    echo "Running pip install of ansible/requirements.txt" 
-    pip install --no-cache-dir -q -U -r ./requirements.txt
+    if [ -d "${PIP_CACHE}" ]; then
+        pip_prefix="${PIP_CACHE}/prefix"
+        site_packages=$(python -c "from distutils.sysconfig import get_python_lib; print(get_python_lib(prefix='${pip_prefix}'))")
+        export PYTHONPATH="${site_packages}${PYTHONPATH:+:${PYTHONPATH}}"
+        export PATH="${pip_prefix}/bin:${PATH}"
+        (
+            flock 9
+            if is_cached ./requirements.txt "${PIP_CACHE}/requirements.sha256"; then
+                echo "ansible/requirements.txt is unchanged, skipping pip install"
+            else
+                echo "Running pip install of ansible/requirements.txt"
+                pip install --cache-dir "${PIP_CACHE}/wheels" -q -U --prefix "${pip_prefix}" -r ./requirements.txt && \
+                    requirements_hash ./requirements.txt > "${PIP_CACHE}/requirements.sha256"
+            fi
+        ) 9>"${PIP_CACHE}/.lock"
+    else
+        echo "Running pip install of ansible/requirements.txt"
+        pip install --no-cache-dir -q -U -r ./requirements.txt
+    fi
 fi
 
 if [ -f "./requirements.yml" ]; then
     roles=$(python -c "import yaml; roles = yaml.load(open('./requirements.yml', 'r')); print 0 if not roles else len(roles)")
     if [ "${roles}" -gt 0 ]; then
-        ansible-galaxy install -r ./requirements.yml
+        if [ -d "${GALAXY_CACHE}" ]; then
+            export ANSIBLE_ROLES_PATH="${ANSIBLE_ROLES_PATH:-/etc/ansible/roles}:${GALAXY_CACHE}/roles"
+            (
+                flock 9
+                if is_cached ./requirements.yml "${GALAXY_CACHE}/requirements.sha256"; then
+                    echo "ansible/requirements.yml is unchanged, skipping ansible-galaxy install"
+                else
+                    ansible-galaxy install --force -p "${GALAXY_CACHE}/roles" -r ./requirements.yml && \
+                        requirements_hash ./requirements.yml > "${GALAXY_CACHE}/requirements.sha256"
+                fi
+            ) 9>"${GALAXY_CACHE}/.lock"
+        else
+            ansible-galaxy install -r ./requirements.yml
+        fi
     fi
 fi
 
 if [ "${ANSIBLE_ORCHESTRATED_HOSTS}" != "" ]; then
     # shellcheck disable=SC2046
-    /usr/local/bin/wait_on_host.py -m 5 $(echo "${ANSIBLE_ORCHESTRATED_HOSTS}" | tr ',' ' ')
+    /usr/local/bin/wait_on_host.py -t 30 $(echo "${ANSIBLE_ORCHESTRATED_HOSTS}" | tr ',' ' ')
 fi
 
 "$@"
@@ -1,41 +1,60 @@
 #!/usr/bin/env python
 from __future__ import print_function
 
+import os
 import subprocess
 import argparse
 import sys
 from six import iteritems
 from subprocess import CalledProcessError, STDOUT
-from time import sleep
+from time import sleep, time
 
 
-def wait_on_hosts(hosts, max_attempts=3, sleep_time=1):
+def running_containers():
     '''
-    Wait for a container to have a State.Running value = true.
+    Get the names of all running containers with a single listing.
+    :return: set of container names
+    '''
+    try:
+        output = subprocess.check_output(["docker", "ps", "--format", "{{ .Names }}"], stderr=STDOUT)
+    except CalledProcessError:
+        return set()
+    names = set()
+    for line in output.decode('utf-8', 'replace').splitlines():
+        # Older engines also list link aliases, comma separated
+        names.update(name.strip() for name in line.split(',') if name.strip())
+    return names
+
+
+def wait_on_hosts(hosts, max_attempts=3, sleep_time=1, timeout=None, project=None):
+    '''
+    Wait for the containers of all hosts to be running. Every probe checks all hosts at once, starting
+    with a short interval and backing off exponentially, so the wait ends as soon as the last container
+    is up.
     :param hosts: list of service names taken from container.yml
-    :param max_attempts: Max number of times to inspect the container and check State.Running
-    :param sleep_time: Number of seconds to wait between attempts.
+    :param max_attempts: Used with sleep_time to derive the timeout when none is given
+    :param sleep_time: Longest number of seconds to wait between probes.
+    :param timeout: Number of seconds to wait in total.
+    :param project: Compose project the containers belong to, defaults to env var ANSIBLE_CONTAINER_PROJECT
     :return: dict of host:running pairs
     '''
-    results = {}
-    for host in hosts:
-        container = "ansible_{}_1".format(host)
-        tries = max_attempts
-        host_ready = False
-        output = None
-        results[host] = False
-        while tries > 0 and not host_ready:
-            try:
-                output = subprocess.check_output(["docker", "inspect", "--format", "{{ .State.Running }}",
-                                                  container], stderr=STDOUT)
-            except CalledProcessError:
-                pass
-            tries -= 1
-            if output and 'true' in output:
-                host_ready = True
+    if timeout is None:
+        timeout = max_attempts * sleep_time
+    deadline = time() + timeout
+    project = project or os.environ.get('ANSIBLE_CONTAINER_PROJECT') or 'ansible'
+    containers = dict((host, "{}_{}_1".format(project, host)) for host in hosts)
+    results = dict((host, False) for host in hosts)
+    delay = min(0.1, sleep_time)
+    while True:
+        running = running_containers()
+        for host, container in iteritems(containers):
+            if container in running:
                 results[host] = True
-            else:
-                sleep(sleep_time)
+        remaining = deadline - time()
+        if all(results.values()) or remaining <= 0:
+            break
+        sleep(min(delay, remaining))
+        delay = min(delay * 2, sleep_time)
     return results
 
 if __name__ == '__main__':
@@ -43,15 +62,20 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(prog='wait_on_host',
                                      description='Wait for a host or list of hosts to be in a running state')
     parser.add_argument('--max-attempts', '-m', type=int, action='store', default=3,
-                        help=u"max number of attempts at checking a container's state, defaults to 3")
-    parser.add_argument('--sleep-time', '-s', type=int, action='store', default=1,
-                        help=u'number of seconds to wait between attempts, defaults to 1')
+                        help=u"used with --sleep-time to derive the timeout when none is given, defaults to 3")
+    parser.add_argument('--sleep-time', '-s', type=float, action='store', default=1,
+                        help=u'longest number of seconds to wait between checks, defaults to 1')
+    parser.add_argument('--timeout', '-t', type=float, action='store', default=None,
+                        help=u'number of seconds to wait for all hosts, defaults to max attempts * sleep time')
+    parser.add_argument('--project', '-p', action='store', default=None,
+                        help=u'compose project of the containers, defaults to $ANSIBLE_CONTAINER_PROJECT or ansible')
     parser.add_argument('host', nargs='+',
                         help=u'name of the host to wait on')
     args = parser.parse_args()
 
     if args.host:
-        results = wait_on_hosts(args.host, max_attempts=args.max_attempts, sleep_time=args.sleep_time)
+        results = wait_on_hosts(args.host, max_attempts=args.max_attempts, sleep_time=args.sleep_time,
+                                timeout=args.timeout, project=args.project)
         status = 0
         for host, running in iteritems(results):
             print("Host {0} {1}".format(host, 'running' if running else 'failed'))
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+import json
+import os
+import threading
+import time
+
+from contextlib import contextmanager
+
+__all__ = ['Span',
+           'Tracer',
+           'tracer',
+           'span',
+           'current_span']
+
+
+class Span(object):
+    '''
+    One timed phase of a command. Spans nest: a span started while another is
+    open on the same thread, or given that span as its parent, is its child.
+    '''
+
+    def __init__(self, name, parent=None, attrs=None):
+        self.name = name
+        self.parent = parent
+        self.attrs = attrs or {}
+        self.children = []
+        self.start = time.time()
+        self.end = None
+        self.thread = threading.current_thread().name
+        self.error = None
+
+    @property
+    def duration(self):
+        return (self.end if self.end is not None else time.time()) - self.start
+
+    def walk(self, depth=0):
+        yield depth, self
+        for child in self.children:
+            for item in child.walk(depth + 1):
+                yield item
+
+
+class Tracer(object):
+    '''
+    Collects the spans of one ansible-container command and reports them as an
+    indented timing tree or as a JSON trace file.
+    '''
+
+    def __init__(self):
+        self.roots = []
+        self.data = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def current(self):
+        stack = self._stack()
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name, parent=None, **attrs):
+        '''
+        Time the block as a span named name.
+
+        :param name: what the phase is, e.g. 'playbook' or 'export web'
+        :param parent: the enclosing span, for blocks run on a worker thread; by default the
+                       innermost span open on this thread
+        :param attrs: anything worth keeping with the timing, e.g. host='web'
+        '''
+        parent = parent or self.current()
+        span = Span(name, parent=parent, attrs=attrs)
+        with self._lock:
+            (parent.children if parent else self.roots).append(span)
+        stack = self._stack()
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.error = type(exc).__name__
+            raise
+        finally:
+            span.end = time.time()
+            stack.remove(span)
+
+    def add_data(self, key, value):
+        '''
+        Keep more data, such as the build's task timings, in the trace file.
+        '''
+        with self._lock:
+            self.data[key] = value
+
+    def spans(self):
+        for root in self.roots:
+            for item in root.walk():
+                yield item
+
+    def render(self):
+        '''
+        :return: the spans as an indented tree, one line per span
+        '''
+        lines = []
+        for depth, span in self.spans():
+            line = u'%8.2fs  %s%s' % (span.duration, u'  ' * depth, span.name)
+            if span.error:
+                line += u' (%s)' % span.error
+            lines.append(line)
+        return u'\n'.join(lines)
+
+    def trace(self):
+        '''
+        The spans in the Trace Event Format read by chrome://tracing and Perfetto,
+        with any extra data alongside.
+
+        :return: dict
+        '''
+        events = []
+        threads = {}
+        for depth, span in self.spans():
+            tid = threads.setdefault(span.thread, len(threads) + 1)
+            args = dict(span.attrs)
+            if span.error:
+                args['error'] = span.error
+            events.append(dict(name=span.name, ph='X', pid=os.getpid(), tid=tid,
+                               ts=int(span.start * 1000000), dur=int(span.duration * 1000000),
+                               args=args))
+        for name, tid in threads.items():
+            events.append(dict(name='thread_name', ph='M', pid=os.getpid(), tid=tid,
+                               args=dict(name=name)))
+        trace = dict(traceEvents=events, displayTimeUnit='ms')
+        trace.update(self.data)
+        return trace
+
+    def write_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.trace(), f, indent=2)
+        logger.debug('Wrote timing trace to %s', path)
+
+    def reset(self):
+        with self._lock:
+            self.roots = []
+            self.data = {}
+        self._local = threading.local()
+
+
+# The tracer for this process, which the CLI reports from
+tracer = Tracer()
+span = tracer.span
+current_span = tracer.current
@@ -6,9 +6,12 @@ import logging
 logger = logging.getLogger(__name__)
 
 import os
+import time
+import errno
 import importlib
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
 
+from .cache import user_cache_path
 from .exceptions import AnsibleContainerNotInitializedException
 from .config import AnsibleContainerConfig
 from .temp import MakeTempDir
@@ -16,11 +19,13 @@ from .temp import MakeTempDir
 
 __all__ = ['make_temp_dir',
            'jinja_template_path',
+           'jinja_env',
            'jinja_render_to_temp',
            'get_config',
            'config_format_version',
            'assert_initialized',
            'get_latest_image_for',
+           'iter_chunks',
            'load_engine',
            'load_shipit_engine',
            'AVAILABLE_SHIPIT_ENGINES']
@@ -47,11 +52,39 @@ def jinja_template_path():
             os.path.dirname(__file__),
             'templates'))
 
+_jinja_env = None
+
+
+def jinja_env():
+    '''
+    The Jinja environment for the templates shipped with Ansible Container, created once per process. Compiled
+    templates are also kept in the user cache directory, so later invocations don't compile them again.
+
+    :return: jinja2.Environment
+    '''
+    global _jinja_env
+    if _jinja_env is None:
+        bytecode_cache = None
+        cache_dir = user_cache_path('jinja')
+        try:
+            os.makedirs(cache_dir)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                logger.debug('Unable to create template cache %s - %s', cache_dir, exc)
+                cache_dir = None
+        if cache_dir:
+            bytecode_cache = FileSystemBytecodeCache(cache_dir)
+        _jinja_env = Environment(loader=FileSystemLoader(jinja_template_path()),
+                                 bytecode_cache=bytecode_cache)
+    return _jinja_env
+
 def jinja_render_to_temp(template_file, temp_dir, dest_file, **context):
-    j2_tmpl_path = jinja_template_path()
-    j2_env = Environment(loader=FileSystemLoader(j2_tmpl_path))
-    j2_tmpl = j2_env.get_template(template_file)
+    start = time.time()
+    j2_tmpl = jinja_env().get_template(template_file)
+    loaded = time.time()
     rendered = j2_tmpl.render(dict(temp_dir=temp_dir, **context))
+    logger.debug('Rendered %s in %.1fms (%.1fms loading, %.1fms rendering)', template_file,
+                 (time.time() - start) * 1000, (loaded - start) * 1000, (time.time() - loaded) * 1000)
     logger.debug('Rendered Jinja Template:')
     logger.debug(rendered.encode('utf8'))
     open(os.path.join(temp_dir, dest_file), 'wb').write(
@@ -76,6 +109,12 @@ def assert_initialized(base_path):
         raise AnsibleContainerNotInitializedException()
 
 def get_latest_image_for(project_name, host, client):
+    '''
+    Find the image last built for a host, and the build stamp it was tagged with.
+
+    :param client: docker client, or an ImageIndex snapshot of its images
+    :return: (image id, build stamp), or (None, None) if the host has no image
+    '''
     image_data = client.images(
         '%s-%s' % (project_name, host,)
     )
@@ -91,6 +130,28 @@ def get_latest_image_for(project_name, host, client):
         # No previous image built
         return None, None
 
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+def iter_chunks(stream, chunk_size=STREAM_CHUNK_SIZE):
+    '''
+    Read a file-like object in fixed size chunks, so large payloads such as an
+    exported container filesystem never have to be held in memory at once. The
+    stream is closed once exhausted.
+
+    :param stream: file-like object with a read() method
+    :param chunk_size: maximum number of bytes per chunk
+    :return: generator of bytes
+    '''
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        stream.close()
+
 def load_engine(engine_name='', base_path='', **kwargs):
     """
 
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Compare container.yml load latency of the previous loader against the current
+one. The previous loader read the file a second time to cut out the defaults
+section, rendered it from a temp dir, and parsed YAML with the pure Python
+parser. The current one renders the defaults from memory and uses libyaml when
+PyYAML was built with it. The config cache is cleared before every load so
+each one does the full templating and parsing.
+
+    python test/benchmarks/config_load.py --services 10 100 500
+'''
+from __future__ import absolute_import, print_function
+
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+import timeit
+
+import yaml
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from container import config as config_module
+from container.config import AnsibleContainerConfig
+from container.temp import MakeTempDir as make_temp_dir
+
+
+class TempDirDefaultsConfig(AnsibleContainerConfig):
+    '''
+    The previous _get_defaults: scan the file line by line, then template the
+    section from a file written to a temp dir.
+    '''
+    def _get_defaults(self, source=None):
+        defaults = {}
+        default_lines = ['defaults:']
+        found = False
+        sections = [u'version:', u'services:', u'registries:']
+        with open(self.config_path, 'r') as f:
+            for line in f:
+                if re.search(r'^defaults:', line):
+                    found = True
+                    continue
+                if found:
+                    if re.sub(u'\n', '', line) not in sections:
+                        default_lines.append(re.sub(u'\n', '', line))
+                    else:
+                        break
+        if len(default_lines) > 1:
+            with make_temp_dir() as temp_dir:
+                with open(os.path.join(temp_dir, 'defaults.txt'), 'w') as f:
+                    f.write(u'\n'.join(default_lines))
+                default_section = self._render_template(context={}, path=temp_dir, template='defaults.txt')
+            defaults.update(yaml.load(default_section, Loader=config_module.SafeLoader).get('defaults'))
+        return defaults
+
+
+def write_project(base_path, services):
+    os.mkdir(os.path.join(base_path, 'ansible'))
+    lines = [u"version: '2'", u'defaults:']
+    for i in range(services):
+        lines.append(u'    image_%d: centos:7' % i)
+        lines.append(u'    port_%d: %d' % (i, 8000 + i))
+    lines.append(u'services:')
+    for i in range(services):
+        lines.extend([u'    svc%d:' % i,
+                      u'        image: {{ image_%d }}' % i,
+                      u"        ports: ['{{ port_%d }}:80']" % i,
+                      u"        command: ['sleep', '1d']",
+                      u'        dev_overrides:',
+                      u'            environment:',
+                      u'              - DEBUG=1'])
+    with open(os.path.join(base_path, 'ansible', 'container.yml'), 'w') as f:
+        f.write(u'\n'.join(lines) + u'\n')
+
+
+def measure(config_class, base_path, repeat, loader):
+    def load():
+        AnsibleContainerConfig.clear_cache()
+        config_class(base_path)
+    current_loader = config_module.SafeLoader
+    config_module.SafeLoader = loader
+    try:
+        return min(timeit.repeat(load, number=1, repeat=repeat)) * 1000
+    finally:
+        config_module.SafeLoader = current_loader
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--services', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    print('%10s %14s %14s' % ('services', 'previous ms', 'current ms'))
+    for services in args.services:
+        base_path = tempfile.mkdtemp()
+        try:
+            write_project(base_path, services)
+            print('%10d %14.2f %14.2f' % (services,
+                                          measure(TempDirDefaultsConfig, base_path, args.repeat,
+                                                  yaml.SafeLoader),
+                                          measure(AnsibleContainerConfig, base_path, args.repeat,
+                                                  config_module.SafeLoader)))
+        finally:
+            shutil.rmtree(base_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Compare task throughput of the connection plugins the builder can run the build
+playbook with:
+
+  docker             - Ansible's docker plugin, copying each module into the container
+  docker+pipelining  - the docker plugin with pipelining, as configured by the builder's ansible.cfg
+  ac_docker          - container/templates/ac_docker.py, one persistent exec session per container
+
+Needs ansible-playbook and a Docker daemon. A throwaway container is started from
+--image and removed afterwards.
+
+    python test/benchmarks/docker_connection.py --tasks 200
+'''
+from __future__ import absolute_import, print_function
+
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import uuid
+
+PLUGIN_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'container', 'templates'))
+
+MODES = [
+    ('docker', 'docker', False),
+    ('docker+pipelining', 'docker', True),
+    ('ac_docker', 'ac_docker', True),
+]
+
+
+def write_playbook(path, tasks):
+    with open(path, 'w') as f:
+        f.write('- hosts: all\n  gather_facts: false\n  tasks:\n')
+        for i in range(tasks):
+            f.write('    - command: /bin/true\n' if i % 2 else '    - file: path=/tmp state=directory\n')
+
+
+def run(temp_dir, container, connection, pipelining):
+    env = dict(os.environ,
+               ANSIBLE_CONNECTION_PLUGINS=PLUGIN_DIR,
+               ANSIBLE_SSH_PIPELINING='True' if pipelining else 'False',
+               ANSIBLE_CONTAINER_EXEC_SOCKET_DIR=os.path.join(temp_dir, 'sockets'),
+               ANSIBLE_CONTAINER_EXEC_PERSIST='5',
+               ANSIBLE_RETRY_FILES_ENABLED='False')
+    start = time.time()
+    subprocess.check_call(['ansible-playbook', '-i', '%s,' % container, '-c', connection,
+                           os.path.join(temp_dir, 'playbook.yml')],
+                          env=env, stdout=open(os.devnull, 'w'))
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tasks per second by connection plugin')
+    parser.add_argument('--tasks', type=int, default=100, help='number of tasks in the playbook')
+    parser.add_argument('--image', default='centos:7', help='image to run the tasks against')
+    args = parser.parse_args()
+
+    container = 'ac-connection-benchmark-%s' % uuid.uuid4().hex[:8]
+    temp_dir = tempfile.mkdtemp()
+    subprocess.check_call(['docker', 'run', '-d', '--name', container, args.image, 'sleep', '1d'],
+                          stdout=open(os.devnull, 'w'))
+    try:
+        write_playbook(os.path.join(temp_dir, 'playbook.yml'), args.tasks)
+        print('%-18s %10s %10s' % ('connection', 'seconds', 'tasks/s'))
+        for name, connection, pipelining in MODES:
+            elapsed = run(temp_dir, container, connection, pipelining)
+            print('%-18s %10.2f %10.1f' % (name, elapsed, args.tasks / elapsed))
+    finally:
+        subprocess.call(['docker', 'rm', '-f', container], stdout=open(os.devnull, 'w'))
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    main()
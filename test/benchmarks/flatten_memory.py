@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Compare peak RSS of the two ways of feeding a container export into an image
+import during a flattened build:
+
+  read    - the old behavior, exported.read() into import_image_from_data
+  stream  - iter_chunks(exported), as used by Engine.post_build
+
+Each measurement runs in a fresh interpreter, since peak RSS only ever grows.
+The export is simulated, so no Docker daemon is needed. With streaming, the peak
+should stay flat as the image size grows.
+
+    python test/benchmarks/flatten_memory.py --sizes 64 256 1024
+'''
+from __future__ import absolute_import, print_function
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+MB = 1024 * 1024
+
+
+class FakeExport(object):
+    '''
+    Stands in for the raw response returned by client.export(); produces `size`
+    bytes on demand.
+    '''
+    def __init__(self, size):
+        self.remaining = size
+
+    def read(self, amt=None):
+        if amt is None or amt > self.remaining:
+            amt = self.remaining
+        self.remaining -= amt
+        return b'\0' * amt
+
+    def close(self):
+        pass
+
+
+def fake_import_image_from_data(data):
+    # requests sends a bytes body as-is and iterates a generator for a chunked upload
+    if isinstance(data, bytes):
+        return len(data)
+    return sum(len(chunk) for chunk in data)
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / (MB if sys.platform == 'darwin' else 1024.0)
+
+
+def child(mode, size_mb):
+    from container.utils import iter_chunks
+    exported = FakeExport(size_mb * MB)
+    if mode == 'read':
+        sent = fake_import_image_from_data(exported.read())
+    else:
+        sent = fake_import_image_from_data(iter_chunks(exported))
+    assert sent == size_mb * MB
+    print('%.1f' % peak_rss_mb())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Peak RSS of flattened image export')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[64, 256, 1024],
+                        help='simulated image sizes in MB')
+    parser.add_argument('--child', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child[0], int(args.child[1]))
+
+    print('%10s %14s %14s' % ('size (MB)', 'read (MB RSS)', 'stream (MB RSS)'))
+    for size in args.sizes:
+        row = []
+        for mode in ('read', 'stream'):
+            output = subprocess.check_output([sys.executable, __file__, '--child', mode, str(size)])
+            row.append(float(output.decode('utf8').strip().splitlines()[-1]))
+        print('%10d %14.1f %14.1f' % (size, row[0], row[1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,26 @@
 import os
+import re
 import pytest
 import time
 
 from scripttest import TestFileEnvironment as ScriptTestEnvironment  # rename to avoid pytest collect warning
 
 
+# Each build runs in a compose project of its own, named ansible<12 hex digits>
+BUILDER_EXITED_OK = re.compile(r'ansible[0-9a-f]{12}_ansible-container_1 exited with code 0')
+
+
 def project_dir(name):
     test_dir = os.path.dirname(os.path.abspath(__file__))
     return os.path.join(test_dir, 'projects', name)
 
 
+def latest_builder_container(env):
+    result = env.run('docker', 'ps', '--all', '--latest', '--quiet', '--filter', 'name=_ansible-container_1',
+                     expect_stderr=True)
+    return result.stdout.strip()
+
+
 @pytest.mark.timeout(240)
 def test_build_minimal_docker_container():
     env = ScriptTestEnvironment()
@@ -24,7 +35,7 @@ def test_build_with_variables():
     assert "Aborting on container exit" in result.stdout
     assert "Exported minimal-minimal with image ID " in result.stderr
 
-    result = env.run('docker', 'inspect', '--format="{{ .Config.Env }}"', 'ansible_ansible-container_1',
+    result = env.run('docker', 'inspect', '--format="{{ .Config.Env }}"', latest_builder_container(env),
                      expect_stderr=True)
     assert "foo=bar" in result.stdout
     assert "bar=baz" in result.stdout
@@ -38,7 +49,7 @@ def test_build_with_volumes():
     assert "Exported minimal-minimal with image ID " in result.stderr
     result = env.run('docker', 'inspect',
                      '--format="{{range .Mounts}}{{ .Source }}:{{ .Destination }}:{{ .Mode}} {{ end }}"',
-                     'ansible_ansible-container_1', expect_stderr=True)
+                     latest_builder_container(env), expect_stderr=True)
     volumes = result.stdout.split(' ')
     assert volume_string in volumes
 
@@ -114,7 +125,7 @@ def test_build_with_var_file():
     env = ScriptTestEnvironment()
     result = env.run('ansible-container', '--var-file=devel.yaml','--debug', 'build',
                      cwd=project_dir('vartest'), expect_stderr=True)
-    assert "ansible_ansible-container_1 exited with code 0" in result.stderr
+    assert BUILDER_EXITED_OK.search(result.stderr)
     assert "Exporting built containers as images..." in result.stderr
 
 def test_run_with_var_file():
@@ -143,16 +154,20 @@ def test_compose_v2_build_and_run():
     env = ScriptTestEnvironment()
     result = env.run('ansible-container', '--debug', 'build',
                      cwd=project_dir('postgres'), expect_stderr=True)
-    assert "ansible_ansible-container_1 exited with code 0" in result.stderr
+    assert BUILDER_EXITED_OK.search(result.stderr)
 
+    # The build's volumes are removed along with its compose project
     result = env.run('docker', 'volume', 'ls')
-    assert "ansible_logs" in result.stdout
-    assert "ansible_postgres-postgresql_var_lib_postgresql_data" in result.stdout
+    assert not re.search(r'ansible[0-9a-f]{12}_logs', result.stdout)
 
     result = env.run('ansible-container', '--debug', 'run', '-d',
                      cwd=project_dir('postgres'), expect_stderr=True)
     assert "Deploying application in detached mode" in result.stderr
 
+    result = env.run('docker', 'volume', 'ls')
+    assert "ansible_logs" in result.stdout
+    assert "ansible_postgres-postgresql_var_lib_postgresql_data" in result.stdout
+
     # Give the containers a chance to start and reach a 'ready' state
     time.sleep(10)
 
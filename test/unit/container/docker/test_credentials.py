@@ -0,0 +1,90 @@
+import base64
+import json
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+import pytest
+
+from container.exceptions import AnsibleContainerDockerConfigFileException
+from container.docker.credentials import CredentialStore, Credentials
+
+HUB = 'https://index.docker.io/v1/'
+
+
+def auth(username, password):
+    return base64.b64encode(('%s:%s' % (username, password)).encode('utf-8')).decode('ascii')
+
+
+class TestCredentialStore(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.test_dir, 'config.json')
+        self.dockercfg = os.path.join(self.test_dir, '.dockercfg')
+        self.store = CredentialStore([os.path.join(self.test_dir, 'missing.json'), self.config_file,
+                                      self.dockercfg])
+        self.path = os.environ['PATH']
+        os.environ['PATH'] = self.test_dir + os.pathsep + self.path
+
+    def tearDown(self):
+        os.environ['PATH'] = self.path
+        shutil.rmtree(self.test_dir)
+
+    def write(self, path, config):
+        with open(path, 'w') as f:
+            json.dump(config, f)
+
+    def write_helper(self, name, username, secret):
+        path = os.path.join(self.test_dir, 'docker-credential-%s' % name)
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\n'
+                    'read server\n'
+                    'echo "$server" >> %s.calls\n'
+                    'echo \'{"ServerURL": "\'$server\'", "Username": "%s", "Secret": "%s"}\'\n'
+                    % (path, username, secret))
+        os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        return path + '.calls'
+
+    def test_no_config(self):
+        with pytest.raises(AnsibleContainerDockerConfigFileException):
+            self.store.get(HUB)
+        self.assertEqual(self.store.auth_config(HUB), None)
+
+    def test_auths_and_cascade(self):
+        self.write(self.dockercfg, {HUB: {'auth': auth('old', 'pw'), 'email': 'old@example.com'}})
+        self.assertEqual(self.store.get(HUB), Credentials('old', 'pw', 'old@example.com'))
+        self.write(self.config_file, {'auths': {'registry.example.com:5000': {'auth': auth('me', 'secret')}}})
+        self.assertEqual(self.store.get(HUB), Credentials(None, None, ''))
+        self.assertEqual(self.store.get('https://registry.example.com:5000'), Credentials('me', 'secret', ''))
+        self.assertEqual(self.store.auth_config('https://registry.example.com:5000'),
+                         dict(username='me', password='secret', email=None,
+                              serveraddress='https://registry.example.com:5000'))
+
+    def test_reparsed_only_when_changed(self):
+        self.write(self.config_file, {'auths': {HUB: {'auth': auth('me', 'one')}}})
+        self.assertEqual(self.store.get(HUB).password, 'one')
+        config = self.store.config()
+        self.assertIs(self.store.config(), config)
+        self.write(self.config_file, {'auths': {HUB: {'auth': auth('me', 'second')}}})
+        self.assertEqual(self.store.get(HUB).password, 'second')
+
+    def test_credential_helpers(self):
+        store_calls = self.write_helper('store', 'me', 'from-store')
+        hub_calls = self.write_helper('hub', '<token>', 'identity')
+        self.write(self.config_file, {'auths': {HUB: {}}, 'credsStore': 'store',
+                                      'credHelpers': {'index.docker.io': 'hub'}})
+        self.assertEqual(self.store.get('https://registry.example.com').password, 'from-store')
+        self.assertEqual(self.store.get('https://registry.example.com').password, 'from-store')
+        with open(store_calls) as f:
+            self.assertEqual(f.read(), 'https://registry.example.com\n')
+        self.assertEqual(self.store.auth_config(HUB), dict(identitytoken='identity', serveraddress=HUB))
+        self.assertTrue(os.path.exists(hub_calls))
+
+    def test_registry_clients_are_shared(self):
+        self.write(self.config_file, {'auths': {HUB: {'auth': auth('me', 'pw')}}})
+        client = self.store.registry_client(HUB)
+        self.assertEqual(client.auth, ('me', 'pw'))
+        self.assertIs(self.store.registry_client(HUB), client)
@@ -0,0 +1,216 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+from container.docker.engine import Engine
+
+
+class FakeClient(object):
+
+    def __init__(self, project):
+        self.containers_listed = []
+        self.removed = []
+        self.project = project
+
+    def containers(self, all=False, filters=None):
+        self.containers_listed.append(filters)
+        return [{'Id': 'c1'}, {'Id': 'c2'}]
+
+    def remove_container(self, container_id, force=False, v=False):
+        self.removed.append(('container', container_id))
+
+    def networks(self, names=None):
+        return [{'Name': name, 'Id': 'n-' + name} for name in names]
+
+    def remove_network(self, network_id):
+        self.removed.append(('network', network_id))
+
+    def volumes(self):
+        return {'Volumes': [{'Name': '%s_logs' % self.project}, {'Name': 'ansible_logs'},
+                            {'Name': 'project-ansible-container-pip-cache'}]}
+
+    def remove_volume(self, name):
+        self.removed.append(('volume', name))
+
+
+class TestBuildProject(unittest.TestCase):
+
+    def engine(self, builder_is_current=True):
+        engine = Engine.__new__(Engine)
+        engine.builder_image_is_current = lambda: builder_is_current
+        return engine
+
+    def test_build_operations_get_a_project_per_invocation(self):
+        engine, other = self.engine(), self.engine()
+        project = engine.orchestration_project('build')
+        self.assertTrue(re.match(r'^ansible[0-9a-f]{12}$', project))
+        self.assertEqual(engine.orchestration_project('listhosts'), project)
+        self.assertEqual(engine.orchestration_project('install'), project)
+        self.assertNotEqual(other.orchestration_project('build'), project)
+        self.assertEqual(engine.orchestration_project('run'), 'ansible')
+        self.assertEqual(engine.orchestration_project('stop'), 'ansible')
+        self.assertEqual(engine.container_name('web'), '%s_web_1' % project)
+        self.assertEqual(engine.container_name('web', project='ansible'), 'ansible_web_1')
+
+    def test_older_builder_images_build_in_the_ansible_project(self):
+        engine = self.engine(builder_is_current=False)
+        self.assertEqual(engine.orchestration_project('build'), 'ansible')
+        self.assertEqual(engine.orchestration_project('listhosts'), 'ansible')
+        self.assertEqual(engine.container_name('web'), 'ansible_web_1')
+        engine._client = client = FakeClient('ansible')
+        engine.cleanup_orchestration()
+        self.assertEqual(client.containers_listed, [])
+        self.assertEqual(client.removed, [])
+
+    def test_cleanup_removes_only_the_build_project(self):
+        engine = self.engine()
+        engine.cleanup_orchestration()
+        project = engine.build_project
+        engine._client = client = FakeClient(project)
+        engine.cleanup_orchestration()
+        self.assertEqual(client.containers_listed, [{'label': 'com.docker.compose.project=%s' % project}])
+        self.assertEqual(client.removed, [('container', 'c1'), ('container', 'c2'),
+                                          ('network', 'n-%s_default' % project),
+                                          ('volume', '%s_logs' % project)])
+
+
+class ImagesClient(object):
+
+    def __init__(self, images):
+        self._images = images
+
+    def images(self, name=None, quiet=False):
+        return self._images
+
+
+class TestBuilderImage(unittest.TestCase):
+
+    def engine(self, images):
+        engine = Engine.__new__(Engine)
+        engine._client = ImagesClient(images)
+        engine._builder_image_digest = '0123456789abcdef'
+        return engine
+
+    def test_image_built_from_the_current_context_is_used(self):
+        # latest was moved on by a build from another checkout
+        engine = self.engine([{'Id': 'sha256:current',
+                               'RepoTags': ['ansible-container-builder:0123456789ab']},
+                              {'Id': 'sha256:other', 'RepoTags': ['ansible-container-builder:latest']}])
+        self.assertTrue(engine.builder_image_is_current())
+        self.assertEqual(engine.get_builder_image_id(), 'sha256:current')
+
+    def test_latest_without_a_current_image(self):
+        engine = self.engine([{'Id': 'sha256:old', 'RepoTags': ['ansible-container-builder:latest']}])
+        self.assertFalse(engine.builder_image_is_current())
+        self.assertEqual(engine.get_builder_image_id(), 'sha256:old')
+
+
+class WaitClient(object):
+
+    def __init__(self, exit_code):
+        self.exit_code = exit_code
+        self.waited = []
+
+    def wait(self, container_id):
+        self.waited.append(container_id)
+        return self.exit_code
+
+
+class TestBuildResult(unittest.TestCase):
+
+    def setUp(self):
+        self.base_path = tempfile.mkdtemp()
+        self.engine = Engine.__new__(Engine)
+        self.engine.base_path = self.base_path
+        self.engine.builder_image_is_current = lambda: True
+
+    def tearDown(self):
+        shutil.rmtree(self.base_path)
+
+    def test_exit_code_from_orchestration(self):
+        self.engine._client = client = WaitClient(0)
+        self.engine._builder_exit_code = 2
+        self.assertFalse(self.engine.build_was_successful())
+        self.engine._builder_exit_code = 0
+        self.assertTrue(self.engine.build_was_successful())
+        self.assertEqual(client.waited, [])
+
+    def test_exit_code_from_builder_container(self):
+        self.engine._client = client = WaitClient(1)
+        self.engine.get_builder_container_id = lambda: 'builder'
+        self.assertFalse(self.engine.build_was_successful())
+        client.exit_code = 0
+        self.assertTrue(self.engine.build_was_successful())
+        self.assertEqual(client.waited, ['builder', 'builder'])
+
+    def test_build_report(self):
+        self.assertEqual(self.engine.build_report(), None)
+        path = self.engine.build_report_path()
+        self.assertEqual(os.path.basename(path), '%s.json' % self.engine.build_project)
+        os.makedirs(os.path.dirname(path))
+        hosts = {'web': dict(ok=3, changed=1, failures=1, unreachable=0, skipped=0,
+                             failed_tasks=['install nginx'])}
+        tasks = [dict(host='web', task='install nginx', role='nginx', status='failed', duration=4.2)]
+        with open(path, 'w') as f:
+            json.dump(dict(hosts=hosts, tasks=tasks), f)
+        self.assertEqual(self.engine.build_report(), dict(hosts=hosts, tasks=tasks))
+        self.assertFalse(os.path.exists(path))
+
+
+class TestComposeDigest(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = Engine.__new__(Engine)
+        self.engine.project_name = 'project'
+        self.engine.base_path = '/project'
+        self.engine.params = {}
+        self.environ = os.environ.copy()
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+
+    def digest(self):
+        return self.engine.compose_digest('run', '2', {'services': {'web': {'image': 'web:1'}}}, {},
+                                          ['web'], None, {}, {})
+
+    def test_only_variables_the_templates_read(self):
+        os.environ.pop('DOCKER_HOST', None)
+        digest = self.digest()
+        os.environ['SOME_SECRET'] = 'changed'
+        os.environ['ANSIBLE_CONTAINER_PROJECT'] = 'ansible0123456789ab'
+        self.assertEqual(self.digest(), digest)
+        os.environ['DOCKER_HOST'] = 'tcp://127.0.0.1:2375'
+        self.assertNotEqual(self.digest(), digest)
+        self.assertEqual(self.engine.template_environment()['DOCKER_HOST'], 'tcp://127.0.0.1:2375')
+        self.assertNotIn('SOME_SECRET', self.engine.template_environment())
+
+
+class TestBuildConfig(unittest.TestCase):
+
+    def engine(self, service):
+        engine = Engine.__new__(Engine)
+        engine.base_path = '/project'
+        engine.params = dict(service=service, rebuild=True)
+        engine.config = {'version': '2',
+                         'services': {'web': {'image': 'centos:7', 'links': ['db:database']},
+                                      'db': {'image': 'centos:7', 'volumes_from': ['data:ro']},
+                                      'data': {'image': 'busybox'},
+                                      'cache': {'image': 'centos:7'}}}
+        engine.hosts_touched_by_playbook = lambda: frozenset(['web', 'db', 'cache'])
+        engine.ensure_volumes = lambda names: None
+        return engine
+
+    def test_services_the_built_ones_need_are_kept(self):
+        services = self.engine(['web']).get_config_for_build()['services']
+        self.assertEqual(sorted(services), ['data', 'db', 'web'])
+        # db is only there for web to link to, idling like the services being built
+        self.assertEqual(services['db']['command'], services['web']['command'])
+        self.assertEqual(services['data'], {'image': 'busybox'})
+
+    def test_unneeded_services_are_dropped(self):
+        services = self.engine(['cache']).get_config_for_build()['services']
+        self.assertEqual(sorted(services), ['cache'])
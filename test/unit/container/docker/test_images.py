@@ -0,0 +1,50 @@
+import unittest
+
+from container.docker.images import ImageIndex, split_image_name
+from container.utils import get_latest_image_for
+
+
+class FakeClient(object):
+
+    def __init__(self, images):
+        self.calls = 0
+        self._images = images
+
+    def images(self, name=None, quiet=False):
+        self.calls += 1
+        return self._images
+
+
+class TestImageIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeClient([
+            {'Id': 'sha256:web1', 'RepoTags': ['demo-web:20170101000000', 'demo-web:latest']},
+            {'Id': 'sha256:web0', 'RepoTags': ['demo-web:20161231000000']},
+            {'Id': 'sha256:dangling', 'RepoTags': ['<none>:<none>']},
+            {'Id': 'sha256:reg', 'RepoTags': ['registry:5000/demo-db:1']},
+        ])
+        self.index = ImageIndex(self.client)
+
+    def test_split_image_name(self):
+        self.assertEqual(split_image_name('registry:5000/demo-db:1'), ('registry:5000/demo-db', '1'))
+        self.assertEqual(split_image_name('registry:5000/demo-db'), ('registry:5000/demo-db', None))
+        self.assertEqual(split_image_name('demo-db'), ('demo-db', None))
+
+    def test_lookups(self):
+        self.assertEqual(self.index.get_id('demo-web:latest'), 'sha256:web1')
+        self.assertEqual(self.index.get_id('registry:5000/demo-db:1'), 'sha256:reg')
+        self.assertIsNone(self.index.get_id('demo-db:latest'))
+        self.assertEqual(self.index.images('demo-web', quiet=True), ['sha256:web0', 'sha256:web1'])
+        self.assertEqual(get_latest_image_for('demo', 'web', self.index), ('sha256:web1', '20170101000000'))
+        self.assertEqual(get_latest_image_for('demo', 'db', self.index), (None, None))
+        self.assertEqual(self.client.calls, 1)
+
+    def test_tracks_changes(self):
+        self.index.add({'Id': 'sha256:web2', 'RepoTags': ['demo-web:20170102000000']})
+        self.index.tag('sha256:web2', 'demo-web', tag='latest')
+        self.assertEqual(get_latest_image_for('demo', 'web', self.index), ('sha256:web2', '20170102000000'))
+        self.assertEqual(self.index.images('demo-web:20170101000000')[0]['RepoTags'], ['demo-web:20170101000000'])
+        self.index.remove('sha256:web1')
+        self.assertEqual(self.index.images('demo-web', quiet=True), ['sha256:web0', 'sha256:web2'])
+        self.assertEqual(self.client.calls, 1)
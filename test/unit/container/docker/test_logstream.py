@@ -0,0 +1,41 @@
+import unittest
+
+from container.docker.logstream import LineStream, RingBufferSink, ListHostsParser
+
+LISTHOSTS_OUTPUT = [
+    u'ansible-container_1  | \r\n',
+    u'ansible-container_1  | playbook: main.yml\r\n',
+    u'ansible-container_1  | \r\n',
+    u'ansible-container_1  |   play #1 (web:db): web and db\tTAGS: []\r\n',
+    u'ansible-container_1  |     pattern: [u\'web:db\']\r\n',
+    u'ansible-container_1  |     hosts (2):\r\n',
+    u'ansible-container_1  |       web\r\n',
+    u'ansible-container_1  |       db\r\n',
+    u'\x1b[36mansible3f2c9a1b7e04_ansible-container_1\x1b[0m exited with code 0\n',
+]
+
+
+class TestLineStream(unittest.TestCase):
+
+    def test_lines_split_across_writes(self):
+        buffer = RingBufferSink()
+        stream = LineStream([buffer])
+        stream.write(u'one\r\ntw')
+        stream.write(b'o\nthr')
+        self.assertEqual(list(buffer.lines), [u'one', u'two'])
+        stream.close()
+        self.assertEqual(list(buffer.lines), [u'one', u'two', u'thr'])
+
+    def test_ring_buffer_is_bounded(self):
+        buffer = RingBufferSink(size=3)
+        stream = LineStream([buffer])
+        for n in range(10):
+            stream.write(u'%d\n' % n)
+        self.assertEqual(list(buffer.lines), [u'7', u'8', u'9'])
+
+    def test_list_hosts_parser(self):
+        parser = ListHostsParser()
+        stream = LineStream([parser])
+        for chunk in LISTHOSTS_OUTPUT:
+            stream.write(chunk)
+        self.assertEqual(parser.hosts, set([u'web', u'db']))
@@ -0,0 +1,254 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import pytest
+
+from container.exceptions import AnsibleContainerOrchestrationException
+from container.docker.orchestrator import (Orchestrator, OrchestratorCommand, load_compose_file, parse_port,
+                                           start_order, LABEL_CONFIG_HASH)
+
+COMPOSE_V2 = '''version: "2"
+services:
+  web:
+    image: "web:${TAG}"
+    command: ["python", "app.py"]
+    depends_on: [db]
+    ports: ["8000:8000", "127.0.0.1:9000-9001:9000-9001/udp"]
+    expose: ["5000"]
+    environment:
+      - DEBUG=1
+      - HOME
+      - NOT_SET_ANYWHERE
+    volumes:
+      - "./src:/src:ro"
+      - "data:/data"
+      - "/scratch"
+    labels:
+      tier: front
+  db:
+    image: "postgres:9.5"
+    environment: {PRICE: "$$5"}
+  cache:
+    image: "redis"
+    volumes_from: [db]
+volumes:
+  data: {}
+  shared:
+    external: true
+'''
+
+
+class NotFoundResponse(object):
+    status_code = 404
+    content = b''
+    reason = 'Not Found'
+    url = 'http+docker://localunixsocket/images/json'
+
+
+class FakeClient(object):
+
+    def __init__(self, images=('web:1', 'postgres:9.5', 'redis')):
+        self.images = dict((name, 'sha256:%s' % name) for name in images)
+        self.pulled = []
+        self.created = {}
+        self.started = []
+        self.stopped = []
+        self.removed = []
+        self.networks_created = []
+        self.volumes_created = []
+        self.lock = threading.Lock()
+
+    def inspect_image(self, name):
+        from docker.client import errors
+        if name not in self.images:
+            raise errors.NotFound('no such image', NotFoundResponse())
+        return {'Id': self.images[name]}
+
+    def pull(self, repository, tag=None, stream=False, decode=False):
+        self.pulled.append('%s:%s' % (repository, tag))
+        self.images['%s:%s' % (repository, tag)] = self.images[repository] = 'sha256:pulled'
+        return iter([{'status': 'Downloaded'}])
+
+    def containers(self, all=False, filters=None):
+        result = []
+        for name, container in self.created.items():
+            if 'name' in filters and filters['name'] not in name:
+                continue
+            result.append(dict(container, Names=['/' + name]))
+        return result
+
+    def create_host_config(self, **kwargs):
+        return kwargs
+
+    def create_endpoint_config(self, **kwargs):
+        return kwargs
+
+    def create_networking_config(self, endpoints):
+        return endpoints
+
+    def create_container(self, name=None, detach=False, **options):
+        with self.lock:
+            self.created[name] = dict(Id=name, Labels=options['labels'], State='running',
+                                      Status='Up', Options=options)
+        return {'Id': name}
+
+    def start(self, container_id):
+        with self.lock:
+            self.started.append(container_id)
+
+    def stop(self, container_id, timeout=None):
+        with self.lock:
+            self.stopped.append(container_id)
+
+    def remove_container(self, container_id, force=False):
+        with self.lock:
+            self.removed.append(container_id)
+            self.created.pop(container_id, None)
+
+    def networks(self, names=None):
+        return [{'Name': name} for name in self.networks_created if name in names]
+
+    def create_network(self, name, driver=None, labels=None):
+        self.networks_created.append(name)
+
+    def volumes(self):
+        return {'Volumes': [{'Name': 'shared'}]}
+
+    def create_volume(self, name=None, driver=None, driver_opts=None, labels=None):
+        self.volumes_created.append(name)
+
+
+class TestComposeFile(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.compose_file = os.path.join(self.test_dir, 'docker-compose.yml')
+        with open(self.compose_file, 'w') as f:
+            f.write(COMPOSE_V2)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_interpolation(self):
+        version, services, volumes = load_compose_file(self.compose_file, {'TAG': '1'})
+        self.assertEqual(version, '2')
+        self.assertEqual(services['web']['image'], 'web:1')
+        self.assertEqual(services['db']['environment'], {'PRICE': '$5'})
+        self.assertEqual(sorted(volumes), ['data', 'shared'])
+
+    def test_version_1(self):
+        with open(self.compose_file, 'w') as f:
+            f.write('web:\n  image: web\n')
+        version, services, volumes = load_compose_file(self.compose_file, {})
+        self.assertEqual((version, list(services), volumes), ('1', ['web'], {}))
+
+    def test_parse_port(self):
+        self.assertEqual(parse_port('5000'), [((5000, 'tcp'), None)])
+        self.assertEqual(parse_port('8000:80'), [((80, 'tcp'), 8000)])
+        self.assertEqual(parse_port('127.0.0.1::53/udp'), [((53, 'udp'), ('127.0.0.1', None))])
+        self.assertEqual(parse_port('9000-9001:90-91'), [((90, 'tcp'), 9000), ((91, 'tcp'), 9001)])
+        with pytest.raises(AnsibleContainerOrchestrationException):
+            parse_port('9000-9002:90-91')
+
+
+class TestStartOrder(unittest.TestCase):
+
+    SERVICES = {'web': {'depends_on': ['db'], 'links': ['cache:redis']},
+                'db': {},
+                'cache': {'volumes_from': ['db', 'container:other']},
+                'worker': {'links': ['db']}}
+
+    def test_waves(self):
+        self.assertEqual(start_order(self.SERVICES), [['db'], ['cache', 'worker'], ['web']])
+
+    def test_named_services_bring_dependencies(self):
+        self.assertEqual(start_order(self.SERVICES, ['web']), [['db'], ['cache'], ['web']])
+        self.assertEqual(start_order(self.SERVICES, ['web'], include_dependencies=False), [['web']])
+
+    def test_cycle(self):
+        services = dict(self.SERVICES, db={'depends_on': ['web']})
+        with pytest.raises(AnsibleContainerOrchestrationException):
+            start_order(services)
+
+    def test_unknown_service(self):
+        with pytest.raises(AnsibleContainerOrchestrationException):
+            start_order(self.SERVICES, ['nope'])
+
+
+class TestOrchestrator(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.compose_file = os.path.join(self.test_dir, 'docker-compose.yml')
+        with open(self.compose_file, 'w') as f:
+            f.write(COMPOSE_V2)
+        os.environ['TAG'] = '1'
+        self.client = FakeClient()
+
+    def tearDown(self):
+        del os.environ['TAG']
+        shutil.rmtree(self.test_dir)
+        Orchestrator.log_output = None
+
+    def orchestrator(self):
+        from six import StringIO
+        Orchestrator.log_output = StringIO()
+        return Orchestrator(self.client, self.compose_file, self.test_dir)
+
+    def test_container_options(self):
+        options = self.orchestrator().container_options('web')
+        host_config = options['host_config']
+        self.assertEqual(options['image'], 'web:1')
+        self.assertEqual(sorted(options['ports']), [(5000, 'tcp'), (8000, 'tcp'), (9000, 'udp'), (9001, 'udp')])
+        self.assertEqual(host_config['port_bindings'], {'8000/tcp': [8000],
+                                                        '9000/udp': [('127.0.0.1', 9000)],
+                                                        '9001/udp': [('127.0.0.1', 9001)]})
+        self.assertEqual(host_config['binds'], ['%s/src:/src:ro' % self.test_dir, 'ansible_data:/data'])
+        self.assertEqual(host_config['network_mode'], 'ansible_default')
+        self.assertEqual(options['volumes'], ['/src', '/data', '/scratch'])
+        self.assertEqual(options['environment']['DEBUG'], '1')
+        self.assertEqual(options['environment']['HOME'], os.environ['HOME'])
+        self.assertNotIn('NOT_SET_ANYWHERE', options['environment'])
+        self.assertEqual(options['labels']['tier'], 'front')
+        self.assertEqual(options['labels']['com.docker.compose.service'], 'web')
+        cache_options = self.orchestrator().container_options('cache')
+        self.assertEqual(cache_options['host_config']['volumes_from'], ['ansible_db_1'])
+
+    def test_up_detached(self):
+        OrchestratorCommand(self.orchestrator()).up({u'-d': True, u'SERVICE': ['web']})
+        self.assertEqual(sorted(self.client.created), ['ansible_db_1', 'ansible_web_1'])
+        self.assertEqual(self.client.started.index('ansible_db_1'), 0)
+        self.assertEqual(self.client.networks_created, ['ansible_default'])
+        self.assertEqual(self.client.volumes_created, ['ansible_data'])
+        endpoint = self.client.created['ansible_web_1']['Options']['networking_config']['ansible_default']
+        self.assertEqual(endpoint['aliases'], ['web'])
+
+    def test_up_to_date_containers_are_kept(self):
+        self.orchestrator().up(detached=True)
+        self.assertEqual(self.client.removed, [])
+        self.orchestrator().up(detached=True)
+        self.assertEqual(self.client.removed, [])
+        self.assertEqual(len(self.client.started), 3)
+
+        self.client.images['postgres:9.5'] = 'sha256:new'
+        self.orchestrator().up(detached=True)
+        self.assertEqual(self.client.removed, ['ansible_db_1'])
+
+        self.orchestrator().up(detached=True, force_recreate=True)
+        self.assertEqual(len(self.client.removed), 4)
+        self.assertTrue(all(LABEL_CONFIG_HASH in c['Labels'] for c in self.client.created.values()))
+
+    def test_missing_image_is_pulled(self):
+        del self.client.images['redis']
+        self.orchestrator().up(services=['cache'], detached=True)
+        self.assertEqual(self.client.pulled, ['redis:latest'])
+
+    def test_stop_in_reverse_order(self):
+        orchestrator = self.orchestrator()
+        orchestrator.up(detached=True)
+        orchestrator.stop()
+        self.assertEqual(self.client.stopped[-1], 'ansible_db_1')
+        self.assertEqual(sorted(self.client.stopped), ['ansible_cache_1', 'ansible_db_1', 'ansible_web_1'])
@@ -0,0 +1,44 @@
+import io
+import unittest
+
+from container.docker.progress import PushProgress, iter_stream_events
+
+DIGEST = 'sha256:' + 'a' * 64
+
+
+class TTY(io.StringIO):
+
+    def isatty(self):
+        return True
+
+
+class TestPushProgress(unittest.TestCase):
+
+    def test_iter_stream_events(self):
+        chunks = [b'{"status": "Preparing", "id": "a"}\r\n{"status": "Pre',
+                  b'paring", "id": "b"}\r\n',
+                  b'{"status": "latest: digest: %s size: 1"}' % DIGEST.encode('ascii')]
+        events = list(iter_stream_events(chunks))
+        self.assertEqual([e.get('id') for e in events], ['a', 'b', None])
+
+    def test_summary(self):
+        progress = PushProgress(output=io.StringIO())
+        progress.start('web')
+        progress.start('db')
+        progress.update('web', {'id': 'a', 'status': 'Pushing',
+                                'progressDetail': {'current': 500, 'total': 2000}})
+        progress.update('web', {'id': 'b', 'status': 'Layer already exists'})
+        progress.update('web', {'id': 'c', 'status': 'Pushed', 'progressDetail': {}})
+        progress.update('web', {'status': 'v1: digest: %s size: 1' % DIGEST, 'id': 'v1'})
+        progress.finish('db', 'pushed')
+        self.assertEqual(progress.summary(), 'web 2/3 layers 500 B/2.0 kB | db pushed')
+
+    def test_terminal_line_is_redrawn(self):
+        output = TTY()
+        progress = PushProgress(output=output)
+        progress.start('web')
+        progress.finish('web', 'pushed')
+        progress.close()
+        self.assertTrue(output.getvalue().startswith('\r'))
+        self.assertTrue(output.getvalue().endswith('\n'))
+        self.assertEqual(output.getvalue().split('\r')[-1].strip(), 'web pushed')
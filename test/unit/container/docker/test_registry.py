@@ -0,0 +1,183 @@
+import base64
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from six.moves import BaseHTTPServer
+
+from container.docker.credentials import CredentialStore
+from container.docker.engine import Engine
+from container.docker.registry import RegistryClient
+
+MANIFEST = json.dumps({'schemaVersion': 2, 'layers': []}).encode('utf-8')
+DIGEST = 'sha256:' + hashlib.sha256(MANIFEST).hexdigest()
+MANIFEST_TYPE = 'application/vnd.docker.distribution.manifest.v2+json'
+
+
+class RegistryHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''
+    Stands in for a registry that requires token authentication. Its manifests are
+    kept in server.manifests, keyed by (repository, tag or digest).
+    '''
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, headers=None, body=b''):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def authorized(self):
+        if self.headers.get('Authorization') == 'Bearer secret-token':
+            return True
+        realm = 'http://%s:%d/token' % self.server.server_address
+        self.reply(401, {'WWW-Authenticate': 'Bearer realm="%s",service="registry.test"' % realm})
+        return False
+
+    def manifest_key(self):
+        _, _, repository = self.path.partition('/v2/')
+        repository, _, reference = repository.rpartition('/manifests/')
+        return repository, reference
+
+    def do_GET(self):
+        self.server.requests.append((self.command, self.path))
+        if self.path.startswith('/token'):
+            expected = 'Basic ' + base64.b64encode(b'user:pass').decode('ascii')
+            if self.headers.get('Authorization') != expected:
+                return self.reply(401)
+            return self.reply(200, {'Content-Type': 'application/json'}, b'{"token": "secret-token"}')
+        if not self.authorized():
+            return
+        manifest = self.server.manifests.get(self.manifest_key())
+        if manifest is None:
+            return self.reply(404)
+        self.reply(200, {'Content-Type': MANIFEST_TYPE, 'Docker-Content-Digest': DIGEST}, manifest)
+
+    do_HEAD = do_GET
+
+    def do_PUT(self):
+        self.server.requests.append((self.command, self.path))
+        if not self.authorized():
+            return
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.manifests[self.manifest_key()] = body
+        self.reply(201, {'Docker-Content-Digest': DIGEST})
+
+
+class FakeDockerClient(object):
+
+    def __init__(self, repo_digests):
+        self.repo_digests = repo_digests
+
+    def inspect_image(self, image_id):
+        return {'Id': image_id, 'RepoDigests': self.repo_digests}
+
+
+class PushDockerClient(FakeDockerClient):
+
+    def __init__(self, repo_digests):
+        super(PushDockerClient, self).__init__(repo_digests)
+        self.pushed = []
+
+    def images(self, name=None, quiet=False):
+        return [{'Id': 'sha256:abc', 'RepoTags': ['project-web:latest', 'project-web:20170101000000']}]
+
+    def tag(self, image_id, repository, tag=None, force=False):
+        pass
+
+    def push(self, repository, tag=None, stream=False, auth_config=None):
+        self.pushed.append((repository, tag, auth_config))
+        return [b'{"status": "Pushed"}\n']
+
+
+class TestRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), RegistryHandler)
+        self.server.manifests = {('ns/project-web', DIGEST): MANIFEST,
+                                 ('ns/project-web', 'v1'): MANIFEST}
+        self.server.requests = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def client(self):
+        return RegistryClient(self.url, auth=('user', 'pass'))
+
+    def engine(self, repo_digests):
+        engine = Engine.__new__(Engine)
+        engine._client = FakeDockerClient(repo_digests)
+        engine.registry_client = lambda url: self.client()
+        return engine
+
+    def test_api_url(self):
+        self.assertEqual(RegistryClient.api_url('https://index.docker.io/v1/'), 'https://registry-1.docker.io')
+        self.assertEqual(RegistryClient.api_url('registry.test:5000/'), 'https://registry.test:5000')
+        self.assertEqual(RegistryClient.repository_name('registry.test:5000/ns/web'), 'ns/web')
+        self.assertEqual(RegistryClient.repository_name('ns/web'), 'ns/web')
+
+    def test_manifest_digest(self):
+        client = self.client()
+        self.assertEqual(client.manifest_digest('ns/project-web', 'v1'), DIGEST)
+        self.assertEqual(client.manifest_digest('ns/project-web', 'v2'), None)
+        # The token is fetched once and reused
+        self.assertEqual(len([r for r in self.server.requests if r[1].startswith('/token')]), 1)
+
+    def test_tag_manifest(self):
+        self.client().tag_manifest('ns/project-web', DIGEST, 'latest')
+        self.assertEqual(self.server.manifests[('ns/project-web', 'latest')], MANIFEST)
+
+    def test_preflight_skips_unchanged_image(self):
+        engine = self.engine(['127.0.0.1/ns/project-web@' + DIGEST])
+        repository = '127.0.0.1/ns/project-web'
+        self.assertEqual(engine.push_preflight('sha256:abc', repository, 'v1', self.url), 'unchanged')
+        self.assertEqual(engine.push_preflight('sha256:abc', repository, 'latest', self.url), 'tagged')
+        self.assertIn(('ns/project-web', 'latest'), self.server.manifests)
+
+    def test_preflight_pushes_new_images(self):
+        repository = '127.0.0.1/ns/project-web'
+        self.assertEqual(self.engine([]).push_preflight('sha256:abc', repository, 'v1', self.url), None)
+        other = self.engine(['127.0.0.1/ns/project-web@sha256:' + 'b' * 64])
+        self.assertEqual(other.push_preflight('sha256:abc', repository, 'v2', self.url), None)
+        self.server.manifests.clear()
+        engine = self.engine(['127.0.0.1/ns/project-web@' + DIGEST])
+        self.assertEqual(engine.push_preflight('sha256:abc', repository, 'v1', self.url), None)
+
+    def test_push_checks_the_registry_at_the_url_given(self):
+        config_dir = tempfile.mkdtemp()
+        try:
+            host = self.url.split('://')[1]
+            with open(os.path.join(config_dir, 'config.json'), 'w') as f:
+                json.dump({'auths': {host: {'auth': base64.b64encode(b'user:pass').decode('ascii')}}}, f)
+            repository = '%s/ns/project-web' % host
+            engine = Engine.__new__(Engine)
+            engine.project_name = 'project'
+            engine._client = client = PushDockerClient([repository + '@' + DIGEST])
+            engine._credential_store = CredentialStore([config_dir])
+            # The registry only speaks plain http, so it must be reached with the scheme given
+            self.assertEqual(engine.push_latest_image('web', url=self.url, namespace='ns', tag='v1'),
+                             repository + ':v1')
+            self.assertEqual(engine.push_latest_image('web', url=self.url, namespace='ns', tag='v2'),
+                             repository + ':v2')
+            self.assertIn(('ns/project-web', 'v2'), self.server.manifests)
+            self.assertEqual(client.pushed, [])
+            self.server.manifests.clear()
+            engine.push_latest_image('web', url=self.url, namespace='ns', tag='v3')
+            self.assertEqual(client.pushed, [(repository, 'v3', dict(username='user', password='pass', email=None,
+                                                                     serveraddress=self.url))])
+        finally:
+            shutil.rmtree(config_dir)
@@ -0,0 +1,136 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+import pytest
+
+import container
+
+
+def load_plugin():
+    path = os.path.join(os.path.dirname(container.__file__), 'templates', 'ac_docker.py')
+    try:
+        from importlib.util import spec_from_file_location, module_from_spec
+    except ImportError:
+        import imp
+        return imp.load_source('ac_docker', path)
+    spec = spec_from_file_location('ac_docker', path)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+ac_docker = load_plugin()
+
+
+class TestExecSession(unittest.TestCase):
+    '''
+    The exec session, run against a local shell in place of docker exec.
+    '''
+
+    def setUp(self):
+        self.session = ac_docker.ExecSession(['/bin/sh'])
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_exit_codes(self):
+        self.assertTrue(self.session.can_pipe_data)
+        self.assertEqual(self.session.run('true'), (0, b'', b''))
+        self.assertEqual(self.session.run('echo out; echo err >&2; exit 3'), (3, b'out\n', b'err\n'))
+        # The session survives a failed command
+        self.assertEqual(self.session.run('echo again'), (0, b'again\n', b''))
+
+    def test_output_without_trailing_newline(self):
+        self.assertEqual(self.session.run("printf 'no newline'; printf 'err' >&2"),
+                         (0, b'no newline', b'err'))
+
+    def test_large_output(self):
+        rc, stdout, _ = self.session.run("head -c 300000 /dev/zero | tr '\\0' 'x'")
+        self.assertEqual((rc, len(stdout)), (0, 300000))
+
+    def test_stdin_data(self):
+        data = b"line one\nit's \"quoted\" $HOME `x`\n\x00\xff"
+        self.assertEqual(self.session.run('cat', in_data=data), (0, data, b''))
+        self.assertEqual(self.session.run('wc -c', in_data=b'abc')[1].strip(), b'3')
+
+    def test_shell_exiting_raises(self):
+        with pytest.raises(ac_docker.SessionError):
+            self.session.run('kill -9 $PPID')
+        self.assertFalse(self.session.alive())
+
+
+class TestBroker(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.test_dir, 'session.sock')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def start(self, exec_cmd):
+        thread = threading.Thread(target=ac_docker.serve, args=(self.socket_path, exec_cmd))
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def request(self, **message):
+        deadline = time.time() + 5
+        while not os.path.exists(self.socket_path) and time.time() < deadline:
+            time.sleep(0.01)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.socket_path)
+        try:
+            ac_docker.send_message(sock, message)
+            return ac_docker.recv_message(sock)
+        finally:
+            sock.close()
+
+    def test_commands_share_the_session(self):
+        thread = self.start(['/bin/sh'])
+        # Each command runs in a child of the one shell the broker keeps open
+        first = self.request(cmd='echo $PPID')
+        second = self.request(cmd='echo $PPID')
+        self.assertEqual(first['rc'], 0)
+        self.assertEqual(first['stdout'], second['stdout'])
+        result = self.request(cmd='cat; exit 2', in_data='aGVsbG8=')
+        self.assertEqual((result['rc'], ac_docker.base64.b64decode(result['stdout'])), (2, b'hello'))
+        self.request(cmd='kill -9 $PPID')
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+    def test_shell_dying_mid_command_reports_an_error(self):
+        thread = self.start(['/bin/sh'])
+        result = self.request(cmd='kill -9 $PPID')
+        self.assertIn('closed unexpectedly', result['error'])
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertFalse(os.path.exists(self.socket_path))
+
+    def test_broker_dying_mid_command_raises(self):
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        server.listen(1)
+
+        def die_after_request():
+            conn, _ = server.accept()
+            ac_docker.recv_message(conn)
+            conn.close()
+        thread = threading.Thread(target=die_after_request)
+        thread.daemon = True
+        thread.start()
+        try:
+            with pytest.raises(ac_docker.SessionError):
+                self.request(cmd='sleep 10')
+        finally:
+            thread.join(5)
+            server.close()
+
+    def test_session_that_cannot_start_marks_failed(self):
+        ac_docker.serve(self.socket_path, [os.path.join(self.test_dir, 'no-such-docker')])
+        self.assertTrue(os.path.exists(self.socket_path + '.failed'))
+        self.assertFalse(os.path.exists(self.socket_path))
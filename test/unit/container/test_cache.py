@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from container.cache import ContentHash, FileCache, project_cache_path
+
+
+class TestContentHash(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.test_dir, 'role', 'tasks'))
+        with open(os.path.join(self.test_dir, 'role', 'tasks', 'main.yml'), 'w') as f:
+            f.write('- debug: msg=hi\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def tree_digest(self):
+        return ContentHash().update_tree(os.path.join(self.test_dir, 'role')).hexdigest()
+
+    def test_tree_digest_tracks_content(self):
+        before = self.tree_digest()
+        self.assertEqual(before, self.tree_digest())
+        with open(os.path.join(self.test_dir, 'role', 'tasks', 'main.yml'), 'w') as f:
+            f.write('- debug: msg=bye\n')
+        self.assertNotEqual(before, self.tree_digest())
+
+    def test_json_is_order_independent(self):
+        self.assertEqual(ContentHash().update_json({'a': 1, 'b': 2}).hexdigest(),
+                         ContentHash().update_json({'b': 2, 'a': 1}).hexdigest())
+
+
+class TestFileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_round_trip(self):
+        cache = FileCache(project_cache_path(self.test_dir, 'listhosts'))
+        self.assertIsNone(cache.get('abc'))
+        cache.set('abc', ['db', 'web'])
+        self.assertEqual(FileCache(project_cache_path(self.test_dir, 'listhosts')).get('abc'), ['db', 'web'])
+        self.assertTrue(os.path.isfile(project_cache_path(self.test_dir, 'listhosts', 'abc.json')))
+
+    def test_corrupt_entry_is_a_miss(self):
+        cache = FileCache(project_cache_path(self.test_dir, 'listhosts'))
+        cache.set('abc', [])
+        with open(project_cache_path(self.test_dir, 'listhosts', 'abc.json'), 'w') as f:
+            f.write('{not json')
+        self.assertEqual(cache.get('abc', 'missing'), 'missing')
+
+    def test_private_and_pruned(self):
+        path = os.path.join(self.test_dir, 'compose')
+        cache = FileCache(path, private=True, max_entries=2, max_age=3600)
+        now = time.time()
+        for key, age in (('a', 7200), ('b', 30), ('c', 20)):
+            cache.set(key, key)
+            os.utime(os.path.join(path, '%s.json' % key), (now - age, now - age))
+        # Reading an entry counts as using it
+        self.assertEqual(cache.get('b'), 'b')
+        cache.set('d', 'd')
+        self.assertEqual(sorted(os.listdir(path)), ['b.json', 'd.json'])
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o700)
+        self.assertEqual(os.stat(os.path.join(path, 'd.json')).st_mode & 0o777, 0o600)
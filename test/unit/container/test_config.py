@@ -103,6 +103,16 @@ class TestAnsibleContainerConfig(unittest.TestCase):
         self.assertEqual(defaults['debug'], 0)
         self.assertEqual(defaults['web_image'], 'apache:latest')
 
+    def test_defaults_end_at_next_top_level_key(self):
+        source = (u"defaults:\n"
+                  u"    # comment\n"
+                  u"    web_image: {{ 'apache' }}:latest\n"
+                  u"\n"
+                  u"version: '2'\n"
+                  u"volumes:\n"
+                  u"    web_image: {}\n")
+        self.assertEqual(self.config._get_defaults(source=source), {'web_image': 'apache:latest'})
+
     def test_should_parse_yaml_file(self):
         new_vars = self.config._get_variables_from_file('devel.yml')
         self.assertEqual(new_vars['debug'], 1, 'Failed to parse devel.yml - checked debug')
@@ -157,3 +167,71 @@ class TestAnsibleContainerConfig(unittest.TestCase):
         self.assertEqual(self.config._config['services']['web']['environment'][2], 'VERSION={0}'.format(__version__))
 
 
+
+
+class TestAnsibleContainerConfigCache(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        os.mkdir(path.join(self.test_dir, 'ansible'))
+        self.write_config(u"version: '2'\n"
+                          u"defaults:\n"
+                          u"    web_image: apache:latest\n"
+                          u"services:\n"
+                          u"    web:\n"
+                          u"        image: {{ web_image }}\n"
+                          u"        dev_overrides:\n"
+                          u"            command: ['sleep', '1d']\n")
+        self.renders = 0
+        render_template = AnsibleContainerConfig._render_template
+
+        def counting_render(config, *args, **kwargs):
+            self.renders += 1
+            return render_template(config, *args, **kwargs)
+        AnsibleContainerConfig._render_template = counting_render
+        self.addCleanup(setattr, AnsibleContainerConfig, '_render_template', render_template)
+
+    def tearDown(self):
+        AnsibleContainerConfig.clear_cache()
+        shutil.rmtree(self.test_dir)
+
+    def write_config(self, text):
+        with open(path.join(self.test_dir, 'ansible', 'container.yml'), 'w') as fs:
+            fs.write(text)
+
+    def test_repeated_loads_are_cached(self):
+        first = AnsibleContainerConfig(self.test_dir)
+        renders = self.renders
+        second = AnsibleContainerConfig(self.test_dir)
+        second.set_env('dev')
+        self.assertEqual(self.renders, renders)
+        self.assertEqual(first['services']['web'], {'image': 'apache:latest'})
+        self.assertEqual(second['services']['web']['command'], ['sleep', '1d'])
+
+    def test_copies_are_independent(self):
+        first = AnsibleContainerConfig(self.test_dir)
+        first['services']['web']['image'] = 'changed'
+        self.assertEqual(AnsibleContainerConfig(self.test_dir)['services']['web']['image'], 'apache:latest')
+
+    def test_changes_invalidate_cache(self):
+        AnsibleContainerConfig(self.test_dir)
+        self.write_config(u"version: '2'\n"
+                          u"services:\n"
+                          u"    web:\n"
+                          u"        image: python:2.7\n")
+        self.assertEqual(AnsibleContainerConfig(self.test_dir)['services']['web']['image'], 'python:2.7')
+        os.environ['AC_CACHE_TEST'] = '1'
+        self.addCleanup(os.environ.pop, 'AC_CACHE_TEST')
+        renders = self.renders
+        AnsibleContainerConfig(self.test_dir)
+        self.assertTrue(self.renders > renders)
+
+    def test_variables_set_by_ansible_container_keep_cache(self):
+        config = AnsibleContainerConfig(self.test_dir)
+        renders = self.renders
+        for name, value in (('DOCKER_API_VERSION', '1.24'), ('ANSIBLE_CONTAINER_PROJECT', 'ansible0123456789ab')):
+            self.addCleanup(os.environ.pop, name, None)
+            os.environ[name] = value
+        config.set_env('dev')
+        AnsibleContainerConfig(self.test_dir)
+        self.assertEqual(self.renders, renders)
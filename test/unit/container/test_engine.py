@@ -0,0 +1,258 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import container.engine
+from container.engine import BaseEngine, cmdrun_build, post_build_hosts, push_hosts, summarize_task_timings
+
+
+class FakeProgress(object):
+
+    def __init__(self):
+        self.events = []
+        self.closed = False
+
+    def start(self, host):
+        self.events.append((host, 'start'))
+
+    def update(self, host, event):
+        self.events.append((host, event['status']))
+
+    def finish(self, host, state):
+        self.events.append((host, state))
+
+    def close(self):
+        self.closed = True
+
+
+class FakeEngine(object):
+
+    def __init__(self, fail=(), delay=0):
+        self.fail = set(fail)
+        self.delay = delay
+        self.exported = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def push_latest_image(self, host, url=None, namespace=None, tag=None, progress=None):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            progress.update(host, {'id': 'layer', 'status': 'Pushed'})
+            if host in self.fail:
+                raise RuntimeError('push of %s failed' % host)
+            return '%s/%s:%s' % (namespace, host, tag)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def push_progress(self):
+        return FakeProgress()
+
+    def post_build(self, host, version, flatten=True, purge_last=True):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            if host in self.fail:
+                raise RuntimeError('export of %s failed' % host)
+            with self.lock:
+                self.exported.append((host, version, flatten, purge_last))
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+class TestPostBuildHosts(unittest.TestCase):
+
+    def test_serial_by_default(self):
+        engine = FakeEngine(delay=0.01)
+        failures = post_build_hosts(engine, ['web', 'db', 'cache'], '20170101000000')
+        self.assertEqual(failures, {})
+        self.assertEqual(engine.max_active, 1)
+        self.assertEqual(sorted(h for h, _, _, _ in engine.exported), ['cache', 'db', 'web'])
+
+    def test_parallel_bounded_by_jobs(self):
+        engine = FakeEngine(delay=0.05)
+        hosts = ['host%d' % i for i in range(6)]
+        failures = post_build_hosts(engine, hosts, 'v', flatten=False, purge_last=False, jobs=3)
+        self.assertEqual(failures, {})
+        self.assertEqual(len(engine.exported), 6)
+        self.assertTrue(1 < engine.max_active <= 3)
+        self.assertTrue(all(not f and not p for _, _, f, p in engine.exported))
+
+    def test_failures_collected_per_host(self):
+        engine = FakeEngine(fail=['db'])
+        failures = post_build_hosts(engine, ['web', 'db', 'cache'], 'v', jobs=2)
+        self.assertEqual(list(failures.keys()), ['db'])
+        self.assertIsInstance(failures['db'], RuntimeError)
+        self.assertEqual(sorted(h for h, _, _, _ in engine.exported), ['cache', 'web'])
+
+    def test_no_hosts(self):
+        self.assertEqual(post_build_hosts(FakeEngine(), [], 'v', jobs=4), {})
+
+
+class TestPushHosts(unittest.TestCase):
+
+    def test_parallel_bounded_by_jobs(self):
+        engine = FakeEngine(delay=0.05)
+        hosts = ['host%d' % i for i in range(6)]
+        pushed, failures = push_hosts(engine, hosts, namespace='ns', tag='v', jobs=3)
+        self.assertEqual(failures, {})
+        self.assertEqual(pushed['host0'], 'ns/host0:v')
+        self.assertEqual(len(pushed), 6)
+        self.assertTrue(1 < engine.max_active <= 3)
+
+    def test_results_per_host(self):
+        engine = FakeEngine(fail=['db'])
+        progress = FakeProgress()
+        pushed, failures = push_hosts(engine, ['web', 'db'], namespace='ns', tag='v', progress=progress)
+        self.assertEqual(pushed, {'web': 'ns/web:v'})
+        self.assertEqual(list(failures.keys()), ['db'])
+        self.assertEqual(progress.events, [('db', 'start'), ('db', 'Pushed'), ('db', 'failed'),
+                                           ('web', 'start'), ('web', 'Pushed'), ('web', 'pushed')])
+        self.assertTrue(progress.closed)
+
+    def test_no_hosts(self):
+        self.assertEqual(push_hosts(FakeEngine(), [], jobs=4), ({}, {}))
+
+
+class InterruptedBuildEngine(object):
+
+    orchestrator_name = 'Docker'
+
+    def __init__(self):
+        self.params = {}
+        self.removed = []
+
+    def hosts_touched_by_playbook(self):
+        return frozenset(['web'])
+
+    def service_fingerprint(self, host):
+        return 'fingerprint'
+
+    def orchestrate(self, operation, temp_dir, hosts=[], context=None):
+        raise KeyboardInterrupt()
+
+    def get_builder_container_id(self):
+        raise NameError('No container with the name ansible-container')
+
+    def cleanup_orchestration(self):
+        self.removed.append('orchestration')
+
+
+class TestBuildCleanup(unittest.TestCase):
+
+    def setUp(self):
+        self.load_engine = container.engine.load_engine
+        self.engine = InterruptedBuildEngine()
+        container.engine.load_engine = lambda **kwargs: self.engine
+
+    def tearDown(self):
+        container.engine.load_engine = self.load_engine
+
+    def test_interrupted_build_is_cleaned_up(self):
+        with self.assertRaises(KeyboardInterrupt):
+            cmdrun_build('/project', 'docker', rebuild=True)
+        self.assertEqual(self.engine.removed, ['orchestration'])
+
+    def test_saved_build_is_left_alone(self):
+        with self.assertRaises(KeyboardInterrupt):
+            cmdrun_build('/project', 'docker', rebuild=True, save_build_container=True)
+        self.assertEqual(self.engine.removed, [])
+
+
+class FingerprintEngine(BaseEngine):
+
+    def all_hosts_in_orchestration(self):
+        return list(self.config['services'].keys())
+
+    def inventory_groups(self):
+        hosts = self.all_hosts_in_orchestration()
+        return {'all': hosts, 'docker': hosts}
+
+    # Image reference to ID, for the images present locally
+    base_image_ids = {'centos:7': 'sha256:centos', 'postgres:9.5': 'sha256:postgres'}
+
+    def get_base_image_id(self, host):
+        return self.base_image_ids.get(self.config['services'][host]['image'])
+
+
+class TestServiceFingerprint(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        for role in ('web', 'db'):
+            os.makedirs(os.path.join(self.test_dir, 'ansible', 'roles', role, 'tasks'))
+            self.write('roles/%s/tasks/main.yml' % role, '- debug: msg=%s\n' % role)
+        self.write('container.yml', "version: '2'\n"
+                                    "services:\n"
+                                    "  web:\n"
+                                    "    image: centos:7\n"
+                                    "  db:\n"
+                                    "    image: postgres:9.5\n")
+        self.write('main.yml', '- hosts: web\n  roles: [web]\n- hosts: db\n  roles: [db]\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def write(self, name, content):
+        with open(os.path.join(self.test_dir, 'ansible', name), 'w') as f:
+            f.write(content)
+
+    def fingerprints(self, base_image_ids=None):
+        engine = FingerprintEngine(self.test_dir, 'test', {})
+        if base_image_ids is not None:
+            engine.base_image_ids = base_image_ids
+        return dict((host, engine.service_fingerprint(host)) for host in ('web', 'db'))
+
+    def test_stable(self):
+        self.assertEqual(self.fingerprints(), self.fingerprints())
+
+    def test_role_change_only_affects_its_service(self):
+        before = self.fingerprints()
+        self.write('roles/db/tasks/main.yml', '- debug: msg=changed\n')
+        after = self.fingerprints()
+        self.assertEqual(before['web'], after['web'])
+        self.assertNotEqual(before['db'], after['db'])
+
+    def test_base_image(self):
+        before = self.fingerprints()
+        # centos:7 was pulled again and now points at another image
+        after = self.fingerprints({'centos:7': 'sha256:newer', 'postgres:9.5': 'sha256:postgres'})
+        self.assertNotEqual(before['web'], after['web'])
+        self.assertEqual(before['db'], after['db'])
+        # Not present locally, so the build will pull whatever the reference points at
+        missing = self.fingerprints({'postgres:9.5': 'sha256:postgres'})
+        self.assertNotEqual(missing['web'], before['web'])
+        self.assertEqual(missing, self.fingerprints({'postgres:9.5': 'sha256:postgres'}))
+
+    def test_shared_data_affects_all_services(self):
+        before = self.fingerprints()
+        os.makedirs(os.path.join(self.test_dir, 'ansible', 'group_vars'))
+        self.write('group_vars/all.yml', 'foo: bar\n')
+        after = self.fingerprints()
+        self.assertNotEqual(before['web'], after['web'])
+        self.assertNotEqual(before['db'], after['db'])
+
+
+class TestTaskTimings(unittest.TestCase):
+
+    def test_slowest_tasks_and_roles_per_host(self):
+        tasks = [dict(host='web', task='install nginx', role='nginx', duration=12.0),
+                 dict(host='web', task='configure', role='nginx', duration=1.5),
+                 dict(host='web', task='gather facts', role=None, duration=3.0),
+                 dict(host='web', task='restart', role='nginx', duration=0.5),
+                 dict(host='web', task='restart', role='nginx', duration=0.5),
+                 dict(host='db', task='install postgres', role='postgres', duration=20.0)]
+        summary = summarize_task_timings(tasks, limit=2)
+        self.assertEqual(summary['web'], ([(u'nginx : install nginx', 12.0), (u'gather facts', 3.0)],
+                                          [(u'nginx', 14.5)]))
+        self.assertEqual(summary['db'], ([(u'postgres : install postgres', 20.0)], [(u'postgres', 20.0)]))
@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from jinja2 import Environment
+
+import container.filters
+from container.filters import FilterLoader
+
+FILTER_MODULE = '''
+import os
+os.environ['LOADED_%(name)s'] = os.environ.get('LOADED_%(name)s', '') + 'x'
+
+class FilterModule(object):
+    def filters(self):
+        return {'%(name)s_upper': lambda value: value.upper(),
+                '%(name)s_lower': lambda value: value.lower(),
+                'unique': lambda value: 'ansible unique'}
+'''
+
+
+class TestLazyFilters(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.plugin_dir = os.path.join(self.test_dir, 'filter')
+        os.mkdir(self.plugin_dir)
+        for name in ('alpha', 'beta'):
+            with open(os.path.join(self.plugin_dir, '%s.py' % name), 'w') as f:
+                f.write(FILTER_MODULE % dict(name=name))
+        self.patch(container.filters, 'find_package_path', lambda package: self.plugin_dir)
+        self.patch(os, 'environ', dict(os.environ, HOME=self.test_dir))
+        self.reset_loader()
+
+    def tearDown(self):
+        self.reset_loader()
+        shutil.rmtree(self.test_dir)
+
+    def patch(self, obj, attr, value):
+        self.addCleanup(setattr, obj, attr, getattr(obj, attr))
+        setattr(obj, attr, value)
+
+    def reset_loader(self):
+        FilterLoader.filter_index = None
+        FilterLoader.module_filters = {}
+
+    def render(self, source):
+        env = Environment()
+        env.filters = FilterLoader().lazy(env.filters)
+        return env.from_string(source).render()
+
+    def test_modules_imported_on_first_use(self):
+        FilterLoader().index()
+        self.reset_loader()
+        os.environ.pop('LOADED_alpha', None)
+        os.environ.pop('LOADED_beta', None)
+        self.assertEqual(self.render("{{ 'Hi' | alpha_upper }} {{ 'Hi' | alpha_lower }}"), 'HI hi')
+        self.assertEqual(os.environ.get('LOADED_alpha'), 'x')
+        self.assertNotIn('LOADED_beta', os.environ)
+
+    def test_local_and_ansible_precedence(self):
+        self.assertEqual(self.render("{{ 'x' | test_filter }}"), 'success!')
+        self.assertEqual(self.render("{{ [1, 1] | unique }}"), 'ansible unique')
+
+    def test_index_rebuilt_when_modules_change(self):
+        self.assertNotIn('gamma_upper', FilterLoader().index())
+        with open(os.path.join(self.plugin_dir, 'gamma.py'), 'w') as f:
+            f.write(FILTER_MODULE % dict(name='gamma'))
+        self.reset_loader()
+        self.assertEqual(FilterLoader().index()['gamma_upper'], os.path.join(self.plugin_dir, 'gamma.py'))
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import pytest
+
+from container.exceptions import AnsibleContainerDynamicHostPattern
+from container.playbook import (iter_plays, roles_in_play, resolve_role_paths, role_search_paths,
+                                resolve_host_pattern, resolve_playbook_hosts)
+
+HOSTS = ['web', 'web2', 'db', 'cache']
+GROUPS = {'all': HOSTS, 'docker': HOSTS, 'ungrouped': [], 'frontend': ['web', 'web2']}
+
+
+class TestResolveHostPattern(unittest.TestCase):
+
+    def resolve(self, pattern):
+        return resolve_host_pattern(pattern, HOSTS, GROUPS)
+
+    def test_names_and_groups(self):
+        self.assertEqual(self.resolve('db'), {'db'})
+        self.assertEqual(self.resolve('all'), set(HOSTS))
+        self.assertEqual(self.resolve('docker'), set(HOSTS))
+        self.assertEqual(self.resolve('nosuchhost'), set())
+
+    def test_unions(self):
+        self.assertEqual(self.resolve('db:cache'), {'db', 'cache'})
+        self.assertEqual(self.resolve('db, cache'), {'db', 'cache'})
+        self.assertEqual(self.resolve(['db', 'frontend']), {'db', 'web', 'web2'})
+
+    def test_intersections_and_exclusions(self):
+        self.assertEqual(self.resolve('all:!db'), {'web', 'web2', 'cache'})
+        self.assertEqual(self.resolve('!frontend'), {'db', 'cache'})
+        self.assertEqual(self.resolve('frontend:&web*'), {'web', 'web2'})
+        self.assertEqual(self.resolve('!db:all:&frontend'), {'web', 'web2'})
+
+    def test_wildcards(self):
+        self.assertEqual(self.resolve('web*'), {'web', 'web2'})
+        self.assertEqual(self.resolve('~^(db|cache)$'), {'db', 'cache'})
+
+    def test_dynamic_patterns(self):
+        for pattern in ('{{ target }}', 'web[0]', "{{ hosts | default('a,b') }}", None):
+            with pytest.raises(AnsibleContainerDynamicHostPattern):
+                self.resolve(pattern)
+
+
+class TestPlaybook(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.ansible_dir = os.path.join(self.test_dir, 'ansible')
+        os.makedirs(os.path.join(self.ansible_dir, 'roles', 'app', 'meta'))
+        os.makedirs(os.path.join(self.ansible_dir, 'roles', 'common', 'tasks'))
+        self.write('roles/app/meta/main.yml', 'dependencies:\n  - role: common\n')
+        self.write('main.yml', '- hosts: frontend:!web2\n'
+                               '  roles:\n'
+                               '    - app\n'
+                               '- include: more.yml\n')
+        self.write('more.yml', '- hosts: db\n'
+                               '  tasks:\n'
+                               '    - include_role:\n'
+                               '        name: galaxy.role\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def write(self, name, content):
+        with open(os.path.join(self.ansible_dir, name), 'w') as f:
+            f.write(content)
+
+    def test_iter_plays_follows_includes(self):
+        plays = list(iter_plays(os.path.join(self.ansible_dir, 'main.yml')))
+        self.assertEqual([os.path.basename(path) for path, _ in plays], ['main.yml', 'main.yml', 'more.yml'])
+        roles = [role for _, play in plays for role in roles_in_play(play)]
+        self.assertEqual(roles, ['app', 'galaxy.role'])
+
+    def test_resolve_role_paths_follows_dependencies(self):
+        paths = resolve_role_paths(['app', 'galaxy.role'], role_search_paths(self.test_dir))
+        self.assertEqual([os.path.basename(path) for path in paths], ['app', 'common'])
+
+    def test_resolve_playbook_hosts(self):
+        hosts = resolve_playbook_hosts(os.path.join(self.ansible_dir, 'main.yml'), HOSTS, GROUPS)
+        self.assertEqual(hosts, frozenset(['web', 'db']))
+
+    def test_templated_include_is_dynamic(self):
+        self.write('main.yml', '- include: "{{ playbook }}.yml"\n')
+        with pytest.raises(AnsibleContainerDynamicHostPattern):
+            resolve_playbook_hosts(os.path.join(self.ansible_dir, 'main.yml'), HOSTS, GROUPS)
@@ -0,0 +1,72 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import pytest
+
+from container.engine import post_build_hosts
+from container.timing import Tracer, tracer, span
+
+
+class ExportEngine(object):
+
+    def post_build(self, host, version, flatten=True, purge_last=True):
+        with span('tag'):
+            pass
+
+
+class TestTracer(unittest.TestCase):
+
+    def setUp(self):
+        self.tracer = Tracer()
+
+    def test_nested_spans(self):
+        with self.tracer.span('build') as build:
+            with self.tracer.span('listhosts'):
+                pass
+            with pytest.raises(RuntimeError):
+                with self.tracer.span('playbook'):
+                    raise RuntimeError('failed')
+        self.assertEqual([(depth, s.name) for depth, s in self.tracer.spans()],
+                         [(0, 'build'), (1, 'listhosts'), (1, 'playbook')])
+        self.assertEqual(build.children[1].error, 'RuntimeError')
+        self.assertTrue(build.duration >= sum(child.duration for child in build.children))
+        self.assertEqual(self.tracer.current(), None)
+        lines = self.tracer.render().split('\n')
+        self.assertTrue(lines[1].endswith('s    listhosts'))
+        self.assertTrue(lines[2].endswith('playbook (RuntimeError)'))
+
+    def test_trace(self):
+        with self.tracer.span('push'):
+            with self.tracer.span('web', host='web'):
+                pass
+        self.tracer.add_data('tasks', [])
+        trace = self.tracer.trace()
+        events = [event for event in trace['traceEvents'] if event['ph'] == 'X']
+        self.assertEqual([event['name'] for event in events], ['push', 'web'])
+        self.assertEqual(events[1]['args'], {'host': 'web'})
+        self.assertTrue(events[0]['ts'] <= events[1]['ts'])
+        self.assertEqual(trace['tasks'], [])
+        test_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(test_dir, 'trace.json')
+            self.tracer.write_trace(path)
+            with open(path) as f:
+                self.assertEqual(json.load(f)['traceEvents'], json.loads(json.dumps(trace['traceEvents'])))
+        finally:
+            shutil.rmtree(test_dir)
+
+
+class TestWorkerSpans(unittest.TestCase):
+
+    def tearDown(self):
+        tracer.reset()
+
+    def test_hosts_exported_on_workers_nest_under_export(self):
+        tracer.reset()
+        with span('export') as export:
+            post_build_hosts(ExportEngine(), ['web', 'db', 'cache'], 'v', jobs=3)
+        self.assertEqual(sorted(child.name for child in export.children), ['cache', 'db', 'web'])
+        self.assertTrue(all([c.name for c in child.children] == ['tag'] for child in export.children))
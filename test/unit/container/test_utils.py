@@ -3,8 +3,10 @@ import tempfile
 from os import path
 import unittest
 import os
+import io
 import pytest
-from container.utils import assert_initialized
+import container.utils
+from container.utils import assert_initialized, iter_chunks, jinja_env, jinja_render_to_temp
 from container.exceptions import AnsibleContainerNotInitializedException
 
 
@@ -29,3 +31,36 @@ class TestMissingFiles(unittest.TestCase):
         f.write('')
         with pytest.raises(AnsibleContainerNotInitializedException):
             assert_initialized(self.test_dir)
+
+
+class TestIterChunks(unittest.TestCase):
+
+    def test_chunks_and_closes(self):
+        stream = io.BytesIO(b'x' * 10)
+        chunks = list(iter_chunks(stream, chunk_size=4))
+        self.assertEqual(chunks, [b'xxxx', b'xxxx', b'xx'])
+        self.assertTrue(stream.closed)
+
+    def test_empty_stream(self):
+        self.assertEqual(list(iter_chunks(io.BytesIO(b''))), [])
+
+
+class TestJinjaRenderToTemp(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.addCleanup(setattr, container.utils, '_jinja_env', container.utils._jinja_env)
+        self.addCleanup(os.environ.__setitem__, 'HOME', os.environ['HOME'])
+        os.environ['HOME'] = self.test_dir
+        container.utils._jinja_env = None
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_templates_compiled_once(self):
+        for _ in range(2):
+            jinja_render_to_temp('ansible.cfg', self.test_dir, 'ansible.cfg')
+        self.assertIs(jinja_env(), jinja_env())
+        with open(path.join(self.test_dir, 'ansible.cfg')) as f:
+            self.assertIn('pipelining', f.read())
+        self.assertEqual(len(os.listdir(path.join(self.test_dir, '.ansible-container', 'cache', 'jinja'))), 1)